@@ -0,0 +1,59 @@
+"""Benchmark the PlaybackOrder on a large playlist without Qt.
+
+Measures turning shuffle on, stepping through shuffled tracks with next() and
+previous(), and the cost of inserting and removing tracks once many tracks
+have been played. A copied and shuffled list of every row is timed alongside,
+as the cost that turning shuffle on would have with an eager permutation.
+
+Usage: PYTHONPATH=. python benchmarks/bench_engine.py [TRACKS]
+"""
+import random
+import sys
+import time
+
+from mosaic import engine
+
+
+def timed(function, repeat=1):
+    """Return the mean time in microseconds that function takes over repeat calls."""
+    start = time.perf_counter()
+    for __ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    """Time each operation of the playback order."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    order = engine.PlaybackOrder(count, random.Random(0))
+    order.jump(0)
+
+    def shuffle_eagerly():
+        rows = list(range(count))
+        random.shuffle(rows)
+
+    def enable_shuffle():
+        order.shuffle = True
+
+    print('{} tracks' .format(count))
+    print('{:>24}: {:10.1f} us' .format('eager shuffle', timed(shuffle_eagerly)))
+    print('{:>24}: {:10.1f} us' .format('enable shuffle', timed(enable_shuffle)))
+    print('{:>24}: {:10.2f} us' .format('next (new track)', timed(order.next, 100000)))
+    print('{:>24}: {:10.2f} us' .format('previous', timed(order.previous, 50000)))
+    print('{:>24}: {:10.2f} us' .format('next (from history)', timed(order.next, 50000)))
+    print('{:>24}: {:10.2f} us' .format('next (linear)', timed(engine.PlaybackOrder(count).next, 100000)))
+
+    for played in (100, 10000):
+        order = engine.PlaybackOrder(count, random.Random(0))
+        order.jump(0)
+        order.shuffle = True
+        for __ in range(played - 1):
+            order.next()
+        insert = timed(lambda: order.insert(count // 2, 1), 10)
+        remove = timed(lambda: order.remove([count // 2]), 10)
+        print('{:>24}: {:10.1f} us insert, {:.1f} us remove' .format(
+            '{} tracks played' .format(played), insert, remove))
+
+
+if __name__ == '__main__':
+    main()
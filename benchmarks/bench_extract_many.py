@@ -0,0 +1,78 @@
+"""Benchmark the scaling of metadata.extract_many() across worker processes.
+
+A synthetic library of tagged FLAC files is written to a temporary directory and
+read with an increasing number of workers, bypassing the metadata cache.
+
+Usage: PYTHONPATH=. python benchmarks/bench_extract_many.py [FILES] [MAX_WORKERS]
+"""
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+from mutagen import flac
+
+from mosaic import metadata
+
+
+def write_template(path):
+    """Write a small FLAC file with a STREAMINFO block and a set of tags."""
+    sample_rate, channels, bits_per_sample, samples = 44100, 2, 16, 44100 * 180
+    streaminfo = struct.pack('>HH', 4096, 4096) + b'\x00' * 6
+    packed = (sample_rate << 44) | ((channels - 1) << 41) | ((bits_per_sample - 1) << 36) | samples
+    streaminfo += packed.to_bytes(8, 'big') + b'\x00' * 16
+
+    with open(path, 'wb') as file:
+        file.write(b'fLaC' + bytes([0x80]) + len(streaminfo).to_bytes(3, 'big') + streaminfo)
+        file.write(b'\xff\xf8' + b'\x00' * 4096)
+
+    audio_file = flac.FLAC(path)
+    audio_file.update({'artist': 'Artist', 'album': 'Album', 'title': 'Title',
+                       'tracknumber': '1', 'date': '2008', 'genre': 'Ambient'})
+    audio_file.save()
+
+
+def build_library(directory, count, per_album=12):
+    """Copy the template into count files spread over album directories."""
+    template = os.path.join(directory, 'template.flac')
+    write_template(template)
+
+    files = []
+    for number in range(count):
+        album = os.path.join(directory, 'album{:05d}' .format(number // per_album))
+        if not os.path.isdir(album):
+            os.makedirs(album)
+        file = os.path.join(album, '{:02d}.flac' .format(number % per_album))
+        shutil.copyfile(template, file)
+        files.append(file)
+
+    return files
+
+
+def main(count=50000, max_workers=None):
+    """Print the throughput of extract_many() for 1, 2, 4, ... workers."""
+    max_workers = max_workers or os.cpu_count() or 1
+    directory = tempfile.mkdtemp(prefix='mosaic-bench-')
+
+    try:
+        files = build_library(directory, count)
+        workers = 1
+        baseline = None
+        while workers <= max_workers:
+            start = time.perf_counter()
+            errors = sum(1 for result in metadata.extract_many(files, workers, use_cache=False)
+                         if result.error is not None)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print('{:>3} workers {:>9.0f} files/s {:>6.2f}x speedup {:>5} errors' .format(
+                  workers, count / elapsed, baseline / elapsed, errors))
+            workers *= 2
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    arguments = [int(argument) for argument in sys.argv[1:3]]
+    main(*arguments)
@@ -0,0 +1,62 @@
+"""Micro-benchmark that counts how many times mutagen parses a file per metadata call.
+
+Usage: PYTHONPATH=. python benchmarks/bench_metadata.py FILE [FILE ...]
+"""
+import sys
+import time
+
+from mutagen import flac, mp3
+
+from mosaic import metadata
+
+
+class ParseCounter(object):
+    """Wrap the load() method of the mutagen file types to count full parses."""
+
+    def __init__(self, *filetypes):
+        """Store the file types whose load() calls should be counted."""
+        self.filetypes = filetypes
+        self.originals = {}
+        self.count = 0
+
+    def __enter__(self):
+        """Replace load() on each file type with a counting wrapper."""
+        for filetype in self.filetypes:
+            original = filetype.load
+            self.originals[filetype] = original
+
+            def load(instance, *args, __original=original, **kwargs):
+                self.count += 1
+                return __original(instance, *args, **kwargs)
+
+            filetype.load = load
+        return self
+
+    def __exit__(self, *exc_info):
+        """Restore the original load() methods."""
+        for filetype, original in self.originals.items():
+            filetype.load = original
+
+
+def benchmark(function, files, repeat=20):
+    """Return the parses per call and the mean time per call of function over files."""
+    with ParseCounter(mp3.MP3, flac.FLAC) as counter:
+        start = time.perf_counter()
+        for __ in range(repeat):
+            for file in files:
+                function(file)
+        elapsed = time.perf_counter() - start
+
+    calls = repeat * len(files)
+    return counter.count / calls, elapsed / calls
+
+
+def main(files):
+    """Print the parse counts and timings of each public metadata entry point."""
+    for name in ('metadata', 'extract_metadata', 'read_track'):
+        parses, seconds = benchmark(getattr(metadata, name), files)
+        print('{:<18} {:>5.2f} parses/call {:>10.3f} ms/call' .format(name, parses, seconds * 1000))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,76 @@
+"""Benchmark filling the playlist with 100k tracks.
+
+The PlaylistModel shown in a QListView is compared with the QListWidget and
+list of QUrl that the playlist used to be, for both the time to add the tracks
+and the memory they take up.
+
+Usage: QT_QPA_PLATFORM=offscreen PYTHONPATH=. python benchmarks/bench_playlist.py [TRACKS]
+"""
+import sys
+import time
+import tracemalloc
+
+from PySide6.QtCore import QUrl
+from PySide6.QtWidgets import QApplication, QListView, QListWidget, QListWidgetItem
+
+from mosaic import playlist
+
+
+def generate_paths(count, per_album=12):
+    """Return count paths spread over album directories."""
+    return ['/music/Artist {0}/Album {1}/{2:02d} Track {2}.flac' .format(
+        number // (per_album * 8), number // per_album, number % per_album + 1)
+        for number in range(count)]
+
+
+def fill_widget(paths):
+    """Fill a QListWidget and a list of QUrl the way the playlist used to be filled."""
+    urls = []
+    view = QListWidget()
+    for path in paths:
+        urls.append(QUrl.fromLocalFile(path))
+        item = QListWidgetItem(path.rsplit('/', 1)[-1])
+        item.setToolTip(path.rsplit('/', 1)[-1])
+        view.addItem(item)
+    return view, urls
+
+
+def fill_model(paths):
+    """Fill a PlaylistModel shown in a QListView with uniform item sizes."""
+    model = playlist.PlaylistModel()
+    view = QListView()
+    view.setUniformItemSizes(True)
+    view.setModel(model)
+    model.append(paths)
+    return view, model
+
+
+def measure(name, fill, paths):
+    """Time fill, then fill again while tracing the Python memory it allocates."""
+    start = time.perf_counter()
+    result = fill(paths)
+    QApplication.processEvents()
+    elapsed = time.perf_counter() - start
+    del result
+
+    tracemalloc.start()
+    result = fill(paths)
+    current, __ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('{:>13}: {:7.1f} ms, {:7.1f} MB of Python objects' .format(name, elapsed * 1000, current / 1e6))
+    return result
+
+
+def main():
+    """Compare both playlists."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    application = QApplication([])
+    paths = generate_paths(count)
+
+    widget = measure('QListWidget', fill_widget, paths)
+    model = measure('PlaylistModel', fill_model, paths)
+    del widget, model, application
+
+
+if __name__ == '__main__':
+    main()
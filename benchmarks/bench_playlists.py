@@ -0,0 +1,53 @@
+"""Benchmark opening a stored playlist of 100k tracks.
+
+The first page is read and shown the way the player does on the GUI thread,
+and the rest is paged in as the DatabaseLoader would. The time until the view
+shows tracks is what opening a playlist costs; paging in the rest happens in
+the background.
+
+Usage: QT_QPA_PLATFORM=offscreen PYTHONPATH=. python benchmarks/bench_playlists.py [TRACKS]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from PySide6.QtWidgets import QApplication, QListView
+
+from mosaic import playlist, playlists
+
+
+def main():
+    """Store a large playlist, then time opening it."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    application = QApplication([])
+    paths = ['/music/Artist {0}/Album {1}/{2:02d} Track {2}.flac' .format(
+        number // 96, number // 12, number % 12 + 1) for number in range(count)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = playlists.PlaylistDatabase(os.path.join(directory, 'playlists.sqlite'))
+        start = time.perf_counter()
+        playlist_id = database.save('Everything', paths, [None] * count)
+        print('{:>20}: {:8.1f} ms' .format('save', (time.perf_counter() - start) * 1000))
+
+        model = playlist.PlaylistModel()
+        view = QListView()
+        view.setUniformItemSizes(True)
+        view.setModel(model)
+
+        start = time.perf_counter()
+        model.append_entries(database.tracks(playlist_id, limit=playlists.FIRST_PAGE))
+        application.processEvents()
+        print('{:>20}: {:8.1f} ms' .format('first page shown', (time.perf_counter() - start) * 1000))
+
+        for page in database.pages(playlist_id, start=len(model), page_size=5000):
+            model.append_entries(page)
+        application.processEvents()
+        print('{:>20}: {:8.1f} ms ({} tracks)' .format('all tracks paged in', (time.perf_counter() - start) * 1000,
+                                                       len(model)))
+        database.close()
+        del view, model, application
+
+
+if __name__ == '__main__':
+    main()
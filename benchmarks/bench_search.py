@@ -0,0 +1,79 @@
+"""Benchmark the latency of Catalog.search() on a large synthetic catalog.
+
+The catalog is filled directly with generated artists, albums and tracks, and
+then searched with the prefixes a user types one letter at a time.
+
+Usage: PYTHONPATH=. python benchmarks/bench_search.py [TRACKS]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from mosaic import catalog
+
+
+WORDS = ('ghost', 'night', 'river', 'electric', 'silver', 'broken', 'summer', 'shadow',
+         'heart', 'glass', 'machine', 'ocean', 'fire', 'dream', 'stone', 'wild', 'golden',
+         'empire', 'echo', 'velvet', 'midnight', 'thunder', 'crystal', 'paper', 'neon')
+GENRES = ('Rock', 'Ambient', 'Jazz', 'Electronic', 'Classical', 'Folk', 'Hip-Hop', 'Metal')
+
+
+def phrase(rng, count):
+    """Return a title made of random words."""
+    return ' '.join(rng.choice(WORDS).capitalize() for _ in range(count))
+
+
+def fill_catalog(library_catalog, count, per_album=12, albums_per_artist=8):
+    """Insert count generated tracks into the catalog in a single transaction."""
+    rng = random.Random(1)
+    connection = library_catalog.connection
+
+    with library_catalog.lock, connection:
+        for number in range(count):
+            album_number = number // per_album
+            artist = 'The {} {}' .format(phrase(rng, 1), album_number // albums_per_artist)
+            album = '{} {}' .format(phrase(rng, 2), album_number)
+            title = phrase(rng, 3)
+            genre = rng.choice(GENRES)
+            path = '/music/{}/{}/{:02d} {}.flac' .format(artist, album, number % per_album + 1, title)
+
+            artist_id = library_catalog.artist_id(artist)
+            album_id = library_catalog.album_id(artist_id, album, '2008')
+            cursor = connection.execute(
+                'INSERT INTO tracks (path, directory, title, artist_id, album_id, track_number, '
+                'genre, duration, size, mtime_ns, added) VALUES (?, ?, ?, ?, ?, ?, ?, 180, 0, 0, 0)',
+                (path, os.path.dirname(path), title, artist_id, album_id, number % per_album + 1, genre))
+            library_catalog.index_track(cursor.lastrowid, title, artist, album, genre, path)
+
+
+def main():
+    """Fill a temporary catalog and time searches as a query is typed."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    directory = tempfile.mkdtemp()
+
+    try:
+        library_catalog = catalog.Catalog(os.path.join(directory, 'library.sqlite'))
+        start = time.perf_counter()
+        fill_catalog(library_catalog, count)
+        print('filled {} tracks in {:.1f} s' .format(count, time.perf_counter() - start))
+
+        for query in ('g', 'gh', 'gho', 'ghost', 'ghost n', 'ghost night', 'ghost night flac',
+                      'ambient', 'midnight thunder', 'zzz'):
+            timings = []
+            for _ in range(5):
+                start = time.perf_counter()
+                rows = library_catalog.search(query)
+                timings.append(time.perf_counter() - start)
+            print('{:>20}: {:4d} results, best {:6.2f} ms, worst {:6.2f} ms' .format(
+                repr(query), len(rows), min(timings) * 1000, max(timings) * 1000))
+
+        library_catalog.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,7 @@
 from PySide6.QtCore import Qt
-from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import QDialog, QLabel, QVBoxLayout
 
-from mosaic import utilities
+from mosaic import icons
 
 
 class AboutDialog(QDialog):
@@ -13,8 +12,7 @@ class AboutDialog(QDialog):
         super(AboutDialog, self).__init__(parent)
         self.setWindowTitle('About')
 
-        help_icon = utilities.resource_filename('mosaic.images', 'md_help.png')
-        self.setWindowIcon(QIcon(help_icon))
+        self.setWindowIcon(icons.icon('md_help.png'))
         self.resize(300, 200)
 
         author = QLabel('Created by mandeep')
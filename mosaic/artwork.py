@@ -0,0 +1,287 @@
+import collections
+import hashlib
+import os
+import threading
+
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QImage, QPixmap
+
+from mosaic import cache, defaults, headers
+
+
+def artwork_key(data):
+    """Return the content hash that identifies an image regardless of which file embeds it."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def cover_key(cover):
+    """Return the cache key of a headers.Artwork reference.
+
+    An image file next to the tracks is keyed by its identity, so it is found
+    without being read; an embedded picture by the hash of its bytes. The
+    catalog, the indexer and the player all key thumbnails this way.
+    """
+    if cover.identity is not None:
+        return cover.identity
+
+    return artwork_key(cover.data())
+
+
+class ArtworkCache(object):
+    """A content-addressed cache of decoded cover art.
+
+    Images are identified by a hash of their encoded bytes, so every track of an
+    album that embeds the same cover shares one entry. Decoded images are kept in
+    an in-memory LRU bounded by memory_budget bytes. Behind it, an on-disk tier
+    holds thumbnails pre-scaled to the window sizes of the player, so a cover that
+    was decoded in an earlier session is loaded from a small PNG instead of the
+    full resolution scan.
+    """
+
+    def __init__(self, directory=None, memory_budget=64 * 1024 * 1024):
+        """Initialize the memory tier and the thumbnail directory."""
+        if directory is None:
+            directory = os.path.join(cache.cache_directory(), 'artwork')
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self.memory_used = 0
+        self.images = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.decodes = 0
+
+    def thumbnail_path(self, key, size):
+        """Return the path of the on-disk thumbnail of an image at the given size."""
+        if not key.isalnum():  # Identities such as file paths are hashed into a file name
+            key = artwork_key(key.encode('utf-8', 'surrogateescape'))
+
+        return os.path.join(self.directory, key[:2], '{}_{}.png' .format(key, size))
+
+    def image(self, data, size, key=None):
+        """Return the image of the encoded bytes in data scaled to fit within size.
+
+        The memory tier is checked first, then the thumbnail directory, and only
+        then is the image decoded from data. QImage is safe to use from worker
+        threads, unlike QPixmap.
+        """
+        if key is None:
+            key = artwork_key(data)
+
+        return self.lookup(key, size, lambda: data)
+
+    def cover_image(self, cover, size):
+        """Return the image of a headers.Artwork reference scaled to fit within size.
+
+        A reference with an identity is looked up without reading the picture at
+        all, so an image file shared by a folder of tracks is read and decoded once.
+        """
+        if cover.identity is not None:
+            return self.lookup(cover.identity, size, cover.data)
+
+        data = cover.data()
+        return self.lookup(artwork_key(data), size, lambda: data)
+
+    def pixmap(self, data, size, key=None):
+        """Return the image of the encoded bytes in data as a QPixmap for display."""
+        return QPixmap.fromImage(self.image(data, size, key))
+
+    def cover_key(self, cover):
+        """Return the cache key of a headers.Artwork reference."""
+        return cover_key(cover)
+
+    def lookup(self, key, size, load):
+        """Return the image cached under key at the given size, calling load() for its bytes on a miss."""
+        with self.lock:
+            image = self.images.get((key, size))
+            if image is not None:
+                self.images.move_to_end((key, size))
+                self.hits += 1
+                return image
+
+        thumbnail = self.thumbnail_path(key, size)
+        image = QImage(thumbnail) if os.path.exists(thumbnail) else QImage()
+
+        if not image.isNull():
+            self.disk_hits += 1
+        else:
+            image = self.decode(load(), size)
+            if image.isNull():
+                return image
+            self.save_thumbnail(image, thumbnail)
+
+        self.remember((key, size), image)
+        return image
+
+    def decode(self, data, size):
+        """Decode the encoded bytes in data and shrink the image to fit within size."""
+        self.decodes += 1
+        image = QImage.fromData(data)
+
+        if not image.isNull() and (image.width() > size or image.height() > size):
+            image = image.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatio,
+                                 Qt.TransformationMode.SmoothTransformation)
+
+        return image
+
+    def prescale(self, data, sizes=defaults.WINDOW_SIZES, key=None):
+        """Decode an image once and write its thumbnails for every window size under key.
+
+        The key defaults to the hash of the image.
+        """
+        if key is None:
+            key = artwork_key(data)
+        image = QImage.fromData(data)
+        if image.isNull():
+            return key
+
+        for size in sizes:
+            thumbnail = self.thumbnail_path(key, size)
+            if not os.path.exists(thumbnail):
+                scaled = image
+                if image.width() > size or image.height() > size:
+                    scaled = image.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatio,
+                                          Qt.TransformationMode.SmoothTransformation)
+                self.save_thumbnail(scaled, thumbnail)
+
+        return key
+
+    def save_thumbnail(self, image, thumbnail):
+        """Write a scaled image to the thumbnail directory.
+
+        The image is written to a temporary file first so that a reader in
+        another process never sees a partially written thumbnail.
+        """
+        directory = os.path.dirname(thumbnail)
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        temporary = '{}.{}.tmp' .format(thumbnail, threading.get_ident())
+        if image.save(temporary, 'PNG'):
+            os.replace(temporary, thumbnail)
+
+    def remember(self, key, image):
+        """Add an image to the memory tier, evicting the least recently used images over budget."""
+        with self.lock:
+            if key in self.images:
+                return
+
+            self.images[key] = image
+            self.memory_used += image.sizeInBytes()
+
+            while self.memory_used > self.memory_budget and len(self.images) > 1:
+                __, evicted = self.images.popitem(last=False)
+                self.memory_used -= evicted.sizeInBytes()
+
+    def clear(self):
+        """Empty the memory tier."""
+        with self.lock:
+            self.images.clear()
+            self.memory_used = 0
+
+
+# Image files next to the tracks that are used as cover art, in order of preference
+SIDECAR_NAMES = ('cover', 'folder', 'front', 'album', 'albumart')
+SIDECAR_EXTENSIONS = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png',
+                      '.bmp': 'image/bmp', '.gif': 'image/gif', '.webp': 'image/webp'}
+
+
+class FolderArtwork(object):
+    """Finds cover art stored as an image file in the directory of a track.
+
+    The result of looking at a directory, including finding nothing, is cached
+    until the modification time of the directory changes, so an album directory
+    is listed once rather than once per track. At most max_directories results
+    are kept.
+    """
+
+    def __init__(self, max_directories=4096):
+        """Initialize an empty directory cache."""
+        self.max_directories = max_directories
+        self.directories = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.listings = 0
+
+    def find(self, file):
+        """Return a headers.Artwork reference to the sidecar image of file or None."""
+        directory = os.path.dirname(os.path.abspath(file))
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+
+        with self.lock:
+            cached = self.directories.get(directory)
+            if cached is not None and cached[0] == mtime_ns:
+                self.directories.move_to_end(directory)
+                return cached[1]
+
+        cover = self.scan(directory)
+
+        with self.lock:
+            self.directories[directory] = (mtime_ns, cover)
+            self.directories.move_to_end(directory)
+            while len(self.directories) > self.max_directories:
+                self.directories.popitem(last=False)
+
+        return cover
+
+    def scan(self, directory):
+        """List the directory and return a reference to its preferred sidecar image or None."""
+        self.listings += 1
+        candidates = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name, extension = os.path.splitext(entry.name.lower())
+                    if (name in SIDECAR_NAMES and extension in SIDECAR_EXTENSIONS and
+                            name not in candidates and entry.is_file()):
+                        candidates[name] = entry
+        except OSError:
+            return None
+
+        for name in SIDECAR_NAMES:
+            entry = candidates.get(name)
+            if entry is not None:
+                stat = entry.stat()
+                mime = SIDECAR_EXTENSIONS[os.path.splitext(entry.name.lower())[1]]
+                identity = '{}:{}' .format(entry.path, stat.st_mtime_ns)
+                return headers.Artwork(entry.path, 0, stat.st_size, mime, identity=identity)
+
+        return None
+
+    def invalidate(self, directory=None):
+        """Forget the cached result of a directory, or of every directory."""
+        with self.lock:
+            if directory is None:
+                self.directories.clear()
+            else:
+                self.directories.pop(os.path.abspath(directory), None)
+
+
+_artwork_cache = None
+_folder_artwork = None
+
+
+def artwork_cache():
+    """Return the shared ArtworkCache, creating it on first use."""
+    global _artwork_cache
+
+    if _artwork_cache is None:
+        _artwork_cache = ArtworkCache()
+
+    return _artwork_cache
+
+
+def folder_artwork():
+    """Return the shared FolderArtwork, creating it on first use."""
+    global _folder_artwork
+
+    if _folder_artwork is None:
+        _folder_artwork = FolderArtwork()
+
+    return _folder_artwork
@@ -0,0 +1,231 @@
+import json
+import os
+import sqlite3
+import threading
+
+import mutagen
+from platformdirs import PlatformDirs
+
+from mosaic.headers import Artwork
+
+
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    tags TEXT,
+    sample_rate INTEGER,
+    bitrate INTEGER,
+    bitrate_mode TEXT,
+    bits_per_sample INTEGER,
+    length REAL,
+    artwork_offset INTEGER,
+    artwork_length INTEGER,
+    artwork_mime TEXT,
+    error TEXT,
+    accessed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tracks_accessed ON tracks (accessed);
+"""
+
+
+def cache_directory():
+    """Return the user cache directory of Mosaic, creating it if it doesn't exist."""
+    directory = PlatformDirs(appname='mosaic-music', appauthor=False).user_cache_dir
+
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    return directory
+
+
+def file_key(file):
+    """Return the (size, mtime_ns) pair that identifies the current version of a file."""
+    stat = os.stat(file)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class MetadataCache(object):
+    """A persistent SQLite cache of parsed audio file metadata.
+
+    Entries are keyed by the path, size and modification time of a file, so an
+    edited file is treated as a miss and parsed again. Files that mutagen fails to
+    parse are stored as negative entries so they aren't retried until they change.
+    Once the cache holds more than max_entries rows, the least recently used rows
+    are evicted.
+    """
+
+    def __init__(self, database=None, max_entries=100000):
+        """Open (or create) the cache database."""
+        if database is None:
+            database = os.path.join(cache_directory(), 'metadata.sqlite')
+
+        self.database = database
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.touched = {}
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        # The cache can always be rebuilt, so an outdated schema is simply dropped
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            self.connection.execute('DROP TABLE IF EXISTS tracks')
+            self.connection.execute('PRAGMA user_version = {}' .format(SCHEMA_VERSION))
+        self.connection.executescript(SCHEMA)
+        self.clock = self.connection.execute('SELECT COALESCE(MAX(accessed), 0) FROM tracks').fetchone()[0]
+
+    def tick(self):
+        """Return the next value of the logical clock used to order entries by use."""
+        self.clock += 1
+        return self.clock
+
+    def get(self, file):
+        """Return the cached fields of file as a dictionary or None if the file isn't cached.
+
+        The dictionary holds the TrackInfo fields of the file. The image itself
+        isn't cached: artwork is an Artwork reference to its location in the
+        file, whose offset is None if the location isn't known. A cached parse
+        failure raises the same mutagen.MutagenError that parsing the file would.
+        """
+        try:
+            size, mtime_ns = file_key(file)
+        except OSError:
+            return None
+
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT tags, sample_rate, bitrate, bitrate_mode, bits_per_sample, length, '
+                'artwork_offset, artwork_length, artwork_mime, error FROM tracks '
+                'WHERE path = ? AND size = ? AND mtime_ns = ?',
+                (file, size, mtime_ns)).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            # Access times are written with the next insert rather than on every hit
+            self.touched[file] = self.tick()
+
+        (tags, sample_rate, bitrate, bitrate_mode, bits_per_sample, length,
+         artwork_offset, artwork_length, artwork_mime, error) = row
+        if error is not None:
+            raise mutagen.MutagenError(error)
+
+        artwork = None
+        if artwork_length is not None:
+            artwork = Artwork(file, artwork_offset, artwork_length, artwork_mime)
+
+        return {'tags': json.loads(tags), 'sample_rate': sample_rate, 'bitrate': bitrate,
+                'bitrate_mode': bitrate_mode, 'bits_per_sample': bits_per_sample,
+                'length': length, 'artwork': artwork}
+
+    def put(self, track):
+        """Store a parsed TrackInfo record in the cache."""
+        try:
+            size, mtime_ns = file_key(track.path)
+        except OSError:
+            return
+
+        bitrate_mode = str(track.bitrate_mode) if track.bitrate_mode is not None else None
+        artwork = track.artwork
+        if artwork is not None:
+            artwork_values = (artwork.offset, artwork.length, artwork.mime)
+        else:
+            artwork_values = (None, None, None)
+
+        self.write((track.path, size, mtime_ns, json.dumps(track.tags), track.sample_rate,
+                    track.bitrate, bitrate_mode, track.bits_per_sample, track.length)
+                   + artwork_values + (None,))
+
+    def put_failure(self, file, error):
+        """Store a negative entry for a file that could not be parsed."""
+        try:
+            size, mtime_ns = file_key(file)
+        except OSError:
+            return
+
+        self.write((file, size, mtime_ns, None, None, None, None, None, None, None, None, None,
+                    str(error) or type(error).__name__))
+
+    def write(self, values):
+        """Insert or replace a row and evict the least recently used rows if needed."""
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                    values + (self.tick(),))
+            self.flush()
+            self.writes += 1
+            # Counting the rows is a table scan, so the bound is only enforced periodically
+            if self.writes % 256 == 1:
+                self.evict()
+            self.connection.commit()
+
+    def flush(self):
+        """Write the pending access times of cache hits.
+
+        Must be called with the lock held.
+        """
+        if self.touched:
+            self.connection.executemany('UPDATE tracks SET accessed = ? WHERE path = ?',
+                                        [(tick, path) for path, tick in self.touched.items()])
+            self.touched.clear()
+
+    def evict(self):
+        """Remove the least recently used rows above max_entries.
+
+        Must be called with the lock held.
+        """
+        self.flush()
+        count = self.connection.execute('SELECT COUNT(*) FROM tracks').fetchone()[0]
+        if count > self.max_entries:
+            self.connection.execute(
+                'DELETE FROM tracks WHERE path IN '
+                '(SELECT path FROM tracks ORDER BY accessed LIMIT ?)',
+                (count - self.max_entries,))
+
+    def invalidate(self, path=None):
+        """Remove the entry of a file, every entry under a directory, or the whole cache."""
+        with self.lock:
+            if path is None:
+                self.connection.execute('DELETE FROM tracks')
+            else:
+                directory = os.path.join(path, '')
+                self.connection.execute(
+                    'DELETE FROM tracks WHERE path = ? OR substr(path, 1, ?) = ?',
+                    (path, len(directory), directory))
+            self.connection.commit()
+
+    def __len__(self):
+        """Return the number of entries in the cache."""
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM tracks').fetchone()[0]
+
+    def stats(self):
+        """Return the hit and miss counts along with the number of entries."""
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self)}
+
+    def close(self):
+        """Close the connection to the cache database."""
+        with self.lock:
+            self.flush()
+            self.connection.commit()
+            self.connection.close()
+
+
+_metadata_cache = None
+
+
+def metadata_cache():
+    """Return the shared MetadataCache, opening it on first use."""
+    global _metadata_cache
+
+    if _metadata_cache is None:
+        _metadata_cache = MetadataCache()
+
+    return _metadata_cache
@@ -0,0 +1,537 @@
+import collections
+import os
+import sqlite3
+import threading
+import time
+
+from platformdirs import PlatformDirs
+
+from mosaic import formats, metadata
+from mosaic.artwork import cover_key, folder_artwork
+
+
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artists (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS albums (
+    id INTEGER PRIMARY KEY,
+    artist_id INTEGER NOT NULL REFERENCES artists (id),
+    title TEXT NOT NULL,
+    date TEXT,
+    art_hash TEXT,
+    art_length INTEGER,
+    cover_path TEXT,
+    UNIQUE (artist_id, title)
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    directory TEXT NOT NULL,
+    title TEXT,
+    artist_id INTEGER NOT NULL REFERENCES artists (id),
+    album_id INTEGER NOT NULL REFERENCES albums (id),
+    track_number INTEGER,
+    disc_number INTEGER,
+    genre TEXT,
+    date TEXT,
+    duration REAL,
+    art_hash TEXT,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    added REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS directories (
+    directory TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tracks_album ON tracks (album_id, disc_number, track_number);
+CREATE INDEX IF NOT EXISTS tracks_artist ON tracks (artist_id);
+CREATE INDEX IF NOT EXISTS tracks_added ON tracks (added);
+CREATE INDEX IF NOT EXISTS tracks_directory ON tracks (directory);
+CREATE INDEX IF NOT EXISTS albums_artist ON albums (artist_id, title);
+"""
+
+# The search index holds one row per track, whose rowid is the id of the track.
+# Prefix indexes keep the queries made while typing the first letters fast.
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS track_search USING fts5 (
+    title, artist, album, genre, filename,
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'
+);
+"""
+
+
+def catalog_path():
+    """Return the path of the catalog database in the user data directory."""
+    directory = PlatformDirs(appname='mosaic-music', appauthor=False).user_data_dir
+
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    return os.path.join(directory, 'library.sqlite')
+
+
+def leading_number(value):
+    """Return the number at the start of a tag such as '3/12', or None if there isn't one."""
+    digits = ''
+    for character in value.strip():
+        if not character.isdigit():
+            break
+        digits += character
+
+    return int(digits) if digits else None
+
+
+def walk_audio_files(directory, directories=None, failed=None, unchanged=None):
+    """Yield an os.DirEntry for every audio file below directory.
+
+    The path of every directory walked, including directory itself, is appended
+    to the directories list if one is given, and the path of every directory
+    that couldn't be listed in full, or entry that couldn't be read, to the
+    failed list. unchanged, if given, is called with the path of every
+    directory before it is listed; when it returns a list of subdirectories
+    rather than None, the directory isn't listed and only those are walked.
+    """
+    pending = [directory]
+
+    while pending:
+        current = pending.pop()
+        subdirectories = unchanged(current) if unchanged is not None else None
+        if subdirectories is not None:
+            if directories is not None:
+                directories.append(current)
+            pending.extend(subdirectories)
+            continue
+        try:
+            with os.scandir(current) as entries:
+                if directories is not None:
+                    directories.append(current)
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif formats.is_audio_file(entry.name):
+                            yield entry
+                    except OSError:
+                        if failed is not None:
+                            failed.append(entry.path)
+        except OSError:
+            if failed is not None:
+                failed.append(current)
+
+
+def search_query(text):
+    """Turn the text typed in the search box into an FTS5 query.
+
+    Every word becomes a quoted prefix query, so that partial words match and
+    characters such as quotes or hyphens aren't read as FTS5 syntax. Returns
+    None if the text has no words.
+    """
+    words = text.split()
+    if not words:
+        return None
+
+    return ' '.join('"{}"*' .format(word.replace('"', '""')) for word in words)
+
+
+def subtree(directory):
+    """Return the SQL condition and parameters matching tracks at or below directory."""
+    prefix = os.path.join(directory, '')
+    return 'directory = ? OR substr(directory, 1, ?) = ?', (directory, len(prefix), prefix)
+
+
+class ScanReport(object):
+    """The number of files a scan touched, along with the directories it walked, skipped or couldn't read."""
+
+    def __init__(self):
+        """Start with every count at zero."""
+        self.added = 0
+        self.updated = 0
+        self.removed = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.bytes = 0
+        self.directories = []
+        self.unreadable = []
+        self.skipped = 0
+
+    @property
+    def touched(self):
+        """Return the number of files that were parsed or removed."""
+        return self.added + self.updated + self.removed
+
+    def __str__(self):
+        """Describe the counts for the status line of the library dock."""
+        return '{} added, {} updated, {} removed, {} unchanged' .format(
+            self.added, self.updated, self.removed, self.unchanged)
+
+
+class Catalog(object):
+    """A SQLite catalog of the tracks, albums and artists of the media library.
+
+    The catalog is filled by scan() from the tags of the files below the media
+    library path and is indexed for the queries the library views need. Scans
+    are incremental, so only files that changed since the last scan are read.
+    Writes go through one connection behind a lock, held for a whole batch of
+    tracks. Reads use a second connection behind a lock of their own, which WAL
+    mode lets read while a scan is writing, so the library views never wait for
+    the scanner.
+    """
+
+    def __init__(self, database=None):
+        """Open (or create) the catalog database."""
+        if database is None:
+            database = catalog_path()
+
+        self.database = database
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('PRAGMA foreign_keys=ON')
+
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            for table in ('track_search', 'directories', 'tracks', 'albums', 'artists'):
+                self.connection.execute('DROP TABLE IF EXISTS {}' .format(table))
+            self.connection.execute('PRAGMA user_version = {}' .format(SCHEMA_VERSION))
+        self.connection.executescript(SCHEMA)
+        self.connection.executescript(SEARCH_SCHEMA)
+        self.read_lock = threading.Lock()
+        self.read_connection = sqlite3.connect(database, check_same_thread=False)
+
+    def query(self, sql, parameters=()):
+        """Run a read query on the read connection and return all of its rows."""
+        with self.read_lock:
+            return self.read_connection.execute(sql, parameters).fetchall()
+
+    def artist_id(self, name):
+        """Return the id of an artist, adding the artist if needed."""
+        self.connection.execute('INSERT OR IGNORE INTO artists (name) VALUES (?)', (name,))
+        return self.connection.execute('SELECT id FROM artists WHERE name = ?', (name,)).fetchone()[0]
+
+    def album_id(self, artist_id, title, date):
+        """Return the id of an album, adding the album if needed."""
+        self.connection.execute('INSERT OR IGNORE INTO albums (artist_id, title, date) VALUES (?, ?, ?)',
+                                (artist_id, title, date))
+        return self.connection.execute('SELECT id FROM albums WHERE artist_id = ? AND title = ?',
+                                       (artist_id, title)).fetchone()[0]
+
+    def album_art(self, album_id, track):
+        """Return the art hash of a track, hashing its cover only when the album needs it.
+
+        The art hash is the artwork.cover_key() of the cover, which the player
+        looks thumbnails up by as well. Tracks of an album almost always embed
+        the same cover, so a cover of the same length as the album's is assumed
+        to be the album's cover rather than read from the file again.
+        """
+        cover = track.artwork or folder_artwork().find(track.path)
+        if cover is None:
+            return None
+
+        art_hash, art_length = self.connection.execute(
+            'SELECT art_hash, art_length FROM albums WHERE id = ?', (album_id,)).fetchone()
+        if art_hash is not None and art_length == cover.length:
+            return art_hash
+
+        try:
+            track_hash = cover_key(cover)
+        except (OSError, TypeError, ValueError):
+            # A reference that can't be read costs the track its cover, not the scan
+            return None
+
+        if art_hash is None:
+            self.connection.execute('UPDATE albums SET art_hash = ?, art_length = ?, cover_path = ? '
+                                    'WHERE id = ?', (track_hash, cover.length, track.path, album_id))
+        return track_hash
+
+    def index_track(self, track_id, title, artist, album, genre, path):
+        """Replace the search index row of a track.
+
+        Must be called with the lock held, inside a transaction.
+        """
+        self.connection.execute('DELETE FROM track_search WHERE rowid = ?', (track_id,))
+        self.connection.execute('INSERT INTO track_search (rowid, title, artist, album, genre, filename) '
+                                'VALUES (?, ?, ?, ?, ?, ?)',
+                                (track_id, title, artist, album, genre, os.path.basename(path)))
+
+    def add_track(self, track, added=None):
+        """Insert or update a track from a TrackInfo record.
+
+        Must be called with the lock held, inside a transaction.
+        """
+        stat = os.stat(track.path)
+        artist = track.tag('artist', '')
+        album_artist = track.tag('albumartist', '') or artist
+        date = track.tag('date', '')
+
+        artist_id = self.artist_id(artist)
+        album_artist_id = self.artist_id(album_artist) if album_artist != artist else artist_id
+        album_id = self.album_id(album_artist_id, track.tag('album', ''), date)
+        art_hash = self.album_art(album_id, track)
+
+        self.connection.execute(
+            'INSERT INTO tracks (path, directory, title, artist_id, album_id, track_number, '
+            'disc_number, genre, date, duration, art_hash, size, mtime_ns, added) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (path) DO UPDATE SET title = excluded.title, '
+            'artist_id = excluded.artist_id, album_id = excluded.album_id, '
+            'track_number = excluded.track_number, disc_number = excluded.disc_number, '
+            'genre = excluded.genre, date = excluded.date, duration = excluded.duration, '
+            'art_hash = excluded.art_hash, size = excluded.size, mtime_ns = excluded.mtime_ns',
+            (track.path, os.path.dirname(track.path), track.tag('title', ''), artist_id,
+             album_id, leading_number(track.tag('tracknumber', '')),
+             leading_number(track.tag('discnumber', '')), track.tag('genre', ''), date,
+             track.length, art_hash, stat.st_size, stat.st_mtime_ns,
+             added if added is not None else time.time()))
+
+        track_id = self.connection.execute('SELECT id FROM tracks WHERE path = ?',
+                                           (track.path,)).fetchone()[0]
+        self.index_track(track_id, track.tag('title', ''), artist, track.tag('album', ''),
+                         track.tag('genre', ''), track.path)
+
+    def add_tracks(self, tracks):
+        """Insert or update many TrackInfo records in a single transaction."""
+        with self.lock, self.connection:
+            for track in tracks:
+                try:
+                    self.add_track(track)
+                except OSError:
+                    continue
+
+    def scan(self, directory, progress=None, workers=None, batch_size=256, cancelled=None, full=False):
+        """Bring the catalog up to date with the audio files at or below directory.
+
+        The size and modification time of every file found are compared with the
+        catalog, so only new and changed files are parsed, and files that are no
+        longer there are removed. directory itself is always listed, but below it a
+        directory whose modification time is the one catalogued by the last scan
+        isn't listed again: its tracks and subdirectories are taken from the
+        catalog. A file rewritten in place doesn't change the modification time of
+        its directory, so such changes rely on the LibraryWatcher, whose rescans
+        start at the directory that changed, or on a full scan. The tracks below a
+        directory that couldn't be listed are kept, since there is no telling
+        whether they are gone. The tags are read with metadata.extract_many() and
+        written in batches. progress, if given, is called with (files done, files to
+        parse) after each batch, and the scan stops early once cancelled() returns
+        True. A full scan lists every directory and parses every file again rather
+        than trusting the catalog and the metadata cache. Returns a ScanReport.
+        """
+        report = ScanReport()
+        started = time.time_ns()
+        condition, parameters = subtree(directory)
+        known = {}
+        tracks = collections.defaultdict(list)
+        for path, track_directory, size, mtime_ns in self.query(
+                'SELECT path, directory, size, mtime_ns FROM tracks WHERE ' + condition, parameters):
+            known[path] = (size, mtime_ns)
+            tracks[track_directory].append(path)
+        catalogued = {}
+        subdirectories = collections.defaultdict(list)
+        for path, parent, mtime_ns in self.query(
+                'SELECT directory, parent, mtime_ns FROM directories WHERE ' + condition, parameters):
+            catalogued[path] = mtime_ns
+            subdirectories[parent].append(path)
+        mtimes = {}
+
+        def unchanged(path):
+            """Return the catalogued subdirectories of a directory that didn't change, or None to list it."""
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                return None
+            mtimes[path] = mtime_ns
+            if full or path == directory or catalogued.get(path) != mtime_ns:
+                return None
+
+            for file in tracks[path]:
+                del known[file]
+            report.unchanged += len(tracks[path])
+            report.skipped += 1
+            return subdirectories[path]
+
+        changed = []
+        for entry in walk_audio_files(directory, report.directories, report.unreadable, unchanged):
+            version = known.pop(entry.path, None)
+            try:
+                stat = entry.stat()
+            except OSError:
+                report.unreadable.append(entry.path)
+                continue
+            if version is None:
+                changed.append(entry.path)
+                report.added += 1
+            elif full or version != (stat.st_size, stat.st_mtime_ns):
+                changed.append(entry.path)
+                report.updated += 1
+            else:
+                report.unchanged += 1
+                continue
+            report.bytes += stat.st_size
+
+        # Whatever is left in known wasn't found on disk, unless it is below an unreadable directory
+        unreadable = set(report.unreadable)
+        prefixes = tuple(os.path.join(path, '') for path in unreadable)
+        if unreadable:
+            known = [path for path in known if path not in unreadable and not path.startswith(prefixes)]
+        self.remove_tracks(known)
+        report.removed = len(known)
+
+        total = len(changed)
+        done = 0
+        batch = []
+
+        if progress is not None:
+            progress(0, total)
+
+        if changed:
+            for result in metadata.extract_many(changed, workers=workers, context='spawn',
+                                                refresh=full):
+                if cancelled is not None and cancelled():
+                    break
+                done += 1
+                if result.track is not None:
+                    batch.append(result.track)
+                else:
+                    report.failed += 1
+                    # Files that couldn't be parsed are tried again by the next scan
+                    unreadable.add(os.path.dirname(result.path))
+                if len(batch) >= batch_size:
+                    self.add_tracks(batch)
+                    batch = []
+                if progress is not None and done % batch_size == 0:
+                    progress(done, total)
+
+        self.add_tracks(batch)
+        self.remove_orphans()
+        if done == total:
+            unreadable.update(os.path.dirname(path) for path in report.unreadable)
+            self.update_directories(directory, mtimes, unreadable, prefixes, started)
+        if progress is not None:
+            progress(done, total)
+
+        return report
+
+    def update_directories(self, directory, mtimes, unreadable, prefixes, started):
+        """Record the modification times of the directories a complete scan walked.
+
+        Directories below directory that weren't walked are forgotten, unless
+        they are below an unreadable one. Directories that had an entry that
+        couldn't be read, or whose modification time is less than a second
+        before the scan started and may yet change within the same tick, are
+        left out so the next scan lists them again.
+        """
+        racy = started - 1000000000
+        rows = [(path, os.path.dirname(path), mtime_ns) for path, mtime_ns in mtimes.items()
+                if path not in unreadable and mtime_ns < racy]
+        condition, parameters = subtree(directory)
+
+        with self.lock, self.connection:
+            gone = [(path,) for path, in self.connection.execute(
+                'SELECT directory FROM directories WHERE ' + condition, parameters)
+                if path not in mtimes and path not in unreadable and not path.startswith(prefixes)]
+            self.connection.executemany('DELETE FROM directories WHERE directory = ?', gone)
+            self.connection.executemany('DELETE FROM directories WHERE directory = ?',
+                                        [(path,) for path in unreadable])
+            self.connection.executemany('INSERT OR REPLACE INTO directories VALUES (?, ?, ?)', rows)
+
+    def remove_tracks(self, paths):
+        """Remove the tracks with the given paths from the catalog."""
+        paths = [(path,) for path in paths]
+        with self.lock, self.connection:
+            self.connection.executemany('DELETE FROM track_search WHERE rowid = '
+                                        '(SELECT id FROM tracks WHERE path = ?)', paths)
+            self.connection.executemany('DELETE FROM tracks WHERE path = ?', paths)
+
+    def remove_orphans(self):
+        """Remove albums and artists that no longer have any tracks."""
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM albums WHERE id NOT IN (SELECT album_id FROM tracks)')
+            self.connection.execute('DELETE FROM artists WHERE id NOT IN (SELECT artist_id FROM tracks) '
+                                    'AND id NOT IN (SELECT artist_id FROM albums)')
+
+    def artists(self, limit=-1, offset=0):
+        """Return (id, name) rows of every artist that has an album, sorted by name.
+
+        limit and offset select a page of the rows; a negative limit returns all of them.
+        """
+        return self.query('SELECT id, name FROM artists WHERE id IN (SELECT artist_id FROM albums) '
+                          'ORDER BY name COLLATE NOCASE, id LIMIT ? OFFSET ?', (limit, offset))
+
+    def albums_by_artist(self, artist_id, limit=-1, offset=0):
+        """Return (id, title, date, art_hash) rows of the albums of an artist."""
+        return self.query('SELECT id, title, date, art_hash FROM albums WHERE artist_id = ? '
+                          'ORDER BY date, title COLLATE NOCASE, id LIMIT ? OFFSET ?',
+                          (artist_id, limit, offset))
+
+    def tracks_by_album(self, album_id, limit=-1, offset=0):
+        """Return (id, path, title, track_number, duration) rows of an album in track order."""
+        return self.query('SELECT id, path, title, track_number, duration FROM tracks '
+                          'WHERE album_id = ? ORDER BY disc_number, track_number, path LIMIT ? OFFSET ?',
+                          (album_id, limit, offset))
+
+    def albums(self, limit=-1, offset=0):
+        """Return (id, title, artist, art_hash, cover_path) rows of every album by artist and date."""
+        return self.query('SELECT albums.id, albums.title, artists.name, albums.art_hash, albums.cover_path '
+                          'FROM albums JOIN artists ON artists.id = albums.artist_id '
+                          'ORDER BY artists.name COLLATE NOCASE, albums.date, albums.title COLLATE NOCASE, '
+                          'albums.id LIMIT ? OFFSET ?', (limit, offset))
+
+    def album_paths(self, album_id):
+        """Return the paths of the tracks of an album in track order."""
+        return [row[1] for row in self.tracks_by_album(album_id)]
+
+    def artist_paths(self, artist_id):
+        """Return the paths of the tracks of every album of an artist in album and track order."""
+        return [row[0] for row in self.query(
+            'SELECT tracks.path FROM tracks JOIN albums ON albums.id = tracks.album_id '
+            'WHERE albums.artist_id = ? ORDER BY albums.date, albums.title COLLATE NOCASE, '
+            'albums.id, tracks.disc_number, tracks.track_number, tracks.path', (artist_id,))]
+
+    def recently_added(self, limit=100):
+        """Return (id, path, title, added) rows of the most recently added tracks."""
+        return self.query('SELECT id, path, title, added FROM tracks ORDER BY added DESC LIMIT ?',
+                          (limit,))
+
+    def search(self, text, limit=200):
+        """Return (id, path, title, artist, album) rows of the tracks matching the text.
+
+        Each word of the text must prefix a word of the title, artist, album,
+        genre or file name of a track. Like every read, searches don't wait for
+        the scanner.
+        """
+        match = search_query(text)
+        if match is None:
+            return []
+
+        return self.query(
+            'SELECT tracks.id, tracks.path, tracks.title, artists.name, albums.title '
+            'FROM (SELECT rowid FROM track_search WHERE track_search MATCH ? LIMIT ?) AS matches '
+            'JOIN tracks ON tracks.id = matches.rowid '
+            'JOIN artists ON artists.id = tracks.artist_id '
+            'JOIN albums ON albums.id = tracks.album_id '
+            'ORDER BY artists.name COLLATE NOCASE, albums.date, tracks.disc_number, tracks.track_number',
+            (match, limit))
+
+    def album_covers(self):
+        """Return (art_hash, cover_path) rows of every album with cover art."""
+        return self.query('SELECT art_hash, cover_path FROM albums '
+                          'WHERE art_hash IS NOT NULL AND cover_path IS NOT NULL')
+
+    def paths(self):
+        """Return the path of every track in the catalog."""
+        return [row[0] for row in self.query('SELECT path FROM tracks ORDER BY path')]
+
+    def track_count(self):
+        """Return the number of tracks in the catalog."""
+        return self.query('SELECT COUNT(*) FROM tracks')[0][0]
+
+    def close(self):
+        """Close the connections to the catalog database."""
+        with self.lock, self.read_lock:
+            self.read_connection.close()
+            self.connection.close()
@@ -3,15 +3,14 @@ import os
 from platformdirs import PlatformDirs
 
 from PySide6.QtCore import Qt
-from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import (QComboBox, QCheckBox, QDialog, QDialogButtonBox, QFileDialog,
                              QGroupBox, QHBoxLayout, QLabel, QLineEdit, QListWidget,
-                             QListWidgetItem, QPushButton, QRadioButton, QStackedWidget,
-                             QVBoxLayout, QWidget)
+                             QListWidgetItem, QPushButton, QRadioButton, QSpinBox,
+                             QStackedWidget, QVBoxLayout, QWidget)
 
 import toml
 
-from mosaic import utilities
+from mosaic import icons
 
 
 class MediaLibrary(QWidget):
@@ -101,9 +100,19 @@ class Playback(QWidget):
 
         self.cover_art_playback = QCheckBox('Cover Art Playback')
         self.playlist_save_checkbox = QCheckBox('Save Playlist on Close')
+        self.gapless_checkbox = QCheckBox('Gapless Playback')
+        self.prefetch_depth_box = QSpinBox()
+        self.prefetch_depth_box.setRange(0, 10)
+        self.prefetch_depth_box.setToolTip('The number of upcoming tracks read ahead while a track plays')
+
+        prefetch_layout = QHBoxLayout()
+        prefetch_layout.addWidget(QLabel('Prefetch Tracks:'))
+        prefetch_layout.addWidget(self.prefetch_depth_box)
 
         playback_config_layout.addWidget(self.cover_art_playback)
         playback_config_layout.addWidget(self.playlist_save_checkbox)
+        playback_config_layout.addWidget(self.gapless_checkbox)
+        playback_config_layout.addLayout(prefetch_layout)
 
         playback_config.setLayout(playback_config_layout)
 
@@ -114,8 +123,12 @@ class Playback(QWidget):
 
         self.check_playback_setting(config)
         self.check_playlist_save(config)
+        self.check_gapless(config)
+        self.check_prefetch_depth(config)
         self.cover_art_playback.clicked.connect(self.cover_art_playback_setting)
         self.playlist_save_checkbox.clicked.connect(self.playlist_save_setting)
+        self.gapless_checkbox.clicked.connect(self.gapless_setting)
+        self.prefetch_depth_box.valueChanged.connect(self.prefetch_depth_setting)
 
     def cover_art_playback_setting(self):
         """Change the cover art playback behavior of the music player.
@@ -141,6 +154,26 @@ class Playback(QWidget):
         with open(self.user_config_file, 'w') as conffile:
             toml.dump(config, conffile)
 
+    def gapless_setting(self):
+        """Change whether the next track is preloaded to play without a gap."""
+        with open(self.user_config_file) as conffile:
+            config = toml.load(conffile)
+
+        config['playback']['gapless'] = self.gapless_checkbox.isChecked()
+
+        with open(self.user_config_file, 'w') as conffile:
+            toml.dump(config, conffile)
+
+    def prefetch_depth_setting(self, depth):
+        """Change how many upcoming tracks are read ahead while a track plays."""
+        with open(self.user_config_file) as conffile:
+            config = toml.load(conffile)
+
+        config['playback']['prefetch_depth'] = depth
+
+        with open(self.user_config_file, 'w') as conffile:
+            toml.dump(config, conffile)
+
     def check_playback_setting(self, config):
         """Set the cover art playback checkbox state from settings.toml."""
         self.cover_art_playback.setChecked(config['playback']['cover_art'])
@@ -149,6 +182,14 @@ class Playback(QWidget):
         """Set the playlist save on close state from settings.toml."""
         self.playlist_save_checkbox.setChecked(config['playlist']['save_on_close'])
 
+    def check_gapless(self, config):
+        """Set the gapless playback checkbox state from settings.toml."""
+        self.gapless_checkbox.setChecked(config['playback'].get('gapless', True))
+
+    def check_prefetch_depth(self, config):
+        """Set the prefetch depth from settings.toml."""
+        self.prefetch_depth_box.setValue(config['playback'].get('prefetch_depth', 2))
+
 
 class ViewOptions(QWidget):
     """Contains all of the user configurable options related to the music player window."""
@@ -304,8 +345,7 @@ class PreferencesDialog(QDialog):
         super(PreferencesDialog, self).__init__(parent)
         self.setWindowTitle('Preferences')
 
-        settings_icon = utilities.resource_filename('mosaic.images', 'md_settings.png')
-        self.setWindowIcon(QIcon(settings_icon))
+        self.setWindowIcon(icons.icon('md_settings.png'))
         self.resize(600, 450)
 
         self.contents = QListWidget()
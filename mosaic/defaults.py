@@ -7,6 +7,14 @@ import toml
 from mosaic import utilities
 
 
+# The window sizes offered in the preferences dialog. The window is square, so
+# each value is both the width and the height.
+WINDOW_SIZES = [1500, 1200, 750, 450, 375]
+
+# The size of the album covers in the library grid
+THUMBNAIL_SIZE = 160
+
+
 class Settings(object):
     """Settings module provides the Music Player access to the settings.toml file."""
 
@@ -54,6 +62,16 @@ class Settings(object):
         """Check the state of the save playlist close setting from settings.toml."""
         return self.config['playlist']['save_on_close']
 
+    @property
+    def gapless(self):
+        """Check whether the next track is preloaded for gapless playback."""
+        return self.config['playback'].get('gapless', True)
+
+    @property
+    def prefetch_depth(self):
+        """Return how many upcoming tracks are warmed while a track plays."""
+        return self.config['playback'].get('prefetch_depth', 2)
+
     @property
     def playlist_path(self):
         """Return the user config directory as the location to save the playlist."""
@@ -77,6 +95,9 @@ class Settings(object):
         index contained in the settings.toml selects the index from the sizes list and sets
         the window and image size accordingly.
         """
-        sizes = [1500, 1200, 750, 450, 375]
+        return WINDOW_SIZES[self.config['view_options']['window_size']]
 
-        return sizes[self.config['view_options']['window_size']]
+    @property
+    def frame_rate(self):
+        """Return how many times a second the playback slider and time label are redrawn at most."""
+        return self.config['view_options'].get('frame_rate', 20)
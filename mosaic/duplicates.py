@@ -0,0 +1,375 @@
+import collections
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import struct
+import threading
+
+from PySide6.QtCore import QThread, Signal
+from PySide6.QtWidgets import (QDialog, QDialogButtonBox, QLabel, QProgressBar, QTreeWidget,
+                               QTreeWidgetItem, QVBoxLayout)
+
+from mosaic import cache, headers, utilities
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    signature TEXT
+);
+"""
+
+HASH_BLOCK = 1 << 20
+
+
+def hash_span(file, start, end):
+    """Return the blake2b digest of the bytes of a file from start to end."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file, 'rb') as fileobj:
+        fileobj.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = fileobj.read(min(HASH_BLOCK, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+
+    return digest.hexdigest()
+
+
+def flac_audio_span(file):
+    """Return the (start, end, md5) of the audio frames of a FLAC file, or None if it isn't one.
+
+    md5 is the hex MD5 of the decoded audio stored in STREAMINFO, or None when
+    the encoder didn't fill it in.
+    """
+    with open(file, 'rb') as fileobj:
+        if fileobj.read(4) != b'fLaC':
+            return None
+
+        md5 = None
+        last_block = False
+        while not last_block:
+            header = fileobj.read(4)
+            if len(header) < 4:
+                return None
+            last_block = bool(header[0] & 0x80)
+            size = int.from_bytes(header[1:], 'big')
+            if header[0] & 0x7F == 0:  # STREAMINFO ends with the MD5 of the audio
+                streaminfo = fileobj.read(size)
+                if streaminfo[18:34].strip(b'\x00'):
+                    md5 = streaminfo[18:34].hex()
+            else:
+                fileobj.seek(size, os.SEEK_CUR)
+
+        return fileobj.tell(), os.fstat(fileobj.fileno()).st_size, md5
+
+
+def mp3_audio_span(file):
+    """Return the (start, end) of the audio frames of an MP3 file between its tags.
+
+    The ID3v2 tag at the start, and the APEv2 and ID3v1 tags at the end, are left
+    out so that files that only differ in their tags have the same span contents.
+    """
+    with open(file, 'rb') as fileobj:
+        end = os.fstat(fileobj.fileno()).st_size
+        header = fileobj.read(10)
+        start = 0
+        if header[:3] == b'ID3' and len(header) == 10:
+            start = 10 + headers.syncsafe(header[6:10])
+            if header[5] & 0x10:  # The ID3v2.4 footer
+                start += 10
+
+        if end - start >= 128:
+            fileobj.seek(end - 128)
+            if fileobj.read(3) == b'TAG':
+                end -= 128
+
+        if end - start >= 32:
+            fileobj.seek(end - 32)
+            footer = fileobj.read(32)
+            if footer[:8] == b'APETAGEX':
+                size, flags = struct.unpack('<II', footer[12:20])
+                end -= size + (32 if flags & 0x80000000 else 0)
+
+    return start, max(start, end)
+
+
+def audio_span(file):
+    """Return the (kind, start, end, md5) that locates the audio of a file, or None.
+
+    Only FLAC and MP3 files are recognized; md5 is only known for FLAC files.
+    """
+    lowered = file.lower()
+    try:
+        if lowered.endswith('.flac'):
+            span = flac_audio_span(file)
+            return ('flac',) + span if span is not None else None
+        if lowered.endswith('.mp3'):
+            return ('mp3',) + mp3_audio_span(file) + (None,)
+    except (OSError, struct.error):
+        return None
+
+    return None
+
+
+def audio_signature(file, span=None):
+    """Return a signature shared by files with the same audio regardless of their tags.
+
+    FLAC files are identified by the MD5 of their decoded audio from STREAMINFO,
+    which costs nothing to read. MP3 files, and FLAC files without an MD5, are
+    identified by a hash of their audio frames. Returns None for other files.
+    """
+    span = span or audio_span(file)
+    if span is None:
+        return None
+
+    kind, start, end, md5 = span
+    if md5 is not None:
+        return 'flac-md5:{}' .format(md5)
+
+    try:
+        return '{}:{}:{}' .format(kind, end - start, hash_span(file, start, end))
+    except OSError:
+        return None
+
+
+def signature_one(file):
+    """Return the (path, signature) pair of a file for a worker process."""
+    return file, audio_signature(file)
+
+
+class SignatureCache(object):
+    """A persistent SQLite cache of audio signatures keyed by path, size and modification time."""
+
+    def __init__(self, database=None):
+        """Open (or create) the signature database."""
+        if database is None:
+            database = os.path.join(cache.cache_directory(), 'signatures.sqlite')
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+
+    def get(self, file, key):
+        """Return the cached signature of a file at the given (size, mtime_ns), or False on a miss."""
+        with self.lock:
+            row = self.connection.execute('SELECT signature FROM signatures '
+                                          'WHERE path = ? AND size = ? AND mtime_ns = ?',
+                                          (file,) + key).fetchone()
+
+        return row[0] if row is not None else False
+
+    def put_many(self, entries):
+        """Store (path, (size, mtime_ns), signature) entries in a single transaction."""
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO signatures VALUES (?, ?, ?, ?)',
+                                        [(path,) + key + (signature,) for path, key, signature in entries])
+
+    def close(self):
+        """Close the connection to the signature database."""
+        with self.lock:
+            self.connection.close()
+
+
+class DuplicateGroup(object):
+    """Files that hold the same audio, along with the bytes that removing the copies would free."""
+
+    def __init__(self, signature, files):
+        """Store the signature and the (path, size) pairs of the files sharing it."""
+        self.signature = signature
+        self.files = sorted(files)
+
+    @property
+    def reclaimable(self):
+        """Return the size of every copy but the largest, which is assumed to be kept."""
+        sizes = [size for __, size in self.files]
+        return sum(sizes) - max(sizes)
+
+
+def find_duplicates(files, workers=None, signature_cache=None, progress=None, cancelled=None,
+                    context=None):
+    """Group the files that hold identical audio and return the DuplicateGroups.
+
+    Files are first grouped by format and audio length, which only needs their
+    headers, since files with audio of different lengths can't be duplicates.
+    Only the files left in a group with others are hashed, in parallel over
+    worker processes, and their signatures are cached by path, size and
+    modification time. progress, if given, is called with (files hashed, files to
+    hash). Groups are returned with the most reclaimable bytes first.
+    """
+    signature_cache = signature_cache or SignatureCache()
+    candidates = collections.defaultdict(list)
+    sizes = {}
+    signatures = {}
+    free = []
+
+    for file in files:
+        try:
+            stat = os.stat(file)
+        except OSError:
+            continue
+        key = (stat.st_size, stat.st_mtime_ns)
+        sizes[file] = stat.st_size
+        cached = signature_cache.get(file, key)
+        if cached is not False:
+            signatures[file] = cached
+            continue
+        span = audio_span(file)
+        if span is None:
+            continue
+        kind, start, end, md5 = span
+        if md5 is not None:
+            signatures[file] = audio_signature(file, span)
+            free.append((file, key, signatures[file]))
+        else:
+            candidates[(kind, str(end - start))].append((file, key))
+    signature_cache.put_many(free)
+
+    # A file with a unique audio length may still match a file hashed in an earlier search
+    hashed = collections.Counter(tuple(signature.split(':')[:2]) for signature in signatures.values()
+                                 if signature and not signature.startswith('flac-md5:'))
+    pending = [entry for length, entries in candidates.items()
+               if len(entries) > 1 or hashed[length] for entry in entries]
+
+    keys = dict(pending)
+    workers = workers or os.cpu_count() or 1
+    pool = None
+    done = 0
+    if progress is not None:
+        progress(0, len(pending))
+
+    try:
+        if workers > 1 and len(pending) > 1:
+            pool = multiprocessing.get_context(context).Pool(workers)
+            results = pool.imap_unordered(signature_one, keys, 4)
+        else:
+            results = map(signature_one, keys)
+
+        batch = []
+        for file, signature in results:
+            if cancelled is not None and cancelled():
+                break
+            signatures[file] = signature
+            batch.append((file, keys[file], signature))
+            done += 1
+            if len(batch) >= 64:
+                signature_cache.put_many(batch)
+                batch = []
+                if progress is not None:
+                    progress(done, len(pending))
+        signature_cache.put_many(batch)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    if progress is not None:
+        progress(done, len(pending))
+
+    groups = collections.defaultdict(list)
+    for file, signature in signatures.items():
+        if signature is not None:
+            groups[signature].append((file, sizes[file]))
+
+    duplicates = [DuplicateGroup(signature, entries) for signature, entries in groups.items()
+                  if len(entries) > 1]
+    duplicates.sort(key=lambda group: group.reclaimable, reverse=True)
+
+    return duplicates
+
+
+class DuplicateFinder(QThread):
+    """Finds the duplicates among the tracks of the catalog on a background thread."""
+
+    progress = Signal(int, int)
+    found = Signal(list)
+
+    def __init__(self, files, parent=None):
+        """Store the files to compare."""
+        super(DuplicateFinder, self).__init__(parent)
+        self.files = files
+
+    def run(self):
+        """Hash the files in worker processes and emit the groups of duplicates."""
+        workers = max(1, (os.cpu_count() or 1) - 1)
+        signature_cache = SignatureCache()
+        try:
+            groups = find_duplicates(self.files, workers=workers, signature_cache=signature_cache,
+                                     progress=self.progress.emit,
+                                     cancelled=self.isInterruptionRequested, context='spawn')
+        finally:
+            signature_cache.close()
+        self.found.emit(groups)
+
+
+class DuplicatesDialog(QDialog):
+    """Lists the groups of duplicate tracks in the library and the space they take up."""
+
+    def __init__(self, files, parent=None):
+        """Start looking for duplicates among the files and show the progress."""
+        super(DuplicatesDialog, self).__init__(parent)
+
+        self.setWindowTitle('Duplicate Tracks')
+        self.resize(700, 500)
+
+        self.summary = QLabel('Comparing {} tracks...' .format(len(files)))
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 0)
+
+        self.groups = QTreeWidget()
+        self.groups.setHeaderLabels(['File', 'Size'])
+        self.groups.setColumnWidth(0, 560)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        buttons.rejected.connect(self.reject)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.summary)
+        layout.addWidget(self.progress)
+        layout.addWidget(self.groups)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+
+        self.finder = DuplicateFinder(files)
+        self.finder.progress.connect(self.show_progress)
+        self.finder.found.connect(self.show_groups)
+        self.finder.start()
+
+    def show_progress(self, done, total):
+        """Update the progress bar with the number of files hashed."""
+        self.progress.setRange(0, total)
+        self.progress.setValue(done)
+
+    def show_groups(self, groups):
+        """List each group of duplicates with its files and reclaimable bytes."""
+        self.progress.setVisible(False)
+        reclaimable = sum(group.reclaimable for group in groups)
+        copies = sum(len(group.files) - 1 for group in groups)
+        self.summary.setText('{} groups of duplicates; removing {} copies would reclaim {}' .format(
+            len(groups), copies, utilities.format_size(reclaimable)))
+
+        items = []
+        for group in groups:
+            item = QTreeWidgetItem(['{} copies' .format(len(group.files)),
+                                    utilities.format_size(group.reclaimable)])
+            item.setToolTip(0, group.signature)
+            for path, size in group.files:
+                child = QTreeWidgetItem([path, utilities.format_size(size)])
+                child.setToolTip(0, path)
+                item.addChild(child)
+            items.append(item)
+        self.groups.addTopLevelItems(items)
+        self.groups.expandAll()
+
+    def done(self, result):
+        """Stop the search before the dialog closes."""
+        if self.finder.isRunning():
+            self.finder.requestInterruption()
+            self.finder.wait()
+        super(DuplicatesDialog, self).done(result)
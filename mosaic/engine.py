@@ -0,0 +1,278 @@
+import bisect
+import random
+
+
+REPEAT_NONE = 'none'
+REPEAT_ALL = 'all'
+REPEAT_ONE = 'one'
+REPEAT_MODES = (REPEAT_NONE, REPEAT_ALL, REPEAT_ONE)
+
+
+def shifted_index(index, removed):
+    """Return where index ends up after the sorted rows in removed are deleted, or -1 if it was deleted."""
+    position = bisect.bisect_left(removed, index)
+    if position < len(removed) and removed[position] == index:
+        return -1
+
+    return index - position
+
+
+class LazyPermutation(object):
+    """A random permutation of range(count) that is only generated as it is read.
+
+    This is a Fisher-Yates shuffle over a virtual array in which every position
+    holds its own index until a swap touches it, so only the swapped positions
+    are stored. Drawing the next value is O(1) and creating the permutation
+    costs nothing, however large count is.
+    """
+
+    def __init__(self, count, rng=None):
+        """Start a permutation of count values of which none are drawn."""
+        self.count = count
+        self.drawn = 0
+        self.rng = rng or random.Random()
+        self.values = {}
+        self.positions = {}
+
+    def value(self, position):
+        """Return the value at a position of the virtual array."""
+        return self.values.get(position, position)
+
+    def position(self, value):
+        """Return the position of a value in the virtual array."""
+        return self.positions.get(value, value)
+
+    def swap(self, first, second):
+        """Swap the values at two positions of the virtual array."""
+        first_value = self.value(first)
+        second_value = self.value(second)
+        self.values[first] = second_value
+        self.positions[second_value] = first
+        self.values[second] = first_value
+        self.positions[first_value] = second
+
+    def draw(self):
+        """Return a value that wasn't drawn yet, chosen uniformly, or -1 once all are drawn."""
+        if self.drawn >= self.count:
+            return -1
+
+        self.swap(self.drawn, self.rng.randrange(self.drawn, self.count))
+        self.drawn += 1
+
+        return self.value(self.drawn - 1)
+
+    def take(self, value):
+        """Mark a value as drawn next without choosing it at random."""
+        self.swap(self.drawn, self.position(value))
+        self.drawn += 1
+
+
+class PlaybackOrder(object):
+    """Decides which track of the playlist plays next.
+
+    The order knows nothing about the tracks themselves, only their number and
+    which one is current, so it can be used without Qt. In shuffle mode, the
+    tracks are drawn from a LazyPermutation and recorded in a history, so that
+    previous() retraces the tracks that were played and next() replays them
+    before drawing new ones. Both are O(1). Inserting or removing tracks remaps
+    the history and rebuilds the permutation from it, which costs O(tracks
+    played) rather than O(tracks).
+    """
+
+    def __init__(self, count=0, rng=None):
+        """Start with count tracks, none of them current, in playlist order."""
+        self.count = count
+        self.current = -1
+        self.repeat = REPEAT_NONE
+        self.rng = rng or random.Random()
+        self.shuffled = False
+        self.history = []
+        self.cursor = -1
+        self.permutation = None
+
+    @property
+    def shuffle(self):
+        """Return whether tracks are played in a random order."""
+        return self.shuffled
+
+    @shuffle.setter
+    def shuffle(self, enabled):
+        """Turn shuffle on or off, starting a new random order from the current track."""
+        self.shuffled = bool(enabled)
+        self.restart_shuffle()
+
+    def restart_shuffle(self):
+        """Forget the shuffle history, which then only holds the current track."""
+        self.history = [self.current] if self.shuffled and self.current != -1 else []
+        self.cursor = len(self.history) - 1
+        self.rebuild()
+
+    def rebuild(self):
+        """Create a permutation in which the tracks of the history are already drawn."""
+        if not self.shuffled:
+            self.permutation = None
+            return
+
+        self.permutation = LazyPermutation(self.count, self.rng)
+        for index in self.history:
+            self.permutation.take(index)
+
+    def jump(self, index):
+        """Make index the current track, as when the user picks it from the playlist."""
+        if index == self.current:
+            return
+
+        self.current = index
+        if self.shuffled:
+            if index == -1:
+                # The current track is gone, so the history is kept to go on from
+                self.cursor = min(self.cursor, len(self.history) - 1)
+            else:
+                self.restart_shuffle()
+
+    def next(self, automatic=False):
+        """Move to the track after the current one and return it, or -1 at the end of the playlist.
+
+        automatic is True when the current track finished playing, which
+        repeats it in repeat one mode rather than moving on.
+        """
+        if self.count == 0:
+            return -1
+        if automatic and self.repeat == REPEAT_ONE and self.current != -1:
+            return self.current
+
+        if not self.shuffled:
+            index = self.current + 1
+            if index >= self.count:
+                index = 0 if self.repeat == REPEAT_ALL else -1
+        elif self.cursor + 1 < len(self.history):
+            self.cursor += 1
+            index = self.history[self.cursor]
+        else:
+            index = self.permutation.draw()
+            if index == -1 and self.repeat == REPEAT_ALL:
+                self.history = []
+                self.rebuild()
+                index = self.permutation.draw()
+            if index != -1:
+                self.history.append(index)
+                self.cursor = len(self.history) - 1
+
+        if index != -1:
+            self.current = index
+        return index
+
+    def upcoming(self):
+        """Return the track that next(automatic=True) will move to, without moving, or -1.
+
+        In shuffle mode a newly drawn track is added to the history ahead of the
+        cursor, so that next() moves to the same track. Starting another round
+        of repeat all is left to next().
+        """
+        if self.count == 0:
+            return -1
+        if self.repeat == REPEAT_ONE and self.current != -1:
+            return self.current
+
+        if not self.shuffled:
+            index = self.current + 1
+            if index >= self.count:
+                index = 0 if self.repeat == REPEAT_ALL else -1
+            return index
+
+        if self.cursor + 1 < len(self.history):
+            return self.history[self.cursor + 1]
+
+        index = self.permutation.draw()
+        if index != -1:
+            self.history.append(index)
+        return index
+
+    def lookahead(self, depth):
+        """Return up to depth tracks that next() moves to in turn, without moving.
+
+        Repeat one is ignored, since the track it repeats is already playing.
+        In shuffle mode the tracks are drawn into the history ahead of the
+        cursor like upcoming() does, so next() plays them in the same order.
+        """
+        if self.count == 0 or depth <= 0:
+            return []
+
+        if not self.shuffled:
+            indexes = []
+            index = self.current
+            for __ in range(min(depth, self.count)):
+                index += 1
+                if index >= self.count:
+                    if self.repeat != REPEAT_ALL:
+                        break
+                    index = 0
+                if index == self.current:
+                    break
+                indexes.append(index)
+            return indexes
+
+        while len(self.history) - self.cursor - 1 < depth:
+            index = self.permutation.draw()
+            if index == -1:
+                break
+            self.history.append(index)
+
+        return self.history[self.cursor + 1:self.cursor + 1 + depth]
+
+    def previous(self):
+        """Move to the track before the current one and return it, or -1 at the start."""
+        if self.count == 0:
+            return -1
+
+        if not self.shuffled:
+            index = self.current - 1
+            if index < 0:
+                index = self.count - 1 if self.repeat == REPEAT_ALL else -1
+        elif self.cursor > 0:
+            self.cursor -= 1
+            index = self.history[self.cursor]
+        else:
+            index = -1
+
+        if index != -1:
+            self.current = index
+        return index
+
+    def insert(self, row, count):
+        """Account for count tracks inserted before row."""
+        self.count += count
+        if self.current >= row:
+            self.current += count
+
+        if self.shuffled:
+            self.history = [index + count if index >= row else index for index in self.history]
+            self.rebuild()
+
+    def remove(self, rows):
+        """Account for the tracks at the given rows being removed."""
+        removed = sorted(set(rows))
+        if not removed:
+            return
+
+        self.count -= len(removed)
+        self.current = shifted_index(self.current, removed)
+
+        if self.shuffled:
+            history = []
+            cursor = -1
+            for position, index in enumerate(self.history):
+                index = shifted_index(index, removed)
+                if index != -1:
+                    history.append(index)
+                if position <= self.cursor:
+                    cursor = len(history) - 1
+            self.history = history
+            self.cursor = cursor
+            self.rebuild()
+
+    def reset(self, count):
+        """Start over with a playlist of count tracks and no current track."""
+        self.count = count
+        self.current = -1
+        self.restart_shuffle()
@@ -0,0 +1,236 @@
+import base64
+import collections
+import struct
+
+import mutagen
+from mutagen import easyid3, easymp4, flac, mp3, oggopus, oggvorbis, wave
+
+from mosaic import headers
+
+
+# The number of bytes read from the start of a file to identify its format. It
+# covers the first Ogg page header along with the codec identification packet.
+SNIFF_LENGTH = 64
+
+
+class AudioFormat(object):
+    """AudioFormat describes how Mosaic recognizes and reads one kind of audio file.
+
+    sniff is given the first bytes of a file and returns whether they belong to
+    the format, load opens the file with the matching mutagen class, tags and
+    artwork extract the tag dictionary and cover art of the opened file, and read
+    is an optional header-only reader. A header-only reader returns a (stream
+    info, tags dictionary, Artwork or None) tuple, or None to fall back to load.
+    """
+
+    def __init__(self, name, extensions, sniff, load, tags=None, artwork=None, read=None):
+        """Store the handlers of the format."""
+        self.name = name
+        self.extensions = tuple(extensions)
+        self.sniff = sniff
+        self.load = load
+        self.tags = tags
+        self.artwork = artwork
+        self.header_reader = read
+
+    def read(self, file):
+        """Read the stream info, tags and artwork of a file of this format."""
+        if self.header_reader is not None:
+            try:
+                result = self.header_reader(file)
+            except (OSError, ValueError, IndexError, struct.error, mutagen.MutagenError):
+                result = None
+            if result is not None:
+                return result
+
+        audio_file = self.load(file)
+
+        # Mutagen returns None if there is no metadata embedded within a file
+        if audio_file.tags is None:
+            tags = {}
+        elif self.tags is not None:
+            tags = self.tags(audio_file)
+        else:
+            tags = dict(audio_file.tags)
+        artwork = self.artwork(audio_file, tags) if self.artwork is not None else None
+
+        return audio_file.info, tags, artwork
+
+
+FORMATS = collections.OrderedDict()
+
+
+def register(audio_format):
+    """Add an AudioFormat to the registry, replacing any format with the same name."""
+    FORMATS[audio_format.name] = audio_format
+    return audio_format
+
+
+def extensions():
+    """Return a tuple of every file extension of the registered formats."""
+    return tuple(extension for audio_format in FORMATS.values()
+                 for extension in audio_format.extensions)
+
+
+def name_filters():
+    """Return the wildcard name filters of the registered formats, e.g. ['*.mp3', '*.flac']."""
+    return ['*{}' .format(extension) for extension in extensions()]
+
+
+def dialog_filter():
+    """Return the filter string used by the file dialogs to show audio files."""
+    return 'Audio ({})' .format(' '.join(name_filters()))
+
+
+def is_audio_file(file):
+    """Return whether the file name has the extension of a registered format."""
+    return file.lower().endswith(extensions())
+
+
+def skip_id3(fileobj, header):
+    """Return the first bytes after an ID3v2 tag, or header itself if there is no tag."""
+    if header[:3] != b'ID3' or len(header) < 10:
+        return header
+
+    fileobj.seek(10 + headers.syncsafe(header[6:10]))
+    return fileobj.read(SNIFF_LENGTH)
+
+
+def sniff(file):
+    """Identify the format of a file from its first bytes.
+
+    MP3 files are recognized by either their ID3v2 tag or an MPEG frame header.
+    Since other formats may also carry an ID3v2 tag, the bytes after the tag are
+    checked first. When no format matches the bytes, the extension is used.
+    """
+    try:
+        with open(file, 'rb') as fileobj:
+            header = fileobj.read(SNIFF_LENGTH)
+            stream = skip_id3(fileobj, header)
+    except OSError:
+        stream = header = b''
+
+    for audio_format in FORMATS.values():
+        if audio_format.sniff(stream):
+            return audio_format
+
+    for audio_format in FORMATS.values():
+        if file.lower().endswith(audio_format.extensions):
+            return audio_format
+
+    return None
+
+
+def is_mpeg_frame(header):
+    """Return whether the bytes start with an MPEG audio layer I-III frame header."""
+    return (len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0 and
+            header[1] & 0x06 != 0)
+
+
+def ogg_codec(header, signature):
+    """Return whether the bytes start with an Ogg page whose first packet has the signature."""
+    if header[:4] != b'OggS' or len(header) < 27:
+        return False
+
+    packet = 27 + header[26]
+    return header[packet:packet + len(signature)] == signature
+
+
+def easy_id3_tags(audio_file):
+    """Return the tags of a file with a plain ID3 tag under the keys EasyID3 uses."""
+    easy = easyid3.EasyID3()
+    # EasyID3 only loads tags from a file, so the parsed tag is wrapped in place
+    easy._EasyID3__id3 = audio_file.tags
+    return dict(easy)
+
+
+def id3_artwork(audio_file, tags):
+    """Return an Artwork holding the first APIC frame of a file with an ID3 tag or None."""
+    id3 = audio_file.tags
+    if isinstance(id3, easyid3.EasyID3):
+        # EasyID3 hides the wrapped ID3 tag, which is the only place the pictures are
+        id3 = id3._EasyID3__id3
+    if id3 is not None:
+        frames = id3.getall('APIC')
+        if frames:
+            return headers.Artwork(audio_file.filename, mime=frames[0].mime, data=frames[0].data)
+
+    return None
+
+
+def flac_artwork(audio_file, tags):
+    """Return an Artwork holding the first picture block of a FLAC file or None."""
+    if audio_file.pictures:
+        picture = audio_file.pictures[0]
+        return headers.Artwork(audio_file.filename, mime=picture.mime, data=picture.data)
+
+    return None
+
+
+def vorbis_artwork(audio_file, tags):
+    """Return an Artwork holding the first METADATA_BLOCK_PICTURE of an Ogg file or None.
+
+    The base64 encoded picture is removed from the tags so that it isn't shown as text.
+    """
+    pictures = tags.pop('metadata_block_picture', None)
+    if pictures:
+        try:
+            picture = flac.Picture(base64.b64decode(pictures[0]))
+        except (ValueError, mutagen.MutagenError):
+            return None
+        return headers.Artwork(audio_file.filename, mime=picture.mime, data=picture.data)
+
+    return None
+
+
+def mp4_artwork(audio_file, tags):
+    """Return an Artwork holding the first cover of an MP4 file or None."""
+    if audio_file.tags is not None:
+        # EasyMP4 hides the wrapped MP4 tags, which is the only place the covers are
+        covers = audio_file.tags._EasyMP4Tags__mp4.get('covr')
+        if covers:
+            mime = 'image/png' if covers[0].imageformat == covers[0].FORMAT_PNG else 'image/jpeg'
+            return headers.Artwork(audio_file.filename, mime=mime, data=bytes(covers[0]))
+
+    return None
+
+
+def load_opus(file):
+    """Open an Opus file, whose stream is always decoded at 48 kHz."""
+    audio_file = oggopus.OggOpus(file)
+    audio_file.info.sample_rate = 48000
+    return audio_file
+
+
+register(AudioFormat('mp3', ['.mp3'],
+                     sniff=is_mpeg_frame,
+                     load=lambda file: mp3.MP3(file, ID3=easyid3.EasyID3),
+                     artwork=id3_artwork,
+                     read=headers.read_mp3_headers))
+
+register(AudioFormat('flac', ['.flac'],
+                     sniff=lambda header: header[:4] == b'fLaC',
+                     load=flac.FLAC,
+                     artwork=flac_artwork,
+                     read=headers.read_flac_headers))
+
+register(AudioFormat('vorbis', ['.ogg', '.oga'],
+                     sniff=lambda header: ogg_codec(header, b'\x01vorbis'),
+                     load=oggvorbis.OggVorbis,
+                     artwork=vorbis_artwork))
+
+register(AudioFormat('opus', ['.opus'],
+                     sniff=lambda header: ogg_codec(header, b'OpusHead'),
+                     load=load_opus,
+                     artwork=vorbis_artwork))
+
+register(AudioFormat('m4a', ['.m4a', '.mp4'],
+                     sniff=lambda header: header[4:8] == b'ftyp',
+                     load=easymp4.EasyMP4,
+                     artwork=mp4_artwork))
+
+register(AudioFormat('wav', ['.wav'],
+                     sniff=lambda header: header[:4] == b'RIFF' and header[8:12] == b'WAVE',
+                     load=wave.WAVE,
+                     tags=easy_id3_tags,
+                     artwork=id3_artwork))
@@ -0,0 +1,104 @@
+import time
+
+from PySide6.QtCore import QObject, QUrl
+from PySide6.QtMultimedia import QAudioOutput, QMediaPlayer
+
+
+# How long before the end of a track the next one is loaded into the standby player, in ms
+PRELOAD_LEAD = 5000
+
+# The number of track changes whose latency is kept
+LATENCY_HISTORY = 50
+
+
+class StandbyPlayer(QObject):
+    """A second QMediaPlayer and QAudioOutput that hold the next track ready to play.
+
+    The next track is opened and decoded by the standby player a few seconds
+    before the current one ends, so that on EndOfMedia the players are swapped
+    and the next track starts without waiting for its file to be opened. The
+    time from EndOfMedia to the next track playing is measured for every track
+    change, gapless or not.
+    """
+
+    def __init__(self, lead=PRELOAD_LEAD, parent=None):
+        """Create the standby player with nothing loaded."""
+        super(StandbyPlayer, self).__init__(parent)
+
+        self.lead = lead
+        self.player = QMediaPlayer()
+        self.audio_output = QAudioOutput()
+        self.player.setAudioOutput(self.audio_output)
+        self.index = -1
+        self.url = QUrl()
+        self.transition_started = None
+        self.transition_gapless = False
+        self.latencies = []
+
+    def should_preload(self, position, duration):
+        """Return whether the current track is close enough to its end to load the next one."""
+        return duration > 0 and duration - position <= self.lead
+
+    def holds(self, index, url):
+        """Return whether the track at index of the playlist is the one loaded."""
+        return index == self.index and url == self.url
+
+    def preload(self, index, url):
+        """Load the track at index of the playlist, unless it is already loaded."""
+        if self.holds(index, url):
+            return
+
+        self.index = index
+        self.url = url
+        self.player.setSource(url)
+
+    def ready(self, index, url):
+        """Return whether the track at index is loaded and can start at once."""
+        return (self.holds(index, url) and
+                self.player.mediaStatus() in (QMediaPlayer.MediaStatus.LoadedMedia,
+                                              QMediaPlayer.MediaStatus.BufferedMedia))
+
+    def swap(self, player, audio_output):
+        """Take over the player and audio output that finished, and return the standby ones.
+
+        The returned player isn't started, so the caller can connect to its
+        signals before it plays. The standby output takes over the volume of
+        the one that finished, which the user may have changed during the track.
+        """
+        self.audio_output.setVolume(audio_output.volume())
+        self.audio_output.setMuted(audio_output.isMuted())
+        standby = (self.player, self.audio_output)
+        self.player, self.audio_output = player, audio_output
+        self.index = -1
+        self.url = QUrl()
+        self.player.setSource(QUrl())
+
+        return standby
+
+    def begin_transition(self, gapless):
+        """Start timing a track change at the end of the current track."""
+        self.transition_started = time.perf_counter()
+        self.transition_gapless = gapless
+
+    def end_transition(self):
+        """Stop timing the track change once the next track plays and return its latency in ms.
+
+        Returns None if no track change was being timed.
+        """
+        if self.transition_started is None:
+            return None
+
+        latency = (time.perf_counter() - self.transition_started) * 1000
+        self.transition_started = None
+        self.latencies.append((latency, self.transition_gapless))
+        del self.latencies[:-LATENCY_HISTORY]
+
+        return latency
+
+    def report(self):
+        """Return a line describing the latency of the last track change, or an empty string."""
+        if not self.latencies:
+            return ''
+
+        latency, gapless = self.latencies[-1]
+        return 'Last track change: {:.1f} ms{}' .format(latency, ' (gapless)' if gapless else '')
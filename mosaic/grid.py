@@ -0,0 +1,347 @@
+import collections
+import os
+
+import mutagen
+
+from PySide6.QtCore import (QAbstractListModel, QModelIndex, QObject, QPoint, QRect, QRunnable,
+                            QSize, Qt, QThreadPool, Signal)
+from PySide6.QtGui import QImage, QPixmap
+from PySide6.QtWidgets import QListView, QStyle, QStyledItemDelegate
+
+from mosaic import defaults, metadata
+from mosaic.artwork import artwork_cache, folder_artwork
+
+
+TEXT_LINES = 2
+
+
+def pixmap_bytes(pixmap):
+    """Return the approximate memory used by a pixmap."""
+    return pixmap.width() * pixmap.height() * max(1, pixmap.depth() // 8)
+
+
+def load_album_cover(art_hash, cover_path, size):
+    """Return the cover of an album as a QImage scaled to fit within size.
+
+    The cover is looked up by its content hash, so a thumbnail written by an
+    earlier session is loaded without opening the track at all. Otherwise the
+    cover is read from the track that the catalog hashed it from.
+    """
+    def load():
+        track = metadata.read_track(cover_path)
+        cover = track.artwork or folder_artwork().find(cover_path)
+        return cover.data() if cover is not None else b''
+
+    try:
+        return artwork_cache().lookup(art_hash, size, load)
+    except (OSError, ValueError, mutagen.MutagenError):
+        return QImage()
+
+
+class ThumbnailTask(QRunnable):
+    """Decodes the cover of one album on a thread of the ThumbnailLoader pool."""
+
+    def __init__(self, loader, album_id, art_hash, cover_path, size):
+        """Store the album whose cover is to be decoded."""
+        super(ThumbnailTask, self).__init__()
+        self.setAutoDelete(False)
+        self.loader = loader
+        self.album_id = album_id
+        self.art_hash = art_hash
+        self.cover_path = cover_path
+        self.size = size
+
+    def run(self):
+        """Decode the cover and hand it to the loader, which lives on the GUI thread."""
+        self.loader.loaded.emit(self.album_id, load_album_cover(self.art_hash, self.cover_path, self.size))
+
+
+class ThumbnailLoader(QObject):
+    """Decodes album covers on worker threads.
+
+    Requests that haven't started yet can be cancelled with retain(), which the
+    grid calls as it scrolls so that only the covers of cells near the viewport
+    are ever decoded.
+    """
+
+    loaded = Signal(int, QImage)
+
+    def __init__(self, size=defaults.THUMBNAIL_SIZE, threads=None, parent=None):
+        """Initialize the thread pool used to decode covers."""
+        super(ThumbnailLoader, self).__init__(parent)
+
+        self.size = size
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(threads or max(1, (os.cpu_count() or 1) - 1))
+        self.tasks = {}
+        self.cancelled = 0
+        self.loaded.connect(self.finished)
+
+    def request(self, album_id, art_hash, cover_path, priority=0):
+        """Queue the cover of an album to be decoded unless it already is."""
+        if album_id in self.tasks:
+            return
+
+        task = ThumbnailTask(self, album_id, art_hash, cover_path, self.size)
+        self.tasks[album_id] = task
+        self.pool.start(task, priority)
+
+    def retain(self, album_ids):
+        """Cancel the queued requests of every album that isn't in album_ids."""
+        for album_id, task in list(self.tasks.items()):
+            if album_id not in album_ids and self.pool.tryTake(task):
+                del self.tasks[album_id]
+                self.cancelled += 1
+
+    def finished(self, album_id, image):
+        """Forget the task of an album once its cover is decoded."""
+        self.tasks.pop(album_id, None)
+
+    def stop(self):
+        """Cancel every queued request and wait for the running ones."""
+        self.pool.clear()
+        self.pool.waitForDone()
+        self.tasks.clear()
+
+
+class AlbumGridModel(QAbstractListModel):
+    """A list model of the albums of the catalog along with their covers.
+
+    Albums are read from the catalog a page at a time through canFetchMore() and
+    fetchMore(). A cover is only requested from the ThumbnailLoader when a view
+    asks for the decoration of its album, and decoded covers are kept in an LRU
+    bounded by memory_budget bytes, so memory doesn't grow with the library.
+    Covers that can't be decoded are remembered by their art hash and not
+    requested again.
+    """
+
+    AlbumIdRole = Qt.ItemDataRole.UserRole
+    ArtistRole = Qt.ItemDataRole.UserRole + 1
+
+    def __init__(self, library_catalog=None, page_size=512, memory_budget=48 * 1024 * 1024,
+                 loader=None, parent=None):
+        """Start with no albums; they are fetched when a view asks for them."""
+        super(AlbumGridModel, self).__init__(parent)
+
+        self.catalog = library_catalog
+        self.page_size = page_size
+        self.memory_budget = memory_budget
+        self.memory_used = 0
+        self.albums = []
+        self.rows = {}
+        self.exhausted = library_catalog is None
+        self.pixmaps = collections.OrderedDict()
+        self.failed = set()
+
+        self.loader = loader if loader is not None else ThumbnailLoader(parent=self)
+        self.loader.loaded.connect(self.cover_loaded)
+
+    def set_catalog(self, library_catalog):
+        """Show a different catalog, or reload the current one after a scan changed it."""
+        self.beginResetModel()
+        self.catalog = library_catalog
+        self.albums = []
+        self.rows = {}
+        self.exhausted = library_catalog is None
+        # Album ids and covers may have changed along with the catalog
+        self.pixmaps.clear()
+        self.memory_used = 0
+        self.failed.clear()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        """Return the number of albums fetched so far."""
+        return 0 if parent.isValid() else len(self.albums)
+
+    def canFetchMore(self, parent):
+        """Return whether there may be albums left to read from the catalog."""
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent):
+        """Read the next page of albums from the catalog."""
+        if parent.isValid() or self.exhausted:
+            return
+
+        offset = len(self.albums)
+        rows = self.catalog.albums(self.page_size, offset)
+        self.exhausted = len(rows) < self.page_size
+        if not rows:
+            return
+
+        self.beginInsertRows(QModelIndex(), offset, offset + len(rows) - 1)
+        for row, album in enumerate(rows, offset):
+            self.rows[album[0]] = row
+        self.albums.extend(rows)
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        """Return the title, artist, id or cover of an album."""
+        if not index.isValid():
+            return None
+
+        album_id, title, artist, art_hash, cover_path = self.albums[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return title or 'Unknown Album'
+        if role == self.ArtistRole:
+            return artist or 'Unknown Artist'
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return '{}\n{}' .format(title or 'Unknown Album', artist or 'Unknown Artist')
+        if role == self.AlbumIdRole:
+            return album_id
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self.cover(album_id, art_hash, cover_path)
+
+        return None
+
+    def cover(self, album_id, art_hash, cover_path, priority=1):
+        """Return the decoded cover of an album, requesting it if it isn't decoded yet.
+
+        None is returned while the cover is being decoded and for albums without
+        art or whose art couldn't be decoded.
+        """
+        pixmap = self.pixmaps.get(album_id)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(album_id)
+            return pixmap
+
+        if art_hash is not None and cover_path is not None and art_hash not in self.failed:
+            self.loader.request(album_id, art_hash, cover_path, priority)
+
+        return None
+
+    def prefetch(self, first, last):
+        """Request the covers of the rows from first to last at a lower priority than visible rows."""
+        for row in range(max(0, first), min(last, len(self.albums) - 1) + 1):
+            album_id, __, __, art_hash, cover_path = self.albums[row]
+            self.cover(album_id, art_hash, cover_path, priority=0)
+
+    def retain(self, first, last):
+        """Cancel the queued covers of every row outside first to last."""
+        self.loader.retain({album[0] for album in self.albums[max(0, first):last + 1]})
+
+    def cover_loaded(self, album_id, image):
+        """Keep a decoded cover, evicting the least recently used covers over budget, or note its failure."""
+        row = self.rows.get(album_id)
+        if row is None:
+            return
+        if image.isNull():
+            self.failed.add(self.albums[row][3])
+            return
+
+        pixmap = QPixmap.fromImage(image)
+        self.pixmaps[album_id] = pixmap
+        self.memory_used += pixmap_bytes(pixmap)
+        while self.memory_used > self.memory_budget and len(self.pixmaps) > 1:
+            __, evicted = self.pixmaps.popitem(last=False)
+            self.memory_used -= pixmap_bytes(evicted)
+
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+
+class AlbumDelegate(QStyledItemDelegate):
+    """Paints an album as its cover above its title and artist."""
+
+    def __init__(self, size=defaults.THUMBNAIL_SIZE, parent=None):
+        """Store the size of the covers."""
+        super(AlbumDelegate, self).__init__(parent)
+        self.size = size
+
+    def sizeHint(self, option, index):
+        """Return the same size for every album, which lets the view skip measuring them."""
+        return QSize(self.size + 12, self.size + 12 + TEXT_LINES * option.fontMetrics.height())
+
+    def paint(self, painter, option, index):
+        """Paint the cover, or a placeholder while it is decoded, and the elided text below it."""
+        painter.save()
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+
+        # The model is called directly, since QModelIndex.data() converts every
+        # role through a QVariant just for the delegate to convert it back
+        model = index.model()
+        cover = QRect(option.rect.x() + 6, option.rect.y() + 6, self.size, self.size)
+        pixmap = model.data(index, Qt.ItemDataRole.DecorationRole)
+        if pixmap is not None:
+            scaled = pixmap.size().scaled(cover.size(), Qt.AspectRatioMode.KeepAspectRatio)
+            target = QRect(0, 0, scaled.width(), scaled.height())
+            target.moveCenter(cover.center())
+            painter.drawPixmap(target, pixmap)
+        else:
+            painter.fillRect(cover, option.palette.mid())
+
+        metrics = option.fontMetrics
+        width = self.size
+        lines = (model.data(index, Qt.ItemDataRole.DisplayRole), model.data(index, AlbumGridModel.ArtistRole))
+        for line, text in enumerate(lines):
+            rect = QRect(cover.x(), cover.bottom() + 2 + line * metrics.height(), width, metrics.height())
+            painter.drawText(rect, Qt.AlignmentFlag.AlignHCenter,
+                             metrics.elidedText(text, Qt.TextElideMode.ElideRight, width))
+        painter.restore()
+
+
+class AlbumGridView(QListView):
+    """Shows the albums of the catalog as a scrolling grid of covers.
+
+    Only the cells near the viewport have their covers decoded: as the view
+    scrolls, the covers a screen above and below are requested ahead of time
+    and requests for cells that were scrolled past are cancelled.
+    """
+
+    def __init__(self, parent=None):
+        """Set up an icon mode list view with uniformly sized cells."""
+        super(AlbumGridView, self).__init__(parent)
+
+        self.album_model = AlbumGridModel(parent=self)
+        self.setModel(self.album_model)
+        self.setItemDelegate(AlbumDelegate(parent=self))
+        self.setViewMode(QListView.ViewMode.IconMode)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setMovement(QListView.Movement.Static)
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QListView.SelectionMode.ExtendedSelection)
+        self.setSpacing(4)
+
+        self.verticalScrollBar().valueChanged.connect(self.visible_rows_changed)
+
+    def visible_range(self):
+        """Return the first and last rows shown in the viewport, or None if there are none."""
+        if not self.album_model.rowCount():
+            return None
+
+        viewport = self.viewport().rect()
+        first = self.indexAt(viewport.topLeft() + self.cell_offset())
+        last = self.indexAt(viewport.bottomRight() - self.cell_offset())
+        first_row = first.row() if first.isValid() else 0
+        last_row = last.row() if last.isValid() else self.album_model.rowCount() - 1
+
+        return first_row, last_row
+
+    def cell_offset(self):
+        """Return an offset that moves a corner of the viewport inside the nearest cell."""
+        spacing = self.spacing() + 1
+        return QPoint(spacing, spacing)
+
+    def visible_rows_changed(self):
+        """Prefetch the covers a screen away from the viewport and cancel the ones further off."""
+        visible = self.visible_range()
+        if visible is None:
+            return
+
+        first, last = visible
+        screen = last - first + 1
+        self.album_model.retain(first - screen, last + screen)
+        self.album_model.prefetch(last + 1, last + screen)
+        self.album_model.prefetch(first - screen, first - 1)
+
+    def resizeEvent(self, event):
+        """Update the rows near the viewport when the number of columns changes."""
+        super(AlbumGridView, self).resizeEvent(event)
+        self.visible_rows_changed()
+
+    def selected_files(self):
+        """Return the paths of the tracks of the selected albums in grid order."""
+        catalog = self.album_model.catalog
+        rows = sorted(index.row() for index in self.selectedIndexes())
+
+        return [file for row in rows for file in catalog.album_paths(self.album_model.albums[row][0])]
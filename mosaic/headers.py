@@ -0,0 +1,204 @@
+import io
+import mmap
+import re
+import struct
+
+from mutagen import easyid3, flac, mp3
+
+
+FRAME_ID = re.compile(rb'[A-Z0-9]{4}\Z')
+
+
+class Artwork(object):
+    """A reference to an embedded picture that is read from the file on demand.
+
+    A reference created by a header-only read stores the offset and length of the
+    image within the file. A reference created from a full parse already holds
+    the image bytes. An identity may be given when the picture can be recognized
+    without reading it, such as an image file next to the tracks; otherwise the
+    picture is identified by a hash of its bytes.
+    """
+
+    __slots__ = ('path', 'offset', 'length', 'mime', 'cached', 'identity')
+
+    def __init__(self, path, offset=None, length=None, mime='', data=None, identity=None):
+        """Store the location of the picture, or the picture itself if it's already loaded."""
+        self.path = path
+        self.offset = offset
+        self.length = length if data is None else len(data)
+        self.mime = mime
+        self.cached = data
+        self.identity = identity
+
+    def data(self):
+        """Return the bytes of the picture, reading them from the file on the first call."""
+        if self.cached is None:
+            with open(self.path, 'rb') as file:
+                file.seek(self.offset)
+                self.cached = file.read(self.length)
+
+        return self.cached
+
+
+def map_file(file):
+    """Return a read-only memory map of the whole file or None if it's empty."""
+    with open(file, 'rb') as fileobj:
+        try:
+            return mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
+
+
+def read_flac_headers(file):
+    """Read the stream info, tags and picture location of a FLAC file.
+
+    Only the metadata blocks are read; the image data of a PICTURE block is
+    skipped and its position is recorded in an Artwork reference. Returns a
+    tuple of (StreamInfo, tags dictionary, Artwork or None), or None if the
+    file doesn't start with a plain fLaC marker.
+    """
+    view = map_file(file)
+    if view is None:
+        return None
+
+    with view:
+        if view[:4] != b'fLaC':
+            return None
+
+        info = None
+        tags = {}
+        artwork = None
+        position = 4
+        last_block = False
+
+        while not last_block and position + 4 <= len(view):
+            header = view[position]
+            last_block = bool(header & 0x80)
+            block_type = header & 0x7F
+            size = int.from_bytes(view[position + 1:position + 4], 'big')
+            start = position + 4
+            position = start + size
+
+            if block_type == flac.StreamInfo.code:
+                info = flac.StreamInfo(view[start:position])
+            elif block_type == flac.VCFLACDict.code:
+                tags = dict(flac.VCFLACDict(view[start:position]))
+            elif block_type == flac.Picture.code and artwork is None:
+                artwork = flac_picture(file, view, start)
+
+        if info is None:
+            return None
+
+        return info, tags, artwork
+
+
+def flac_picture(file, view, start):
+    """Return an Artwork reference to the image data of the PICTURE block at start."""
+    offset = start + 4
+    mime_length, = struct.unpack_from('>I', view, offset)
+    mime = view[offset + 4:offset + 4 + mime_length].decode('latin-1', 'replace')
+    offset += 4 + mime_length
+    description_length, = struct.unpack_from('>I', view, offset)
+    offset += 4 + description_length + 16
+    length, = struct.unpack_from('>I', view, offset)
+
+    return Artwork(file, offset + 4, length, mime)
+
+
+def syncsafe(data):
+    """Decode a 28-bit syncsafe integer used by ID3v2 sizes."""
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def read_mp3_headers(file):
+    """Read the stream info, tags and picture location of an MP3 file with an ID3v2.3/2.4 tag.
+
+    The text frames of the tag are copied into a smaller tag without the APIC
+    frames, which is then handed to mutagen. Returns a tuple of (MPEGInfo,
+    tags dictionary, Artwork or None), or None if the file has no ID3v2 tag
+    or uses unsynchronisation or compressed pictures.
+    """
+    view = map_file(file)
+    if view is None:
+        return None
+
+    with view:
+        if view[:3] != b'ID3' or view[3] not in (3, 4) or view[5] & 0x80:
+            return None
+
+        version = view[3]
+        flags = view[5]
+        tag_size = syncsafe(view[6:10])
+        end = min(10 + tag_size, len(view))
+        position = 10
+
+        if flags & 0x40:  # Skips the extended header
+            extended_size = view[position:position + 4]
+            if version == 4:
+                position += syncsafe(extended_size)
+            else:
+                position += 4 + int.from_bytes(extended_size, 'big')
+
+        frames = []
+        artwork = None
+
+        while position + 10 <= end:
+            frame_id = view[position:position + 4]
+            if frame_id == b'\x00\x00\x00\x00':  # Padding
+                break
+            if not FRAME_ID.match(frame_id):
+                return None
+
+            if version == 4:
+                size = syncsafe(view[position + 4:position + 8])
+            else:
+                size = int.from_bytes(view[position + 4:position + 8], 'big')
+            format_flags = view[position + 9]
+            start = position + 10
+            frame_end = start + size
+            if frame_end > end:
+                return None
+
+            if frame_id == b'APIC':
+                if format_flags:
+                    return None
+                if artwork is None:
+                    artwork = apic_picture(file, view, start, frame_end)
+            else:
+                frames.append(view[position:frame_end])
+            position = frame_end
+
+        body = b''.join(frames)
+        size = len(body)
+        header = b'ID3' + bytes([version, 0, 0]) + bytes([(size >> shift) & 0x7F for shift in (21, 14, 7, 0)])
+        tags = dict(easyid3.EasyID3(io.BytesIO(header + body)))
+
+    with open(file, 'rb') as fileobj:
+        info = mp3.MPEGInfo(fileobj, 10 + tag_size)
+
+    return info, tags, artwork
+
+
+def apic_picture(file, view, start, end):
+    """Return an Artwork reference to the image data of the APIC frame body at start."""
+    encoding = view[start]
+    mime_end = view.find(b'\x00', start + 1, end)
+    if mime_end == -1:
+        return None
+    mime = view[start + 1:mime_end].decode('latin-1', 'replace')
+
+    description = mime_end + 2  # Skips the terminator and the picture type
+    if encoding in (1, 2):  # UTF-16 descriptions end with an aligned double null
+        offset = description
+        while offset + 1 < end and view[offset:offset + 2] != b'\x00\x00':
+            offset += 2
+        offset += 2
+    else:
+        offset = view.find(b'\x00', description, end) + 1
+        if offset == 0:
+            return None
+
+    if offset > end:
+        return None
+
+    return Artwork(file, offset, end - offset, mime)
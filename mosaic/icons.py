@@ -0,0 +1,97 @@
+import importlib
+
+from PySide6.QtGui import QIcon, QPixmap
+
+from mosaic import utilities
+
+
+# The prefix under which images.qrc registers the images of the compiled bundle
+BUNDLE_PREFIX = ':/images/'
+
+
+def load_bundle():
+    """Register the compiled Qt resource bundle of the images and return whether it exists.
+
+    The bundle is built from mosaic/images/images.qrc with pyside6-rcc into
+    mosaic/images/resources_rc.py. Without it, the images are read from the
+    package directory.
+    """
+    try:
+        importlib.import_module('mosaic.images.resources_rc')
+    except ImportError:
+        return False
+
+    return True
+
+
+class ResourceRegistry(object):
+    """Resolves each bundled image once and keeps the QIcon and QPixmap made from it.
+
+    Images are served from the compiled Qt resource bundle when it was built,
+    so nothing is extracted to the filesystem, and from the package directory
+    otherwise. QIcon and QPixmap are implicitly shared, so handing out the same
+    instance every time costs nothing. Pixmaps may only be used on the GUI
+    thread, and so may the registry.
+    """
+
+    def __init__(self, package='mosaic.images', bundle=None):
+        """Start with no images resolved, using the compiled bundle if there is one."""
+        if bundle is None:
+            bundle = load_bundle()
+
+        self.package = package
+        self.bundle = bundle
+        self.paths = {}
+        self.icons = {}
+        self.pixmaps = {}
+
+    def path(self, name):
+        """Return the path Qt reads the image called name from."""
+        path = self.paths.get(name)
+        if path is None:
+            if self.bundle:
+                path = BUNDLE_PREFIX + name
+            else:
+                path = utilities.resource_filename(self.package, name)
+            self.paths[name] = path
+
+        return path
+
+    def icon(self, name):
+        """Return the QIcon of the image called name."""
+        icon = self.icons.get(name)
+        if icon is None:
+            icon = self.icons[name] = QIcon(self.path(name))
+
+        return icon
+
+    def pixmap(self, name):
+        """Return the QPixmap of the image called name."""
+        pixmap = self.pixmaps.get(name)
+        if pixmap is None:
+            pixmap = self.pixmaps[name] = QPixmap(self.path(name))
+
+        return pixmap
+
+
+_registry = None
+
+
+def registry():
+    """Return the shared ResourceRegistry, creating it on first use."""
+    global _registry
+
+    if _registry is None:
+        _registry = ResourceRegistry()
+
+    return _registry
+
+
+def icon(name):
+    """Return the QIcon of a bundled image from the shared registry."""
+    return registry().icon(name)
+
+
+def pixmap(name):
+    """Return the QPixmap of a bundled image from the shared registry."""
+    return registry().pixmap(name)
@@ -0,0 +1,107 @@
+import argparse
+import os
+import sys
+import time
+
+import mutagen
+
+from mosaic import catalog, defaults, metadata
+from mosaic.artwork import artwork_cache, folder_artwork
+
+
+def prescale_covers(library_catalog, sizes):
+    """Write the thumbnails of every album cover that doesn't have all of them yet.
+
+    The thumbnails are written under the art hash of the catalog, the same key
+    the player and the album grid look them up by. Returns the number of covers
+    that were decoded.
+    """
+    cache = artwork_cache()
+    decoded = 0
+
+    for art_hash, cover_path in library_catalog.album_covers():
+        if all(os.path.exists(cache.thumbnail_path(art_hash, size)) for size in sizes):
+            continue
+        try:
+            track = metadata.read_track(cover_path)
+        except (OSError, mutagen.MutagenError):
+            continue
+        cover = track.artwork or folder_artwork().find(cover_path)
+        if cover is None:
+            continue
+        try:
+            cache.prescale(cover.data(), sizes, key=art_hash)
+        except OSError:
+            continue
+        decoded += 1
+
+    return decoded
+
+
+def print_progress(done, total):
+    """Show the number of files parsed on a single terminal line."""
+    sys.stderr.write('\rIndexing: {} / {}' .format(done, total))
+    sys.stderr.flush()
+
+
+def parse_arguments(arguments=None):
+    """Parse the command line of the indexer."""
+    parser = argparse.ArgumentParser(
+        prog='python -m mosaic.index',
+        description='Index the media library into the catalog, the metadata cache and '
+                    'the cover art thumbnails used by Mosaic, without starting the player.')
+    parser.add_argument('directory', nargs='?',
+                        help='the directory to index (default: media_library_path in settings.toml)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='the number of processes that parse files (default: %(default)s)')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='only parse files that were added or changed since the last index')
+    parser.add_argument('--no-artwork', dest='artwork', action='store_false',
+                        help="don't write the thumbnails of album covers")
+    parser.add_argument('--database', help='the catalog database to write (default: the player\'s catalog)')
+
+    return parser.parse_args(arguments)
+
+
+def main(arguments=None):
+    """Index the media library and print the throughput of the scan."""
+    options = parse_arguments(arguments)
+    directory = options.directory or defaults.Settings().media_library_path
+    if not directory or not os.path.isdir(directory):
+        sys.stderr.write('{!r} is not a directory; set media_library_path in settings.toml '
+                         'or pass a directory\n' .format(directory))
+        return 1
+
+    directory = os.path.abspath(directory)
+    library_catalog = catalog.Catalog(options.database)
+    progress = print_progress if sys.stderr.isatty() else None
+    start = time.perf_counter()
+
+    try:
+        report = library_catalog.scan(directory, progress=progress, workers=max(1, options.jobs),
+                                      full=not options.incremental)
+        scanned = time.perf_counter() - start
+        if progress is not None:
+            sys.stderr.write('\n')
+
+        covers = 0
+        if options.artwork:
+            covers = prescale_covers(library_catalog, defaults.WINDOW_SIZES + [defaults.THUMBNAIL_SIZE])
+        elapsed = time.perf_counter() - start
+    finally:
+        library_catalog.close()
+
+    parsed = report.added + report.updated
+    print('Indexed {} with {} process{} in {:.1f} s' .format(
+        directory, options.jobs, '' if options.jobs == 1 else 'es', elapsed))
+    print('  {}, {} errors' .format(report, report.failed))
+    print('  {:.1f} files/s, {:.1f} MB/s' .format(
+        parsed / scanned if scanned else 0.0, report.bytes / scanned / 1e6 if scanned else 0.0))
+    if options.artwork:
+        print('  {} album covers prescaled' .format(covers))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
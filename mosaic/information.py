@@ -1,20 +1,26 @@
-from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import (QDialog, QHBoxLayout, QLabel, QLineEdit, QTabWidget, QTableWidget,
                              QTableWidgetItem, QTextEdit, QVBoxLayout, QWidget)
 
-from mosaic import metadata, utilities
+from mosaic import icons, metadata
 
 
 class GeneralInformation(QWidget):
     """MediaInformation houses all of the widgets and layouts in order to show general metadata."""
 
-    def __init__(self, file=None, parent=None):
-        """Initialize the widgets and layouts needed to create a dialog."""
+    def __init__(self, file=None, parent=None, track=None):
+        """Initialize the widgets and layouts needed to create a dialog.
+
+        A TrackInfo record that has already been read may be passed as track so
+        that the file isn't parsed again.
+        """
         super(GeneralInformation, self).__init__(parent)
 
-        if file is not None:
+        if track is None and file is not None:
+            track = metadata.read_track(file, artwork=False)
+
+        if track is not None:
             (album, artist, title, track_number, date, genre, description, sample_rate,
-             bitrate, bitrate_mode, bits_per_sample, *__) = metadata.metadata(file)
+             bitrate, bitrate_mode, bits_per_sample) = track.fields()
 
             artist_info = QHBoxLayout()
             artist_info.addLayout(self.info_field('Artist', artist))
@@ -78,10 +84,13 @@ class FullInformation(QWidget):
     values of the tags.
     """
 
-    def __init__(self, file=None, parent=None):
+    def __init__(self, file=None, parent=None, track=None):
         """Provide data on every tag embedded within the audio file."""
         super(FullInformation, self).__init__(parent)
 
+        if track is None and file is not None:
+            track = metadata.read_track(file, artwork=False)
+
         table_layout = QHBoxLayout()
         table = QTableWidget()
         table.setColumnCount(2)
@@ -90,10 +99,9 @@ class FullInformation(QWidget):
         table.verticalHeader().hide()
         table.horizontalHeader().hide()
 
-        if file is not None:
-            file = metadata.extract_metadata(file)
-            table.setRowCount(len(file))
-            for i, (tag, data) in enumerate(sorted(file.items())):
+        if track is not None:
+            table.setRowCount(len(track.tags))
+            for i, (tag, data) in enumerate(sorted(track.tags.items())):
                 table.setItem(i, 0, QTableWidgetItem(tag))
                 table.setItem(i, 1, QTableWidgetItem(', '.join(data)))
 
@@ -110,11 +118,12 @@ class InformationDialog(QDialog):
         super(InformationDialog, self).__init__(parent)
         self.setWindowTitle('Media Information')
 
-        info_icon = utilities.resource_filename('mosaic.images', 'md_info.png')
-        self.setWindowIcon(QIcon(info_icon))
+        self.setWindowIcon(icons.icon('md_info.png'))
 
-        media_information = GeneralInformation(file)
-        metadata_information = FullInformation(file)
+        # Both tabs share a single parse of the file
+        track = metadata.read_track(file, artwork=False) if file is not None else None
+        media_information = GeneralInformation(track=track)
+        metadata_information = FullInformation(track=track)
 
         page = QTabWidget()
         page.addTab(media_information, 'General')
@@ -1,9 +1,15 @@
 import os
 
 from platformdirs import PlatformDirs
-from PySide6.QtWidgets import QFileSystemModel, QTreeView
+from PySide6.QtCore import (QAbstractItemModel, QFileSystemWatcher, QModelIndex, QObject, Qt,
+                            QThread, QTimer, Signal)
+from PySide6.QtWidgets import (QAbstractItemView, QComboBox, QFileSystemModel, QHBoxLayout,
+                               QLabel, QLineEdit, QProgressBar, QStackedWidget, QTreeView,
+                               QTreeWidget, QTreeWidgetItem, QVBoxLayout, QWidget)
 import toml
 
+from mosaic import catalog, formats, grid
+
 
 class MediaLibraryModel(QFileSystemModel):
     """Creates a model of the media library to be shown in a view."""
@@ -15,7 +21,7 @@ class MediaLibraryModel(QFileSystemModel):
         """
         super(MediaLibraryModel, self).__init__(parent)
 
-        self.setNameFilters(['*.mp3', '*.flac'])
+        self.setNameFilters(formats.name_filters())
         self.config_directory = PlatformDirs(appname='mosaic-music', appauthor=False).user_config_dir
         self.user_config_file = os.path.join(self.config_directory, 'settings.toml')
 
@@ -47,3 +53,540 @@ class MediaLibraryView(QTreeView):
 
         for column in range(1, 4):
             self.hideColumn(column)
+
+
+def tree_position(index):
+    """Return the rows leading from the root to an index, which sort in the order of the tree."""
+    rows = []
+    while index.isValid():
+        rows.append(index.row())
+        index = index.parent()
+
+    return rows[::-1]
+
+
+class CatalogNode(object):
+    """An artist, album or track in the CatalogModel, holding the children fetched so far."""
+
+    __slots__ = ('kind', 'id', 'text', 'path', 'parent', 'row', 'children', 'exhausted')
+
+    def __init__(self, kind, node_id=None, text='', path=None, parent=None, row=0):
+        """Store the catalog row the node stands for; tracks never have children."""
+        self.kind = kind
+        self.id = node_id
+        self.text = text
+        self.path = path
+        self.parent = parent
+        self.row = row
+        self.children = []
+        self.exhausted = kind == 'track'
+
+
+class CatalogModel(QAbstractItemModel):
+    """A model of the catalog grouped by artist, album and track.
+
+    Children are read from the catalog a page at a time through canFetchMore()
+    and fetchMore(), so the view only asks for the rows it is about to show and
+    expanding an artist with thousands of tracks doesn't block the interface.
+    """
+
+    def __init__(self, library_catalog=None, page_size=256, parent=None):
+        """Start with an empty root whose artists are fetched when a view asks for them."""
+        super(CatalogModel, self).__init__(parent)
+
+        self.catalog = library_catalog
+        self.page_size = page_size
+        self.root = CatalogNode('root')
+
+    def set_catalog(self, library_catalog):
+        """Show a different catalog, or reload the current one after a scan changed it."""
+        self.beginResetModel()
+        self.catalog = library_catalog
+        self.root = CatalogNode('root')
+        self.endResetModel()
+
+    def node(self, index):
+        """Return the node of an index, which is the root for an invalid index."""
+        return index.internalPointer() if index.isValid() else self.root
+
+    def index(self, row, column, parent=QModelIndex()):
+        """Return the index of a fetched child of parent."""
+        children = self.node(parent).children
+        if column != 0 or not 0 <= row < len(children):
+            return QModelIndex()
+
+        return self.createIndex(row, column, children[row])
+
+    def parent(self, index):
+        """Return the index of the artist or album that holds the node of index."""
+        if not index.isValid():
+            return QModelIndex()
+
+        parent = index.internalPointer().parent
+        if parent is self.root:
+            return QModelIndex()
+
+        return self.createIndex(parent.row, 0, parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        """Return the number of children of parent fetched so far."""
+        if parent.column() > 0:
+            return 0
+
+        return len(self.node(parent).children)
+
+    def columnCount(self, parent=QModelIndex()):
+        """Return the single column of the model."""
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        """Return whether parent has children without fetching them."""
+        node = self.node(parent)
+        return bool(node.children) or not node.exhausted
+
+    def canFetchMore(self, parent):
+        """Return whether there may be children of parent left to read from the catalog."""
+        return self.catalog is not None and not self.node(parent).exhausted
+
+    def fetchMore(self, parent):
+        """Read the next page of children of parent from the catalog."""
+        node = self.node(parent)
+        if self.catalog is None or node.exhausted:
+            return
+
+        offset = len(node.children)
+        if node.kind == 'root':
+            rows = self.catalog.artists(self.page_size, offset)
+            children = [CatalogNode('artist', artist_id, name or 'Unknown Artist')
+                        for artist_id, name in rows]
+        elif node.kind == 'artist':
+            rows = self.catalog.albums_by_artist(node.id, self.page_size, offset)
+            children = [CatalogNode('album', album_id, '{} ({})' .format(title or 'Unknown Album', date)
+                                    if date else title or 'Unknown Album')
+                        for album_id, title, date, __ in rows]
+        else:
+            rows = self.catalog.tracks_by_album(node.id, self.page_size, offset)
+            children = [CatalogNode('track', track_id, self.track_text(path, title, number), path)
+                        for track_id, path, title, number, __ in rows]
+
+        node.exhausted = len(rows) < self.page_size
+        if not children:
+            return
+
+        for row, child in enumerate(children, offset):
+            child.parent = node
+            child.row = row
+
+        self.beginInsertRows(parent, offset, offset + len(children) - 1)
+        node.children.extend(children)
+        self.endInsertRows()
+
+    @staticmethod
+    def track_text(path, title, number):
+        """Return the text of a track, falling back to its file name when it has no title."""
+        title = title or os.path.splitext(os.path.basename(path))[0]
+        return '{:02d}. {}' .format(number, title) if number is not None else title
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        """Return the name of an artist, album or track, and the path of a track as its tooltip."""
+        if not index.isValid():
+            return None
+
+        node = index.internalPointer()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return node.text
+        if role == Qt.ItemDataRole.ToolTipRole and node.path is not None:
+            return node.path
+
+        return None
+
+    def files(self, index):
+        """Return the paths of the tracks of the artist, album or track at index."""
+        node = self.node(index)
+        if node.kind == 'track':
+            return [node.path]
+        if node.kind == 'album':
+            return self.catalog.album_paths(node.id)
+        if node.kind == 'artist':
+            return self.catalog.artist_paths(node.id)
+
+        return []
+
+
+class CatalogView(QTreeView):
+    """Shows the CatalogModel as a tree of artists, albums and tracks."""
+
+    def __init__(self, parent=None):
+        """Set a CatalogModel as the model of the view."""
+        super(CatalogView, self).__init__(parent)
+
+        self.catalog_model = CatalogModel()
+        self.setModel(self.catalog_model)
+        self.setHeaderHidden(True)
+        self.setUniformRowHeights(True)
+        self.setSelectionMode(QTreeView.SelectionMode.ExtendedSelection)
+
+    def reload(self, library_catalog):
+        """Reload the catalog after a scan changed it, keeping the expanded artists and albums expanded.
+
+        The children of every expanded node are fetched again up to as many as
+        were fetched before, so the nodes below them can be found and expanded.
+        """
+        model = self.catalog_model
+        expanded = {}
+
+        def save(parent):
+            """Record the expanded nodes below parent with the number of children fetched."""
+            for row in range(model.rowCount(parent)):
+                index = model.index(row, 0, parent)
+                if self.isExpanded(index):
+                    node = index.internalPointer()
+                    expanded[node.kind, node.id] = len(node.children)
+                    save(index)
+
+        def restore(parent, count):
+            """Fetch count children of parent and expand those that were expanded."""
+            while model.rowCount(parent) < count and model.canFetchMore(parent):
+                model.fetchMore(parent)
+            for row in range(model.rowCount(parent)):
+                index = model.index(row, 0, parent)
+                node = index.internalPointer()
+                if (node.kind, node.id) in expanded:
+                    restore(index, expanded[node.kind, node.id])
+                    self.expand(index)
+
+        save(QModelIndex())
+        fetched = len(model.root.children)
+        position = self.verticalScrollBar().value()
+
+        model.set_catalog(library_catalog)
+        restore(QModelIndex(), fetched)
+        self.verticalScrollBar().setValue(position)
+
+    def selected_files(self):
+        """Return the paths of the tracks below the selected rows, without repeats."""
+        files = []
+        seen = set()
+        for index in sorted(self.selectedIndexes(), key=tree_position):
+            for file in self.catalog_model.files(index):
+                if file not in seen:
+                    seen.add(file)
+                    files.append(file)
+
+        return files
+
+
+def watch_limit():
+    """Return the number of directories the library watcher may watch.
+
+    On Linux each watched directory uses an inotify watch, which are limited per
+    user, so only half of the limit is used to leave watches for other programs.
+    """
+    try:
+        with open('/proc/sys/fs/inotify/max_user_watches') as watches:
+            return max(1, int(watches.read()) // 2)
+    except (OSError, ValueError):
+        return 8192
+
+
+def topmost(directories):
+    """Return the directories that aren't below another directory of the list."""
+    result = []
+    for directory in sorted(set(directories)):
+        if not result or not directory.startswith(os.path.join(result[-1], '')):
+            result.append(directory)
+
+    return result
+
+
+class LibraryWatcher(QObject):
+    """Watches the directories of the media library for changes.
+
+    Changes are collected for a short delay so that copying an album results in
+    a single rescan, after which changed is emitted with each topmost directory
+    that changed. If the library has more directories than can be watched, the
+    shallowest directories are watched and the whole library is rescanned
+    periodically instead, since changes deeper down would be missed.
+    """
+
+    changed = Signal(str)
+
+    def __init__(self, delay=1000, fallback_interval=15 * 60 * 1000, limit=None, parent=None):
+        """Initialize the file system watcher along with the debounce and fallback timers."""
+        super(LibraryWatcher, self).__init__(parent)
+
+        self.limit = limit if limit is not None else watch_limit()
+        self.root = None
+        self.complete = True
+        self.pending = set()
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.directory_changed)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.emit_changes)
+
+        self.fallback = QTimer(self)
+        self.fallback.setInterval(fallback_interval)
+        self.fallback.timeout.connect(lambda: self.changed.emit(self.root))
+
+    def reset(self, root):
+        """Stop watching every directory and start over with a new library root."""
+        directories = self.watcher.directories()
+        if directories:
+            self.watcher.removePaths(directories)
+        self.root = root
+        self.complete = True
+        self.pending.clear()
+        self.timer.stop()
+        self.fallback.stop()
+
+    def watch(self, directories):
+        """Watch the given directories, shallowest first, up to the watch limit."""
+        watched = set(self.watcher.directories())
+        directories = sorted((directory for directory in set(directories) if directory not in watched),
+                             key=lambda directory: directory.count(os.sep))
+
+        room = max(0, self.limit - len(watched))
+        if len(directories) > room:
+            self.complete = False
+            directories = directories[:room]
+
+        if directories:
+            failed = self.watcher.addPaths(directories)
+            if failed:
+                # The system ran out of watches before the limit was reached
+                self.complete = False
+
+        if not self.complete and self.root is not None and not self.fallback.isActive():
+            self.fallback.start()
+
+    def directory_changed(self, directory):
+        """Queue a changed directory to be rescanned once the changes settle."""
+        if not os.path.isdir(directory):
+            # A removed directory is rescanned through its parent
+            self.watcher.removePath(directory)
+            directory = os.path.dirname(directory)
+        self.pending.add(directory)
+        self.timer.start()
+
+    def emit_changes(self):
+        """Emit changed for each topmost directory that changed."""
+        directories = topmost(self.pending)
+        self.pending.clear()
+        for directory in directories:
+            self.changed.emit(directory)
+
+
+class LibraryScanner(QThread):
+    """Scans the media library into the catalog on a background thread."""
+
+    progress = Signal(int, int)
+    scanned = Signal(object)
+
+    def __init__(self, library_catalog, directory, parent=None):
+        """Store the catalog to fill and the directory to scan."""
+        super(LibraryScanner, self).__init__(parent)
+        self.catalog = library_catalog
+        self.directory = directory
+
+    def run(self):
+        """Scan the directory, leaving one core free for playback and the interface."""
+        workers = max(1, (os.cpu_count() or 1) - 1)
+        report = self.catalog.scan(self.directory, progress=self.progress.emit, workers=workers,
+                                   cancelled=self.isInterruptionRequested)
+        self.scanned.emit(report)
+
+
+class SearchResultsView(QTreeWidget):
+    """Lists the tracks of the catalog that match the library search."""
+
+    def __init__(self, parent=None):
+        """Set the columns of the results and allow several results to be selected."""
+        super(SearchResultsView, self).__init__(parent)
+
+        self.setHeaderLabels(['Title', 'Artist', 'Album'])
+        self.setRootIsDecorated(False)
+        self.setUniformRowHeights(True)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+
+    def show_results(self, rows):
+        """Replace the results with (id, path, title, artist, album) rows of the catalog."""
+        self.clear()
+        items = []
+        for __, path, title, artist, album in rows:
+            item = QTreeWidgetItem([title or os.path.splitext(os.path.basename(path))[0], artist, album])
+            item.setData(0, Qt.ItemDataRole.UserRole, path)
+            item.setToolTip(0, path)
+            items.append(item)
+        self.addTopLevelItems(items)
+
+    def selected_files(self):
+        """Return the paths of the selected results in the order they are listed."""
+        return [self.topLevelItem(row).data(0, Qt.ItemDataRole.UserRole)
+                for row in sorted(self.indexFromItem(item).row() for item in self.selectedItems())]
+
+
+class MediaLibraryWidget(QWidget):
+    """Houses the media library view along with the progress of library scans.
+
+    The first scan of a library walks all of it and compares every file with
+    the catalog. Afterwards only the directories reported by the LibraryWatcher
+    are rescanned, one scan at a time. The library is browsed by folder, by
+    artist and album, or as a grid of album covers, and while text is typed in the search box the view
+    is replaced by the tracks of the catalog that match it.
+    """
+
+    files_activated = Signal(list)
+
+    def __init__(self, parent=None):
+        """Initialize the library view, a progress bar that is hidden while idle and a status line."""
+        super(MediaLibraryWidget, self).__init__(parent)
+
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText('Search library')
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.textChanged.connect(self.search)
+
+        self.mode = QComboBox()
+        self.mode.addItems(['Folders', 'Artists', 'Albums'])
+        self.mode.currentIndexChanged.connect(self.change_mode)
+
+        self.view = MediaLibraryView()
+        self.catalog_view = CatalogView()
+        self.catalog_view.activated.connect(
+            lambda index: self.files_activated.emit(self.catalog_view.selected_files()))
+        self.album_grid = grid.AlbumGridView()
+        self.album_grid.activated.connect(
+            lambda index: self.files_activated.emit(self.album_grid.selected_files()))
+        self.results = SearchResultsView()
+        self.results.activated.connect(lambda index: self.files_activated.emit(self.results.selected_files()))
+
+        self.pages = QStackedWidget()
+        self.pages.addWidget(self.view)
+        self.pages.addWidget(self.catalog_view)
+        self.pages.addWidget(self.album_grid)
+        self.pages.addWidget(self.results)
+
+        self.catalog = None
+        self.scanner = None
+        self.root = None
+        self.queue = []
+
+        self.watcher = LibraryWatcher(parent=self)
+        self.watcher.changed.connect(self.rescan)
+
+        self.progress = QProgressBar()
+        self.progress.setFormat('Scanning library: %v / %m')
+        self.progress.setVisible(False)
+
+        self.status = QLabel()
+        self.status.setVisible(False)
+
+        bar = QHBoxLayout()
+        bar.addWidget(self.search_box)
+        bar.addWidget(self.mode)
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(bar)
+        layout.addWidget(self.pages)
+        layout.addWidget(self.progress)
+        layout.addWidget(self.status)
+        self.setLayout(layout)
+
+    def scan(self, directory):
+        """Scan the whole library at directory into the catalog and start watching it."""
+        if not os.path.isdir(directory):
+            return
+
+        self.stop_scan()
+        self.queue = []
+        self.root = directory
+        self.watcher.reset(directory)
+        self.start_scan(directory)
+
+    def rescan(self, directory):
+        """Queue a rescan of a directory of the library that changed."""
+        if self.root is None or (directory != self.root and
+                                 not directory.startswith(os.path.join(self.root, ''))):
+            return
+
+        if self.scanner is not None and self.scanner.isRunning():
+            if directory not in self.queue:
+                self.queue.append(directory)
+        else:
+            self.start_scan(directory)
+
+    def library_catalog(self):
+        """Return the catalog of the library, opening it on first use."""
+        if self.catalog is None:
+            self.catalog = catalog.Catalog()
+
+        return self.catalog
+
+    def catalog_models(self):
+        """Return the models of the views that show the catalog."""
+        return self.catalog_view.catalog_model, self.album_grid.album_model
+
+    def change_mode(self, mode):
+        """Switch between the folder, artist and album views of the library."""
+        if mode > 0:
+            model = self.catalog_models()[mode - 1]
+            if model.catalog is None:
+                model.set_catalog(self.library_catalog())
+        self.search(self.search_box.text())
+
+    def search(self, text):
+        """Show the tracks matching the text, or the current library view if the text is empty."""
+        if text.strip():
+            self.results.show_results(self.library_catalog().search(text))
+            self.pages.setCurrentWidget(self.results)
+        else:
+            self.pages.setCurrentIndex(self.mode.currentIndex())
+
+    def start_scan(self, directory):
+        """Start a background scan of the directory into the catalog."""
+        self.scanner = LibraryScanner(self.library_catalog(), directory)
+        self.scanner.progress.connect(self.show_progress)
+        self.scanner.scanned.connect(self.show_report)
+        self.scanner.finished.connect(self.scan_finished)
+        self.progress.setRange(0, 0)
+        self.progress.setVisible(True)
+        self.scanner.start()
+
+    def show_progress(self, done, total):
+        """Update the progress bar with the number of files scanned."""
+        self.progress.setRange(0, total)
+        self.progress.setValue(done)
+
+    def show_report(self, report):
+        """Show the number of files a scan touched and watch the directories it walked."""
+        self.status.setText('Library: {}' .format(report))
+        self.status.setVisible(True)
+        self.watcher.watch(report.directories)
+        if report.touched:
+            if self.catalog_view.catalog_model.catalog is not None:
+                self.catalog_view.reload(self.catalog)
+            if self.album_grid.album_model.catalog is not None:
+                self.album_grid.album_model.set_catalog(self.catalog)
+
+    def scan_finished(self):
+        """Hide the progress bar once the scan is over and start the next queued scan."""
+        self.progress.setVisible(False)
+        if self.queue:
+            self.start_scan(self.queue.pop(0))
+
+    def stop_scan(self):
+        """Stop a running scan and wait for its thread to finish."""
+        self.queue = []
+        if self.scanner is not None and self.scanner.isRunning():
+            self.scanner.requestInterruption()
+            self.scanner.wait()
+
+    def stop(self):
+        """Stop every background task of the library before the player closes."""
+        self.stop_scan()
+        self.album_grid.album_model.loader.stop()
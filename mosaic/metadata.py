@@ -1,19 +1,163 @@
+import itertools
+import multiprocessing
+import os
+
 import mutagen
+from mutagen import mp3
 from PySide6.QtCore import QByteArray
 
-from mosaic import utilities
+from mosaic import cache, formats, utilities
+from mosaic.artwork import folder_artwork
+
+
+class TrackInfo(object):
+    """TrackInfo holds everything Mosaic reads from a single parse of an audio file.
+
+    The tags are stored as the same dictionary of lists that mutagen provides, the
+    stream info is copied out of mutagen's info object, and the artwork is kept as
+    a headers.Artwork reference to the embedded image (or None when the file has
+    no cover art), so the image is only read when it's displayed.
+    """
+
+    __slots__ = ('path', 'tags', 'sample_rate', 'bitrate', 'bitrate_mode',
+                 'bits_per_sample', 'length', 'artwork')
+
+    def __init__(self, path, tags=None, sample_rate=0, bitrate=None, bitrate_mode=None,
+                 bits_per_sample=None, length=0.0, artwork=None):
+        """Store the parsed values of an audio file."""
+        self.path = path
+        self.tags = tags if tags is not None else {}
+        self.sample_rate = sample_rate
+        self.bitrate = bitrate
+        self.bitrate_mode = bitrate_mode
+        self.bits_per_sample = bits_per_sample
+        self.length = length
+        self.artwork = artwork
+
+    def tag(self, key, default='??'):
+        """Return the first value of the given tag or the default if it doesn't exist."""
+        return self.tags.get(key, [default])[0]
+
+    def fields(self):
+        """Return the formatted tags and stream info of summary(), without the artwork."""
+        sample_rate = "{} Hz" .format(self.sample_rate)
+
+        if self.bitrate is not None:  # Bitrate only applies to mp3 files
+            bitrate = "{} kb/s" .format(self.bitrate // 1000)
+            bitrate_mode = "{}" .format(self.bitrate_mode)
+        else:
+            bitrate = ''
+            bitrate_mode = ''
+
+        if self.bits_per_sample is not None:  # Bits per sample only applies to flac files
+            bits_per_sample = "{}" .format(self.bits_per_sample)
+        else:
+            bits_per_sample = ''
+
+        return [self.tag('album'), self.tag('artist'), self.tag('title'),
+                self.tag('tracknumber'), self.tag('date', ''), self.tag('genre', ''),
+                self.tag('description', ''), sample_rate, bitrate, bitrate_mode,
+                bits_per_sample]
+
+    def summary(self):
+        """Return the list of formatted fields that metadata() has always returned.
+
+        The last field is the image data of the artwork, which is read from the
+        file here, so callers that only show the tags should use fields().
+        """
+        if self.artwork is not None:
+            artwork = QByteArray(self.artwork.data())
+        else:
+            artwork = utilities.resource_filename('mosaic.images', 'nocover.png')
+
+        return self.fields() + [artwork]
 
 
 def identify_filetype(file):
-    """Identify the given file as either MP3 or FLAC and return a Mutagen object."""
-    audio_file = mutagen.File(file)
+    """Identify the format of the given file and return a Mutagen object.
+
+    The format is sniffed from the first bytes of the file so that only the
+    matching parser opens it. Files that no registered format recognizes are
+    handed to mutagen to probe.
+    """
+    audio_format = formats.sniff(file)
+    if audio_format is not None:
+        return audio_format.load(file)
+
+    return mutagen.File(file)
+
+
+def read_track(file, artwork=True, use_cache=True):
+    """Return a TrackInfo record of the audio file, parsing it at most once.
+
+    The persistent metadata cache is consulted first. A cached record only holds
+    the location of the embedded artwork; when that location isn't known and
+    artwork is requested, the file is parsed again. When the file has no
+    embedded artwork, an image file in its directory such as cover.jpg is used.
+    Callers that only need the tags should pass artwork=False, which returns a
+    record without artwork.
+    """
+    track = cached_track(file, artwork) if use_cache else parse_track(file)
+
+    if not artwork:
+        track.artwork = None
+    elif track.artwork is None:
+        track.artwork = folder_artwork().find(file)
+
+    return track
+
+
+def cached_track(file, artwork):
+    """Return the TrackInfo of file from the metadata cache, parsing and storing it on a miss."""
+    store = cache.metadata_cache()
 
-    if file.lower().endswith('.mp3'):
-        audio_file = mutagen.mp3.MP3(file, ID3=mutagen.easyid3.EasyID3)
-    elif file.lower().endswith('.flac'):
-        audio_file = mutagen.flac.FLAC(file)
+    record = store.get(file)
+    if record is not None:
+        cached_artwork = record['artwork']
+        if cached_artwork is None or cached_artwork.offset is not None:
+            return TrackInfo(file, **record)
+        if not artwork:
+            record['artwork'] = None
+            return TrackInfo(file, **record)
 
-    return audio_file
+    try:
+        track = parse_track(file)
+    except mutagen.MutagenError as error:
+        store.put_failure(file, error)
+        raise
+
+    if record is None:
+        store.put(track)
+
+    return track
+
+
+def parse_track(file):
+    """Read the audio file once and return a TrackInfo record of its contents.
+
+    The format registry picks the reader from the first bytes of the file. MP3
+    and FLAC files are read header-only, which skips over the embedded picture.
+    """
+    audio_format = formats.sniff(file)
+    if audio_format is None:
+        raise mutagen.MutagenError('{} is not a supported audio file' .format(file))
+
+    info, tags, artwork = audio_format.read(file)
+
+    return track_from_info(file, info, tags, artwork)
+
+
+def track_from_info(file, info, tags, artwork):
+    """Create a TrackInfo record from a mutagen stream info object."""
+    bitrate = getattr(info, 'bitrate', None) if isinstance(info, mp3.MPEGInfo) else None
+
+    return TrackInfo(file, tags,
+                     sample_rate=getattr(info, 'sample_rate', 0),
+                     bitrate=bitrate,
+                     bitrate_mode=getattr(info, 'bitrate_mode', None),
+                     bits_per_sample=getattr(info, 'bits_per_sample', None),
+                     length=info.length,
+                     artwork=artwork)
 
 
 def extract_metadata(file):
@@ -22,51 +166,91 @@ def extract_metadata(file):
     Creates a dictionary with the tag and data pairs so that the MP3 and FLAC
     tags are in the same dictionary.
     """
-    audio_file = identify_filetype(file)
+    return read_track(file, artwork=False).tags
+
+
+def metadata(file):
+    """Create a list of all the media file's extracted metadata."""
+    return read_track(file).summary()
 
-    # Mutagen returns None if there is no metadata embedded within a file
-    if audio_file.tags is None:
-        return {}
 
-    tags_dictionary = dict(audio_file.tags)
+class ExtractResult(object):
+    """The outcome of reading one file in a batch: a TrackInfo record or an error message."""
 
-    return tags_dictionary
+    __slots__ = ('path', 'track', 'error')
 
+    def __init__(self, path, track=None, error=None):
+        """Store the path of the file along with its track or error."""
+        self.path = path
+        self.track = track
+        self.error = error
 
-def metadata(file):
-    """Create a list of all the media file's extracted metadata."""
-    audio_file = identify_filetype(file)
-    file_metadata = extract_metadata(file)
-
-    album = file_metadata.get('album', ['??'])[0]
-    artist = file_metadata.get('artist', ['??'])[0]
-    title = file_metadata.get('title', ['??'])[0]
-    track_number = file_metadata.get('tracknumber', ['??'])[0]
-    date = file_metadata.get('date', [''])[0]
-    genre = file_metadata.get('genre', [''])[0]
-    description = file_metadata.get('description', [''])[0]
-    sample_rate = "{} Hz" .format(audio_file.info.sample_rate)
-    artwork = utilities.resource_filename('mosaic.images', 'nocover.png')
-
-    try:  # Bitrate only applies to mp3 files
-        bitrate = "{} kb/s" .format(audio_file.info.bitrate // 1000)
-        bitrate_mode = "{}" .format(audio_file.info.bitrate_mode)
-    except AttributeError:
-        bitrate = ''
-        bitrate_mode = ''
-    try:  # Bits per sample only applies to flac files
-        bits_per_sample = "{}" .format(audio_file.info.bits_per_sample)
-    except AttributeError:
-        bits_per_sample = ''
-
-    try:  # Searches for cover art in flac files
-        artwork = QByteArray().append(audio_file.pictures[0].data)
-    except (IndexError, mutagen.flac.FLACNoHeaderError):
-        artwork = utilities.resource_filename('mosaic.images', 'nocover.png')
-    except AttributeError:  # Searches for cover art in mp3 files
-        for tag in mutagen.mp3.MP3(file):
-            if 'APIC' in tag:
-                artwork = QByteArray().append(mutagen.mp3.MP3(file)[tag].data)
-
-    return [album, artist, title, track_number, date, genre, description, sample_rate,
-            bitrate, bitrate_mode, bits_per_sample, artwork]
+
+def extract_one(file):
+    """Parse a single file for extract_many() and capture any error instead of raising it."""
+    try:
+        return ExtractResult(file, parse_track(file))
+    except Exception as error:
+        return ExtractResult(file, error='{}: {}' .format(type(error).__name__, error))
+
+
+def extract_many(files, workers=None, chunksize=64, use_cache=True, context=None, refresh=False):
+    """Read the metadata of many files in parallel and yield an ExtractResult for each.
+
+    Parsing is CPU bound Python, so the files are spread over a pool of worker
+    processes (os.cpu_count() of them by default) in chunks of chunksize files.
+    Results are yielded as soon as they are ready, in no particular order. Files
+    found in the metadata cache are yielded without being sent to the pool,
+    unless the cache doesn't know where their artwork is, and newly parsed files
+    and failures are written to the cache. A file that can't be read yields a
+    result with an error message rather than raising. context
+    names the multiprocessing start method; callers running inside the GUI
+    process pass 'spawn' since forking a process with Qt threads isn't safe.
+    With refresh, every file is parsed again and the cache is overwritten.
+    """
+    workers = workers or os.cpu_count() or 1
+    store = cache.metadata_cache() if use_cache else None
+    files = iter(files)
+    pool = None
+
+    try:
+        while True:
+            # The input is consumed in batches so that a generator of paths is streamed
+            batch = list(itertools.islice(files, chunksize * workers * 4))
+            if not batch:
+                break
+
+            misses = []
+            for file in batch:
+                if store is None or refresh:
+                    misses.append(file)
+                    continue
+                try:
+                    record = store.get(file)
+                except mutagen.MutagenError as error:  # A cached failure
+                    yield ExtractResult(file, error=str(error))
+                    continue
+                # The picture of a record from a full parse has no known location
+                # in the file, so such files are parsed again like cache misses
+                if record is None or (record['artwork'] is not None and record['artwork'].offset is None):
+                    misses.append(file)
+                else:
+                    yield ExtractResult(file, TrackInfo(file, **record))
+
+            if workers > 1 and misses:
+                if pool is None:
+                    pool = multiprocessing.get_context(context).Pool(workers)
+                results = pool.imap_unordered(extract_one, misses, chunksize)
+            else:
+                results = map(extract_one, misses)
+
+            for result in results:
+                if store is not None:
+                    if result.track is not None:
+                        store.put(result.track)
+                    else:
+                        store.put_failure(result.path, result.error)
+                yield result
+    finally:
+        if pool is not None:
+            pool.terminate()
@@ -0,0 +1,118 @@
+import os
+
+import mutagen
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from PySide6.QtGui import QImage
+
+from mosaic import metadata
+from mosaic.artwork import artwork_cache
+
+
+class NowPlaying(object):
+    """The window title and cover of a track, as read by a NowPlayingTask.
+
+    cover_key is None when the track has no cover art, in which case image is
+    a null QImage.
+    """
+
+    __slots__ = ('path', 'title', 'cover_key', 'image')
+
+    def __init__(self, path, title, cover_key=None, image=None):
+        """Store what the window shows for the track at path."""
+        self.path = path
+        self.title = title
+        self.cover_key = cover_key
+        self.image = image if image is not None else QImage()
+
+
+def read_now_playing(path, size, shown_key=None):
+    """Return the NowPlaying of the track at path with its cover scaled to fit within size.
+
+    The cover isn't decoded when its key is shown_key, the cover already on
+    screen. A track that can't be read is shown without tags or cover.
+    """
+    try:
+        track = metadata.read_track(path)
+    except (OSError, ValueError, mutagen.MutagenError):
+        return NowPlaying(path, os.path.basename(path))
+
+    title = '{} - {} - {} - {}' .format(track.tag('tracknumber').zfill(2), track.tag('artist'),
+                                        track.tag('album'), track.tag('title'))
+    if track.artwork is None:
+        return NowPlaying(path, title)
+
+    try:
+        cover_key = artwork_cache().cover_key(track.artwork)
+        if cover_key == shown_key:
+            return NowPlaying(path, title, cover_key)
+        return NowPlaying(path, title, cover_key, artwork_cache().cover_image(track.artwork, size))
+    except (OSError, ValueError):
+        return NowPlaying(path, title)
+
+
+class NowPlayingTask(QRunnable):
+    """Reads the title and cover of one track on a thread of the NowPlayingLoader pool."""
+
+    def __init__(self, loader, request, path, size, shown_key):
+        """Store the track to read and the number of the request it answers."""
+        super(NowPlayingTask, self).__init__()
+        self.setAutoDelete(False)
+        self.loader = loader
+        self.request = request
+        self.path = path
+        self.size = size
+        self.shown_key = shown_key
+
+    def run(self):
+        """Read the track and hand it to the loader, which lives on the GUI thread."""
+        self.loader.loaded.emit(self.request, read_now_playing(self.path, self.size, self.shown_key))
+
+
+class NowPlayingLoader(QObject):
+    """Reads the tags and cover of the track that starts playing on worker threads.
+
+    Every request supersedes the ones before it: a request that hasn't started
+    yet is cancelled, and the result of one that already started is dropped
+    when it arrives, so skipping quickly through tracks only ever shows the
+    last one. Results that are shown are emitted as ready.
+    """
+
+    loaded = Signal(int, object)
+    ready = Signal(object)
+
+    def __init__(self, threads=2, parent=None):
+        """Initialize the thread pool used to read tracks."""
+        super(NowPlayingLoader, self).__init__(parent)
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(threads)
+        self.requests = 0
+        self.task = None
+        self.cancelled = 0
+        self.dropped = 0
+        self.loaded.connect(self.finished)
+
+    def request(self, path, size, shown_key=None):
+        """Read the track at path, superseding any earlier request."""
+        if self.task is not None and self.pool.tryTake(self.task):
+            self.cancelled += 1
+
+        self.requests += 1
+        self.task = NowPlayingTask(self, self.requests, path, size, shown_key)
+        self.pool.start(self.task)
+
+    def finished(self, request, now_playing):
+        """Emit ready with the result of the latest request, dropping older ones."""
+        if request != self.requests:
+            self.dropped += 1
+            return
+
+        self.task = None
+        self.ready.emit(now_playing)
+
+    def stop(self):
+        """Cancel the queued request and wait for the running ones."""
+        self.pool.clear()
+        self.pool.waitForDone()
+        self.task = None
@@ -3,14 +3,16 @@ import sys
 
 import natsort
 
-from PySide6.QtCore import Qt, QFileInfo, QTime, QTimer, QUrl
-from PySide6.QtGui import QAction, QIcon, QKeySequence, QPixmap, QShortcut
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtGui import QAction, QKeySequence, QPixmap, QShortcut
 from PySide6.QtMultimedia import QAudioOutput, QMediaPlayer
-from PySide6.QtWidgets import (QApplication, QDockWidget, QFileDialog,
-                             QLabel, QListWidget, QListWidgetItem, QMainWindow, QSizePolicy,
-                             QSlider, QToolBar, QVBoxLayout, QWidget)
+from PySide6.QtWidgets import (QApplication, QComboBox, QDockWidget, QFileDialog,
+                             QInputDialog, QLabel, QListView, QMainWindow, QMessageBox,
+                             QSizePolicy, QSlider, QToolBar, QVBoxLayout, QWidget)
 
-from mosaic import about, configuration, defaults, information, library, metadata, utilities
+from mosaic import (about, configuration, defaults, duplicates, engine, formats, gapless, icons,
+                    information, library, nowplaying, playlist, playlists, prefetch, session,
+                    timeline)
 
 
 class MusicPlayer(QMainWindow):
@@ -21,14 +23,13 @@ class MusicPlayer(QMainWindow):
 
         The window title, window icon, and window size are initialized here as well
         as the following widgets: QMediaPlayer, QAudioOutput, QMenuBar,
-        QToolBar, QLabel, QPixmap, QSlider, QDockWidget, QListWidget, QWidget, and
+        QToolBar, QLabel, QPixmap, QSlider, QDockWidget, QListView, QWidget, and
         QVBoxLayout. The connect signals for relevant widgets are also initialized.
         """
         super(MusicPlayer, self).__init__(parent)
         self.setWindowTitle('Mosaic')
 
-        window_icon = utilities.resource_filename('mosaic.images', 'icon.png')
-        self.setWindowIcon(QIcon(window_icon))
+        self.setWindowIcon(icons.icon('icon.png'))
 
         # Read settings.toml once and cache the Settings object.  Calls that need
         # fresh values after the preferences dialog closes go through
@@ -40,24 +41,50 @@ class MusicPlayer(QMainWindow):
         self.player = QMediaPlayer()
         self.audio_output = QAudioOutput()
         self.player.setAudioOutput(self.audio_output)
-        self.playlist = []
-        self.current_index = -1
+        self.standby = gapless.StandbyPlayer(parent=self)
+        self.prefetcher = prefetch.Prefetcher(self.settings.window_size, self.settings.prefetch_depth, parent=self)
+        self.prefetched_path = None
+        self.playlist = playlist.PlaylistModel()
+        self.order = engine.PlaybackOrder()
         self.playlist_location = self.settings.playlist_path
         self.menu = self.menuBar()
         self.toolbar = QToolBar()
         self.art = QLabel()
         self.pixmap = QPixmap()
+        self.now_playing = nowplaying.NowPlayingLoader(parent=self)
+        self.cover_key = None
         self.slider = QSlider(Qt.Orientation.Horizontal)
         self.duration_label = QLabel()
+        self.position_updater = timeline.PositionUpdater(self.slider, self.duration_label,
+                                                         self.settings.frame_rate, parent=self)
+        self.seek_throttle = timeline.SeekThrottle(parent=self)
         self.playlist_dock = QDockWidget('Playlist', self)
         self.library_dock = QDockWidget('Media Library', self)
-        self.playlist_view = QListWidget()
-        self.playlist_view.setSelectionMode(QListWidget.SelectionMode.ExtendedSelection)
-        self.library_view = library.MediaLibraryView()
+        self.playlist_view = QListView()
+        self.playlist_view.setModel(self.playlist)
+        self.playlist_view.setUniformItemSizes(True)
+        self.playlist_view.setSelectionMode(QListView.SelectionMode.ExtendedSelection)
+        self.playlist_selector = QComboBox()
+        self.playlist_selector.setPlaceholderText('Unsaved playlist')
+        self.ingest_progress = playlist.IngestProgress()
+        self.playlist_widget = QWidget()
+        self.walker = None
+        self.play_loaded = False
+        self.walker_complete = True
+        self.loader_offset = 0
+        self.loading = False
+        self.playlists = playlists.PlaylistDatabase(os.path.join(self.playlist_location, 'playlists.sqlite'))
+        self.playlist_name = None
+        self.playlist_dirty = False
+        self.journal = None
+        self.restoring = False
+        self.resume_position = 0
+        self.autosave_timer = QTimer(self)
+        self.library_widget = library.MediaLibraryWidget()
+        self.library_view = self.library_widget.view
         self.preferences = configuration.PreferencesDialog()
         self.widget = QWidget()
         self.player_layout = QVBoxLayout(self.widget)
-        self.duration = 0
         self.playlist_dock_state = None
         self.library_dock_state = None
 
@@ -65,15 +92,22 @@ class MusicPlayer(QMainWindow):
         self.setCentralWidget(self.widget)
         self.player_layout.setContentsMargins(0, 0, 0, 0)
         self.art.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
+        self.art.setScaledContents(True)
+        self.player_layout.addWidget(self.art)
 
         # Initiates the playlist dock widget and the library dock widget
         self.addDockWidget(self.settings.dock_position, self.playlist_dock)
-        self.playlist_dock.setWidget(self.playlist_view)
+        playlist_layout = QVBoxLayout(self.playlist_widget)
+        playlist_layout.setContentsMargins(0, 0, 0, 0)
+        playlist_layout.addWidget(self.playlist_selector)
+        playlist_layout.addWidget(self.playlist_view)
+        playlist_layout.addWidget(self.ingest_progress)
+        self.playlist_dock.setWidget(self.playlist_widget)
         self.playlist_dock.setVisible(self.settings.playlist_on_start)
         self.playlist_dock.setFeatures(QDockWidget.DockWidgetFeature.DockWidgetClosable)
 
         self.addDockWidget(self.settings.dock_position, self.library_dock)
-        self.library_dock.setWidget(self.library_view)
+        self.library_dock.setWidget(self.library_widget)
         self.library_dock.setVisible(self.settings.media_library_on_start)
         self.library_dock.setFeatures(QDockWidget.DockWidgetFeature.DockWidgetClosable)
         self.tabifyDockWidget(self.playlist_dock, self.library_dock)
@@ -86,14 +120,16 @@ class MusicPlayer(QMainWindow):
             self.menu.setNativeMenuBar(False)
 
         # Signals that connect to other methods when they're called
-        self.player.metaDataChanged.connect(self.display_meta_data)
-        self.player.mediaStatusChanged.connect(self.handle_media_status)
-        self.slider.sliderMoved.connect(self.seek)
-        self.player.durationChanged.connect(self.song_duration)
-        self.player.positionChanged.connect(self.song_position)
-        self.player.playbackStateChanged.connect(self.set_state)
-        self.playlist_view.itemActivated.connect(self.activate_playlist_item)
+        self.connect_player(self.player)
+        self.slider.sliderMoved.connect(self.seek_throttle.request)
+        self.slider.sliderReleased.connect(self.seek_throttle.flush)
+        self.seek_throttle.seek.connect(self.seek)
+        self.playlist_view.activated.connect(self.activate_playlist_item)
+        self.playlist.rowsInserted.connect(self.playlist_rows_inserted)
+        self.playlist.rowsRemoved.connect(self.playlist_rows_removed)
+        self.playlist.modelReset.connect(self.playlist_reset)
         self.library_view.activated.connect(self.open_media_library)
+        self.library_widget.files_activated.connect(self.open_library_files)
         self.playlist_dock.visibilityChanged.connect(self.dock_visibility_change)
         self.library_dock.visibilityChanged.connect(self.dock_visibility_change)
         self.preferences.dialog_media_library.media_library_line.textChanged.connect(self.change_media_library_path)
@@ -102,36 +138,147 @@ class MusicPlayer(QMainWindow):
         self.art.mousePressEvent = self.press_playback
         self.delete_shortcut = QShortcut(QKeySequence(Qt.Key.Key_Delete), self.playlist_view)
         self.delete_shortcut.activated.connect(self.remove_from_playlist)
+        self.ingest_progress.cancel_button.clicked.connect(self.stop_adding_tracks)
+        self.autosave_timer.timeout.connect(self.autosave)
+        self.now_playing.ready.connect(self.show_meta_data)
+        self.playlist_selector.textActivated.connect(self.switch_playlist)
 
         # Creating the menu controls, media controls, and window size of the music player
         self.menu_controls()
         self.media_controls()
         self.load_saved_playlist()
+        self.refresh_playlist_selector()
+        self.set_playlist_name(self.playlists.active())
+        self.library_widget.scan(self.settings.media_library_path)
+
+    @property
+    def current_index(self):
+        """Return the row of the current track in the playlist, or -1."""
+        return self.order.current
+
+    @current_index.setter
+    def current_index(self, index):
+        """Make the track at index the current one."""
+        self.order.jump(index)
+
+    def connect_player(self, player):
+        """Connect the signals of the QMediaPlayer that is playing to the window."""
+        player.metaDataChanged.connect(self.display_meta_data)
+        player.mediaStatusChanged.connect(self.handle_media_status)
+        player.durationChanged.connect(self.song_duration)
+        player.positionChanged.connect(self.song_position)
+        player.playbackStateChanged.connect(self.set_state)
+
+    def disconnect_player(self, player):
+        """Disconnect a QMediaPlayer that becomes the standby player from the window."""
+        player.metaDataChanged.disconnect(self.display_meta_data)
+        player.mediaStatusChanged.disconnect(self.handle_media_status)
+        player.durationChanged.disconnect(self.song_duration)
+        player.positionChanged.disconnect(self.song_position)
+        player.playbackStateChanged.disconnect(self.set_state)
 
     def handle_media_status(self, status):
-        """Auto-play next track when current ends."""
-        if status == QMediaPlayer.MediaStatus.EndOfMedia:
-            self.next()
+        """Auto-play next track when current ends, or replay it in repeat one mode.
+
+        When the next track was preloaded into the standby player, the players
+        are swapped so that it starts without a gap.
+        """
+        if status == QMediaPlayer.MediaStatus.LoadedMedia and self.resume_position:
+            self.player.setPosition(self.resume_position)
+            self.resume_position = 0
+        elif status == QMediaPlayer.MediaStatus.EndOfMedia:
+            finished = self.current_index
+            index = self.order.next(automatic=True)
+            if index == -1:
+                return
+            if index == finished:
+                self.player.setPosition(0)
+                self.player.play()
+            elif self.standby.ready(index, self.playlist.url(index)):
+                self.standby.begin_transition(gapless=True)
+                self.swap_to_standby(index)
+            else:
+                self.standby.begin_transition(gapless=False)
+                self.play_available(index, self.order.next)
+
+    def preload_next(self, position):
+        """Load the next track into the standby player shortly before the current one ends."""
+        if not self.settings.gapless or not self.standby.should_preload(position, self.player.duration()):
+            return
+
+        index = self.order.upcoming()
+        if index == -1 or index == self.current_index:
+            return
+        url = self.playlist.url(index)
+        if not self.standby.holds(index, url) and self.playlist.check(index):
+            self.standby.preload(index, url)
+
+    def prefetch_upcoming(self, file_path):
+        """Count whether the track that started had been prefetched, and warm the tracks after it."""
+        if not file_path or file_path == self.prefetched_path or self.prefetcher.depth <= 0:
+            return
+
+        self.prefetched_path = file_path
+        self.prefetcher.played(file_path)
+        self.duration_label.setToolTip(self.playback_report())
+
+        indexes = self.order.lookahead(self.prefetcher.depth)
+        self.prefetcher.prefetch([self.playlist.path(index) for index in indexes])
+
+    def playback_report(self):
+        """Return the latency of the last track change and the prefetch and update counts, one per line."""
+        reports = (self.standby.report(), self.prefetcher.report(), self.position_updater.report())
+        return '\n'.join(line for line in reports if line)
+
+    def swap_to_standby(self, index):
+        """Make the standby player, which holds the track at index, the one that plays."""
+        self.disconnect_player(self.player)
+        self.player, self.audio_output = self.standby.swap(self.player, self.audio_output)
+        self.connect_player(self.player)
+
+        self.playlist_view.setCurrentIndex(self.playlist.index(index))
+        self.player.play()
+        self.song_duration(self.player.duration())
+        self.display_meta_data()
+
+    def stop_playback(self):
+        """Stop the player that is playing."""
+        self.player.stop()
 
     def play_index(self, index):
-        """Play specific track from the manual playlist."""
+        """Play specific track from the manual playlist, returning False if its file is missing."""
         if 0 <= index and index < len(self.playlist):
             self.current_index = index
-            self.player.setSource(self.playlist[index])
-            self.playlist_view.setCurrentRow(index)
+            self.playlist_view.setCurrentIndex(self.playlist.index(index))
+            if not self.playlist.check(index):
+                self.player.stop()
+                return False
+            self.player.setSource(self.playlist.url(index))
             self.player.play()
+            return True
+
+        return False
+
+    def play_available(self, index, step):
+        """Play the track at index, or the first track that step() moves to whose file exists."""
+        for __ in range(len(self.playlist)):
+            if index == -1 or self.play_index(index):
+                return
+            index = step()
 
     def menu_controls(self):
         """Initiate the menu bar and add it to the QMainWindow widget."""
         self.file = self.menu.addMenu('File')
         self.edit = self.menu.addMenu('Edit')
         self.playback = self.menu.addMenu('Playback')
+        self.playlists_ = self.menu.addMenu('Playlists')
         self.view = self.menu.addMenu('View')
         self.help_ = self.menu.addMenu('Help')
 
         self.file_menu()
         self.edit_menu()
         self.playback_menu()
+        self.playlists_menu()
         self.view_menu()
         self.help_menu()
 
@@ -140,28 +287,34 @@ class MusicPlayer(QMainWindow):
         self.addToolBar(Qt.ToolBarArea.BottomToolBarArea, self.toolbar)
         self.toolbar.setMovable(False)
 
-        play_icon = utilities.resource_filename('mosaic.images', 'md_play.png')
-        self.play_action = QAction(QIcon(play_icon), 'Play', self)
+        self.play_action = QAction(icons.icon('md_play.png'), 'Play', self)
         self.play_action.triggered.connect(self.toggle_playback)
 
-        stop_icon = utilities.resource_filename('mosaic.images', 'md_stop.png')
-        self.stop_action = QAction(QIcon(stop_icon), 'Stop', self)
-        self.stop_action.triggered.connect(self.player.stop)
+        self.stop_action = QAction(icons.icon('md_stop.png'), 'Stop', self)
+        self.stop_action.triggered.connect(self.stop_playback)
 
-        previous_icon = utilities.resource_filename('mosaic.images', 'md_previous.png')
-        self.previous_action = QAction(QIcon(previous_icon), 'Previous', self)
+        self.previous_action = QAction(icons.icon('md_previous.png'), 'Previous', self)
         self.previous_action.triggered.connect(self.previous)
 
-        next_icon = utilities.resource_filename('mosaic.images', 'md_next.png')
-        self.next_action = QAction(QIcon(next_icon), 'Next', self)
+        self.next_action = QAction(icons.icon('md_next.png'), 'Next', self)
         self.next_action.triggered.connect(self.next)
 
         self.toolbar.addAction(self.play_action)
         self.toolbar.addAction(self.stop_action)
         self.toolbar.addAction(self.previous_action)
+        self.shuffle_action = QAction(icons.icon('md_shuffle.png'), 'Shuffle', self)
+        self.shuffle_action.setCheckable(True)
+        self.shuffle_action.toggled.connect(self.set_shuffle)
+
+        self.repeat_action = QAction('Repeat', self)
+        self.repeat_action.triggered.connect(self.cycle_repeat)
+
         self.toolbar.addAction(self.next_action)
+        self.toolbar.addAction(self.shuffle_action)
+        self.toolbar.addAction(self.repeat_action)
         self.toolbar.addWidget(self.slider)
         self.toolbar.addWidget(self.duration_label)
+        self.show_repeat_mode()
 
     def file_menu(self):
         """Add a file menu to the menu bar.
@@ -200,13 +353,18 @@ class MusicPlayer(QMainWindow):
         """Add an edit menu to the menu bar.
 
         The edit menu houses the preferences item that opens a preferences dialog
-        that allows the user to customize features of the music player.
+        that allows the user to customize features of the music player, and the
+        find duplicates item that lists the tracks of the library with the same audio.
         """
         self.preferences_action = QAction('Preferences', self)
         self.preferences_action.setShortcut('CTRL+SHIFT+P')
         self.preferences_action.triggered.connect(lambda: self.preferences.exec_())
 
+        self.find_duplicates_action = QAction('Find Duplicates', self)
+        self.find_duplicates_action.triggered.connect(self.find_duplicates)
+
         self.edit.addAction(self.preferences_action)
+        self.edit.addAction(self.find_duplicates_action)
 
     def playback_menu(self):
         """Add a playback menu to the menu bar.
@@ -219,7 +377,7 @@ class MusicPlayer(QMainWindow):
 
         self.stop_playback_action = QAction('Stop', self)
         self.stop_playback_action.setShortcut('S')
-        self.stop_playback_action.triggered.connect(self.player.stop)
+        self.stop_playback_action.triggered.connect(self.stop_playback)
 
         self.previous_playback_action = QAction('Previous', self)
         self.previous_playback_action.setShortcut('B')
@@ -232,7 +390,52 @@ class MusicPlayer(QMainWindow):
         self.playback.addAction(self.play_playback_action)
         self.playback.addAction(self.stop_playback_action)
         self.playback.addAction(self.previous_playback_action)
+        self.shuffle_playback_action = QAction('Shuffle', self)
+        self.shuffle_playback_action.setShortcut('CTRL+H')
+        self.shuffle_playback_action.setCheckable(True)
+        self.shuffle_playback_action.toggled.connect(self.set_shuffle)
+
+        self.repeat_playback_action = QAction('Repeat', self)
+        self.repeat_playback_action.setShortcut('R')
+        self.repeat_playback_action.triggered.connect(self.cycle_repeat)
+
         self.playback.addAction(self.next_playback_action)
+        self.playback.addAction(self.shuffle_playback_action)
+        self.playback.addAction(self.repeat_playback_action)
+
+    def playlists_menu(self):
+        """Add a playlists menu to the menu bar.
+
+        The playlists menu houses the New Playlist, Save Playlist, Save Playlist
+        As, Delete Playlist, Import M3U, and Export M3U menu items.
+        """
+        self.new_playlist_action = QAction('New Playlist', self)
+        self.new_playlist_action.triggered.connect(self.new_playlist)
+
+        self.save_named_playlist_action = QAction('Save Playlist', self)
+        self.save_named_playlist_action.setShortcut('CTRL+S')
+        self.save_named_playlist_action.triggered.connect(self.save_playlist_to_database)
+
+        self.save_playlist_as_action = QAction('Save Playlist As', self)
+        self.save_playlist_as_action.setShortcut('CTRL+SHIFT+S')
+        self.save_playlist_as_action.triggered.connect(self.save_playlist_as)
+
+        self.delete_playlist_action = QAction('Delete Playlist', self)
+        self.delete_playlist_action.triggered.connect(self.delete_playlist)
+
+        self.import_playlist_action = QAction('Import M3U', self)
+        self.import_playlist_action.triggered.connect(self.import_playlist)
+
+        self.export_playlist_action = QAction('Export M3U', self)
+        self.export_playlist_action.triggered.connect(self.export_playlist)
+
+        self.playlists_.addAction(self.new_playlist_action)
+        self.playlists_.addAction(self.save_named_playlist_action)
+        self.playlists_.addAction(self.save_playlist_as_action)
+        self.playlists_.addAction(self.delete_playlist_action)
+        self.playlists_.addSeparator()
+        self.playlists_.addAction(self.import_playlist_action)
+        self.playlists_.addAction(self.export_playlist_action)
 
     def view_menu(self):
         """Add a view menu to the menu bar.
@@ -280,146 +483,240 @@ class MusicPlayer(QMainWindow):
 
     def open_file(self):
         """Open the selected file and add it to a new playlist."""
-        filename, success = QFileDialog.getOpenFileName(self, 'Open File', '', 'Audio (*.mp3 *.flac)', '', QFileDialog.Option.ReadOnly)
+        filename, success = QFileDialog.getOpenFileName(self, 'Open File', '', formats.dialog_filter(), '', QFileDialog.Option.ReadOnly)
 
         if success:
-            file_info = QFileInfo(filename).baseName()
-            playlist_item = QListWidgetItem(file_info)
-            self.playlist = [QUrl.fromLocalFile(filename)]
-            playlist_item.setToolTip(file_info)
-            self.playlist_view.addItem(playlist_item)
-            self.playlist_view.setCurrentRow(0)
+            self.detach_playlist()
+            self.playlist.clear()
+            self.playlist.append([filename])
             self.play_index(0)
 
     def open_multiple_files(self):
         """Open the selected files and add them to a new playlist."""
-        filenames, success = QFileDialog.getOpenFileNames(self, 'Open Multiple Files', '', 'Audio (*.mp3 *.flac)', '', QFileDialog.Option.ReadOnly)
+        filenames, success = QFileDialog.getOpenFileNames(self, 'Open Multiple Files', '', formats.dialog_filter(), '', QFileDialog.Option.ReadOnly)
 
         if success:
-            for file in natsort.natsorted(filenames, alg=natsort.ns.PATH):
-                file_info = QFileInfo(file).baseName()
-                playlist_item = QListWidgetItem(file_info)
-                self.playlist.append(QUrl().fromLocalFile(file))
-                playlist_item.setToolTip(file_info)
-                self.playlist_view.addItem(playlist_item)
-            self.playlist_view.setCurrentRow(0)
-            self.play_index(0)
+            self.playlist.append(natsort.natsorted(filenames, alg=natsort.ns.PATH))
+            self.play_available(0, self.order.next)
 
     def open_playlist(self):
         """Load an M3U file into a new playlist."""
         playlist, success = QFileDialog.getOpenFileName(self, 'Open Playlist', '', 'Playlist (*.m3u)', '', QFileDialog.Option.ReadOnly)
 
         if success:
+            self.detach_playlist()
             self.playlist.clear()
-            self.playlist_view.clear()
             self.current_index = -1
-
-            with open(playlist, 'r', encoding='utf-8') as f:
-                for line in f:
-                    file = line.strip()
-                    if file and not file.startswith('#') and os.path.exists(file):
-                        self.playlist.append(QUrl.fromLocalFile(file))
-                        file_info = QFileInfo(file).fileName()
-                        playlist_item = QListWidgetItem(file_info)
-                        playlist_item.setToolTip(file_info)
-                        self.playlist_view.addItem(playlist_item)
-
-            if self.playlist:
-                self.playlist_view.setCurrentRow(0)
-                self.play_index(0)
-
-    def save_playlist(self):
-        """Save the media in the playlist dock as a new M3U playlist."""
-        playlist_path = os.path.join(self.playlist_location, 'saved_playlist.m3u')
-        with open(playlist_path, 'w', encoding='utf-8') as f:
-            for url in self.playlist:
-                f.write(url.toLocalFile() + '\n')
+            self.load_playlist(playlist, play=True)
 
     def load_saved_playlist(self):
-        """Load the saved playlist if user setting permits."""
+        """Load the saved playlist if user setting permits.
+
+        When the playlist is saved on close, it is restored by a SessionLoader
+        from its snapshot and journal, along with the track and position that
+        were playing, and every edit from then on is written to the journal.
+        Otherwise the stored playlist that was open is reopened from the
+        database, or saved_playlist.m3u is loaded if none was.
+        """
+        if self.settings.save_playlist_on_close:
+            self.journal = session.PlaylistJournal(self.playlist_location)
+            loader = session.SessionLoader(self.journal)
+            loader.restored.connect(self.restore_session)
+            self.start_loader(loader, play=False)
+            self.autosave_timer.start(session.AUTOSAVE_INTERVAL)
+            return
+
+        active = self.playlists.active()
+        if active is not None and self.playlists.playlist_id(active) is not None:
+            self.switch_playlist(active)
+            return
+
         saved_playlist = os.path.join(self.playlist_location, 'saved_playlist.m3u')
         if os.path.exists(saved_playlist):
-            with open(saved_playlist, 'r', encoding='utf-8') as f:
-                for line in f:
-                    file = line.strip()
-                    if file and not file.startswith('#') and os.path.exists(file):
-                        self.playlist.append(QUrl.fromLocalFile(file))
-                        file_info = QFileInfo(file).fileName()
-                        playlist_item = QListWidgetItem(file_info)
-                        playlist_item.setToolTip(file_info)
-                        self.playlist_view.addItem(playlist_item)
-
-            if self.playlist:
-                self.playlist_view.setCurrentRow(0)
+            self.load_playlist(saved_playlist, play=False)
+
+    def restore_session(self, index, position):
+        """Load the track that was playing when the last session ended, at the same position."""
+        if (self.sender() is not self.walker or not 0 <= index < len(self.playlist) or
+                self.player.playbackState() != QMediaPlayer.PlaybackState.StoppedState):
+            return
+
+        self.playlist_view.setCurrentIndex(self.playlist.index(index))
+        self.current_index = index
+        self.resume_position = position
+        self.player.setSource(self.playlist.url(index))
+
+    def autosave(self):
+        """Record the current track and position and have the journal flushed to disk."""
+        if self.journal is not None:
+            self.journal.set_current(self.current_index, self.player.position())
+            self.journal.sync()
+
+    def load_playlist(self, playlist_path, play):
+        """Read an M3U playlist into the playlist in the background.
+
+        Entries are added in chunks by a PlaylistLoader thread as the file is
+        read, and the first track is played, or only loaded when play is False,
+        as soon as the first chunk arrives. Files that turn out to be missing are
+        marked in the playlist rather than left out.
+        """
+        self.start_loader(playlist.PlaylistLoader(playlist_path), play)
+
+    def start_loader(self, loader, play):
+        """Start a PlaylistLoader that adds its entries to the playlist."""
+        self.stop_adding_tracks()
+
+        self.play_loaded = play
+        self.walker = loader
+        self.walker_complete = False
+        self.loader_offset = len(self.playlist)
+        self.walker.batch.connect(self.add_playlist_batch)
+        self.walker.loaded.connect(self.playlist_loaded)
+        self.walker.missing.connect(self.mark_missing)
+        self.walker.progress.connect(self.ingest_progress.show_progress)
+        self.walker.finished.connect(self.adding_tracks_finished)
+        self.ingest_progress.show_progress(0)
+        self.ingest_progress.setVisible(True)
+        self.walker.start()
+
+    def add_playlist_batch(self, entries):
+        """Append a chunk of M3U entries sent by the PlaylistLoader."""
+        if self.walker is None or self.sender() is not self.walker or self.walker.isInterruptionRequested():
+            return
+
+        # The restored tracks are already in the journal, and stored playlists in the database
+        self.restoring = isinstance(self.walker, session.SessionLoader)
+        self.loading = isinstance(self.walker, (session.SessionLoader, playlists.DatabaseLoader))
+        self.playlist.append_entries(entries)
+        self.restoring = self.loading = False
+        if self.current_index == -1:
+            if self.play_loaded:
+                self.play_available(0, self.order.next)
+            else:
+                self.playlist_view.setCurrentIndex(self.playlist.index(0))
                 self.current_index = 0
-                self.player.setSource(self.playlist[0])
+                self.player.setSource(self.playlist.url(0))
+
+    def playlist_loaded(self):
+        """Record that the PlaylistLoader added all of its entries, leaving only the check for missing files."""
+        if self.sender() is self.walker:
+            self.walker_complete = True
+
+    def mark_missing(self, tracks):
+        """Mark the missing files found by the PlaylistLoader, whose entries start at loader_offset."""
+        if self.walker is None or self.sender() is not self.walker:
+            return
+
+        self.playlist.mark_missing(tracks, self.loader_offset)
 
     def open_directory(self):
         """Open the selected directory and add the files within to an empty playlist."""
         directory = QFileDialog.getExistingDirectory(self, 'Open Directory', '', QFileDialog.Option.ReadOnly)
 
         if directory:
+            self.detach_playlist()
             self.playlist.clear()
-            self.playlist_view.clear()
-            for dirpath, __, files in os.walk(directory):
-                for filename in natsort.natsorted(files, alg=natsort.ns.PATH):
-                    file = os.path.join(dirpath, filename)
-                    if filename.lower().endswith(('.mp3', '.flac')):
-                        self.playlist.append(QUrl.fromLocalFile(os.path.join(dirpath, filename)))
-                        playlist_item = QListWidgetItem(filename)
-                        playlist_item.setToolTip(filename)
-                        self.playlist_view.addItem(playlist_item)
-
-            self.playlist_view.setCurrentRow(0)
-            self.play_index(0)
+            self.current_index = -1
+            self.add_tracks([directory])
 
     def open_media_library(self, index):
-        """Open a directory or file from the media library into an empty playlist."""
-        for index in self.library_view.selectedIndexes():
-            if self.library_view.media_model.fileName(index).lower().endswith(('.mp3', '.flac')):
-                file = self.library_view.media_model.filePath(index)
-                track_name = os.path.splitext(self.library_view.media_model.fileName(index))[0]
-                self.playlist.append(QUrl().fromLocalFile(file))
-                playlist_item = QListWidgetItem(track_name)
-                playlist_item.setToolTip(track_name)
-                self.playlist_view.addItem(playlist_item)
-
-            elif self.library_view.media_model.isDir(index):
-                directory = self.library_view.media_model.filePath(index)
-                for dirpath, __, files in os.walk(directory):
-                    for filename in natsort.natsorted(files, alg=natsort.ns.PATH):
-                        file = os.path.join(dirpath, filename)
-                        if filename.lower().endswith(('.mp3', '.flac')):
-                            self.playlist.append(QUrl().fromLocalFile(file))
-                            track_name = os.path.splitext(filename)[0]
-                            playlist_item = QListWidgetItem(track_name)
-                            playlist_item.setToolTip(track_name)
-                            self.playlist_view.addItem(playlist_item)
+        """Open the directories and files selected in the media library into the playlist."""
+        self.add_tracks([self.library_view.media_model.filePath(index)
+                         for index in self.library_view.selectedIndexes()])
+
+    def add_tracks(self, paths):
+        """Add the audio files at or below the given paths to the playlist in the background.
+
+        Directories are walked on a DirectoryWalker thread, which sends the files
+        in batches, and the first track is played as soon as the first batch
+        arrives if nothing is playing.
+        """
+        self.stop_adding_tracks()
+
+        self.walker = playlist.DirectoryWalker(paths)
+        self.walker.batch.connect(self.add_track_batch)
+        self.walker.progress.connect(self.ingest_progress.show_progress)
+        self.walker.finished.connect(self.adding_tracks_finished)
+        self.ingest_progress.show_progress(0)
+        self.ingest_progress.setVisible(True)
+        self.walker.start()
+
+    def add_track_batch(self, files):
+        """Append a batch of files sent by the DirectoryWalker, starting playback on the first."""
+        # Batches of a walker that was stopped may still be queued
+        if self.walker is None or self.sender() is not self.walker or self.walker.isInterruptionRequested():
+            return
+
+        self.playlist.append(files)
+        if self.current_index == -1:
+            self.play_index(0)
+
+    def adding_tracks_finished(self):
+        """Hide the progress of the DirectoryWalker or PlaylistLoader once it is done."""
+        if self.sender() is self.walker:
+            self.walker_complete = True
+            self.ingest_progress.setVisible(False)
+
+    def stop_adding_tracks(self):
+        """Stop the DirectoryWalker or PlaylistLoader, keeping the tracks it has added so far."""
+        if self.walker is not None:
+            self.walker.requestInterruption()
+            self.walker.wait()
+            if not self.walker_complete and isinstance(self.walker, session.SessionLoader):
+                # The journal holds every restored track, including those never added
+                self.journal.truncate(len(self.playlist))
+            if not self.walker_complete and isinstance(self.walker, playlists.DatabaseLoader):
+                # A stored playlist that was only partly paged in mustn't overwrite the whole one
+                self.set_playlist_name(None)
+            self.walker = None
+        self.ingest_progress.setVisible(False)
+
+    def open_library_files(self, files):
+        """Open the files chosen from the media library search into the playlist."""
+        self.playlist.append(files)
 
         if self.current_index == -1:
             self.play_index(0)
 
     def display_meta_data(self):
-        """Display the current song's metadata in the main window.
+        """Read the current song's metadata on a worker thread to display it in the main window.
 
-        If the current song contains metadata, its cover art is extracted and shown in
-        the main window while the track number, artist, album, and track title are shown
-        in the window title.
-        """        
+        The tags and cover art are read by the NowPlayingLoader, so that parsing the
+        file and decoding a large cover never block the event loop. Cover art is looked
+        up in the artwork cache by the hash of the image, or by the path of a cover image
+        in the track's directory, and a track with the same cover as the one shown isn't
+        decoded at all.
+        """
         file_path = self.player.source().toLocalFile()
-        (album, artist, title, track_number, *__, artwork) = metadata.metadata(file_path)
+        if not file_path:
+            return
 
-        try:
-            self.pixmap.loadFromData(artwork)
-        except TypeError:
-            self.pixmap = QPixmap(artwork)
+        self.prefetch_upcoming(file_path)
+        self.now_playing.request(file_path, self.settings.window_size, self.cover_key)
 
-        meta_data = '{} - {} - {} - {}' .format(track_number.zfill(2), artist, album, title)
+    def show_meta_data(self, now_playing):
+        """Show the metadata read by display_meta_data() unless another song started since.
 
-        self.setWindowTitle(meta_data)
-        self.art.setScaledContents(True)
-        self.art.setPixmap(self.pixmap)
-        self.player_layout.addWidget(self.art)
+        The cover art is shown in the main window while the track number, artist,
+        album, and track title are shown in the window title.
+        """
+        if now_playing.path != self.player.source().toLocalFile():
+            return
+
+        if now_playing.cover_key is None:
+            cover_key = 'nocover'
+        else:
+            cover_key = now_playing.cover_key
+
+        if cover_key != self.cover_key:
+            if now_playing.cover_key is not None:
+                self.pixmap = QPixmap.fromImage(now_playing.image)
+            else:
+                self.pixmap = icons.pixmap('nocover.png')
+            self.cover_key = cover_key
+            self.art.setPixmap(self.pixmap)
+
+        self.setWindowTitle(now_playing.title)
 
     def press_playback(self, event):
         """Change the playback of the player on cover art mouse event.
@@ -435,60 +732,22 @@ class MusicPlayer(QMainWindow):
             elif self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState:
                 self.player.pause()
 
-    def seek(self, seconds):
-        """Set the position of the song to the position dragged to by the user."""
-        self.player.setPosition(seconds * 1000)
+    def seek(self, position):
+        """Set the position of the song, in ms, to the position dragged to by the user."""
+        self.player.setPosition(position)
 
     def song_duration(self, duration):
-        """Set the slider to the duration of the currently played media."""
-        duration /= 1000
-        self.duration = duration
-        self.slider.setMaximum(duration)
+        """Set the slider to the duration of the currently played media on the next frame."""
+        self.position_updater.set_duration(duration)
 
     def song_position(self, progress):
         """Move the horizontal slider in sync with the duration of the song.
 
-        The progress is relayed to update_duration() in order
-        to display the time label next to the slider.
-        """
-        progress /= 1000
-
-        if not self.slider.isSliderDown():
-            self.slider.setValue(progress)
-
-        self.update_duration(progress)
-
-    def update_duration(self, current_duration):
-        """Calculate the time played and the length of the song.
-
-        Both of these times are sent to duration_label() in order to display the
-        times on the toolbar.
+        The progress is relayed to the PositionUpdater, which redraws the slider
+        and the time label next to it at most frame_rate times a second.
         """
-        duration = self.duration
-
-        if current_duration or duration:
-            time_played = QTime((current_duration // 3600) % 60,
-                                (current_duration // 60) % 60,
-                                (current_duration % 60),
-                                (current_duration * 1000) % 1000,
-                                )
-            song_length = QTime((duration // 3600) % 60,
-                                (duration // 60) % 60,
-                                (duration % 60),
-                                (duration * 1000) % 1000,
-                                )
-
-            if duration > 3600:
-                time_format = "hh:mm:ss"
-            else:
-                time_format = "mm:ss"
-
-            time_display = "{} / {}" .format(time_played.toString(time_format), song_length.toString(time_format))
-
-        else:
-            time_display = ""
-
-        self.duration_label.setText(time_display)
+        self.preload_next(progress)
+        self.position_updater.set_position(progress)
 
     def toggle_playback(self):
         """Play or pause depending on the current playback state."""
@@ -505,44 +764,234 @@ class MusicPlayer(QMainWindow):
         stopped.
         """
         if self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState:
-            pause_icon = utilities.resource_filename('mosaic.images', 'md_pause.png')
-            self.play_action.setIcon(QIcon(pause_icon))
+            self.play_action.setIcon(icons.icon('md_pause.png'))
+            if self.standby.end_transition() is not None:
+                self.duration_label.setToolTip(self.playback_report())
         else:
-            play_icon = utilities.resource_filename('mosaic.images', 'md_play.png')
-            self.play_action.setIcon(QIcon(play_icon))
+            self.play_action.setIcon(icons.icon('md_play.png'))
 
     def previous(self):
         """Move to the previous song in the playlist.
 
         Moves to the previous song in the playlist if the current song is less
-        than five seconds in. Otherwise, restarts the current song.
+        than five seconds in. Otherwise, restarts the current song. In shuffle
+        mode, the previous song is the one played before the current one.
         """
         if self.player.position() > 5000:
             self.player.setPosition(0)
-        elif self.current_index > 0:
-            self.play_index(self.current_index - 1)
+        else:
+            self.play_available(self.order.previous(), self.order.previous)
 
     def next(self):
-        if self.current_index < len(self.playlist) - 1:
-            self.play_index(self.current_index + 1)
+        """Move to the next song in the playlist, or in the shuffled order, skipping missing files."""
+        self.play_available(self.order.next(), self.order.next)
+
+    def set_shuffle(self, enabled):
+        """Turn shuffle on or off from either the toolbar or the playback menu."""
+        self.shuffle_action.setChecked(enabled)
+        self.shuffle_playback_action.setChecked(enabled)
+        if enabled != self.order.shuffle:
+            self.order.shuffle = enabled
+
+    def cycle_repeat(self):
+        """Switch to the next repeat mode: none, all, then one."""
+        modes = engine.REPEAT_MODES
+        self.order.repeat = modes[(modes.index(self.order.repeat) + 1) % len(modes)]
+        self.show_repeat_mode()
+
+    def show_repeat_mode(self):
+        """Show the repeat mode on the toolbar icon and in the playback menu."""
+        repeat_icons = {engine.REPEAT_NONE: 'md_repeat_none.png', engine.REPEAT_ALL: 'md_repeat_all.png',
+                        engine.REPEAT_ONE: 'md_repeat_once.png'}
+        self.repeat_action.setIcon(icons.icon(repeat_icons[self.order.repeat]))
+        text = 'Repeat: {}' .format(self.order.repeat.capitalize())
+        self.repeat_action.setText(text)
+        self.repeat_playback_action.setText(text)
+
+    def playlist_rows_inserted(self, parent, first, last):
+        """Let the playback order and the journal know about tracks added to the playlist."""
+        self.order.insert(first, last - first + 1)
+        self.playlist_dirty = self.playlist_dirty or not self.loading
+        if self.journal is not None and not self.restoring:
+            self.journal.insert(first, self.playlist.directories[first:last + 1],
+                                self.playlist.names[first:last + 1], self.playlist.extinf[first:last + 1])
+
+    def playlist_rows_removed(self, parent, first, last):
+        """Let the playback order and the journal know about tracks removed from the playlist."""
+        self.order.remove(range(first, last + 1))
+        self.playlist_dirty = True
+        if self.journal is not None:
+            self.journal.remove(first, last)
+
+    def playlist_reset(self):
+        """Start the playback order over when the playlist is cleared."""
+        self.order.reset(len(self.playlist))
+        self.playlist_dirty = self.playlist_dirty or not self.loading
+        if self.journal is not None:
+            self.journal.clear()
+
+    def refresh_playlist_selector(self):
+        """List the stored playlists in the playlist dock, keeping the open one selected."""
+        self.playlist_selector.clear()
+        self.playlist_selector.addItems(self.playlists.names())
+        self.playlist_selector.setCurrentIndex(
+            self.playlist_selector.findText(self.playlist_name or '', Qt.MatchFlag.MatchFixedString))
+
+    def set_playlist_name(self, name):
+        """Make name the stored playlist that the open playlist is saved to, or None."""
+        if name is not None and self.playlists.playlist_id(name) is None:
+            name = None
+        self.playlist_name = name
+        self.playlists.set_active(name)
+        self.playlist_selector.setCurrentIndex(
+            self.playlist_selector.findText(name or '', Qt.MatchFlag.MatchFixedString))
+
+    def save_named_playlist(self):
+        """Store the open playlist under its name if it changed since it was opened or saved.
+
+        Nothing is stored while a DatabaseLoader is still paging the playlist in,
+        since the model then holds only part of it.
+        """
+        if isinstance(self.walker, playlists.DatabaseLoader) and not self.walker_complete:
+            return
+        if self.playlist_name is not None and self.playlist_dirty:
+            self.playlists.save(self.playlist_name, self.playlist.paths(), self.playlist.extinf)
+        self.playlist_dirty = False
+
+    def detach_playlist(self):
+        """Save the open stored playlist before it is replaced by an unsaved one.
+
+        Adding tracks is stopped first, which detaches a stored playlist that
+        was only partly paged in rather than saving it over the whole one.
+        """
+        self.stop_adding_tracks()
+        self.save_named_playlist()
+        self.set_playlist_name(None)
+
+    def switch_playlist(self, name):
+        """Open a stored playlist in place of the open one, which is saved first.
+
+        The first page of tracks is read at once so the view fills right away,
+        and a DatabaseLoader pages in the rest in the background, then marks the
+        tracks whose files are missing.
+        """
+        if name == self.playlist_name:
+            return
+        playlist_id = self.playlists.playlist_id(name)
+        if playlist_id is None:
+            return
+
+        self.stop_adding_tracks()
+        self.save_named_playlist()
+        self.player.stop()
+
+        self.loading = True
+        self.playlist.clear()
+        first_page = self.playlists.tracks(playlist_id, limit=playlists.FIRST_PAGE)
+        self.playlist.append_entries(first_page)
+        self.loading = False
+        self.playlist_dirty = False
+        self.set_playlist_name(name)
+
+        if len(self.playlist):
+            self.playlist_view.setCurrentIndex(self.playlist.index(0))
+            self.current_index = 0
+            self.player.setSource(self.playlist.url(0))
+        if first_page:
+            # The loader pages in the rest, if there is more, and checks the first page for missing files
+            self.start_loader(playlists.DatabaseLoader(self.playlists, playlist_id, len(first_page),
+                                                       preceding=[entry.path for entry in first_page]),
+                              play=False)
+
+    def ask_playlist_name(self, title):
+        """Ask for the name of a playlist and return it, or None if the dialog was cancelled."""
+        name, success = QInputDialog.getText(self, title, 'Playlist name:')
+        name = name.strip()
+        return name if success and name else None
+
+    def new_playlist(self):
+        """Save the open playlist and start an empty stored playlist."""
+        name = self.ask_playlist_name('New Playlist')
+        if name is None:
+            return
+
+        self.detach_playlist()
+        self.player.stop()
+        self.playlist.clear()
+        self.playlists.save(name, [], [])
+        self.refresh_playlist_selector()
+        self.set_playlist_name(name)
+        self.playlist_dirty = False
+
+    def save_playlist_to_database(self):
+        """Store the open playlist under its name, asking for one if it has none."""
+        if self.playlist_name is None:
+            self.save_playlist_as()
+            return
+
+        self.playlist_dirty = True
+        self.save_named_playlist()
+
+    def save_playlist_as(self):
+        """Store the open playlist under a new name and keep saving it there."""
+        name = self.ask_playlist_name('Save Playlist As')
+        if name is None:
+            return
+        if self.playlists.playlist_id(name) is not None and name != self.playlist_name:
+            answer = QMessageBox.question(self, 'Save Playlist As',
+                                          'Replace the playlist {}?' .format(name))
+            if answer != QMessageBox.StandardButton.Yes:
+                return
+
+        self.playlists.save(name, self.playlist.paths(), self.playlist.extinf)
+        self.refresh_playlist_selector()
+        self.set_playlist_name(name)
+        self.playlist_dirty = False
+
+    def delete_playlist(self):
+        """Delete the open stored playlist, keeping its tracks as an unsaved playlist."""
+        if self.playlist_name is None:
+            return
+
+        answer = QMessageBox.question(self, 'Delete Playlist',
+                                      'Delete the playlist {}?' .format(self.playlist_name))
+        if answer == QMessageBox.StandardButton.Yes:
+            self.playlists.delete(self.playlist_name)
+            self.set_playlist_name(None)
+            self.refresh_playlist_selector()
+
+    def import_playlist(self):
+        """Store an M3U file as a playlist named after it and open it."""
+        m3u_path, success = QFileDialog.getOpenFileName(self, 'Import Playlist', '', 'Playlist (*.m3u)', '', QFileDialog.Option.ReadOnly)
 
-    def activate_playlist_item(self, item):
+        if success:
+            self.stop_adding_tracks()
+            self.save_named_playlist()
+            name = self.playlists.import_m3u(m3u_path)
+            self.refresh_playlist_selector()
+            # Reopen the playlist even if the import replaced the open one
+            self.playlist_name = None
+            self.switch_playlist(name)
+
+    def export_playlist(self):
+        """Write the open playlist to an M3U file."""
+        m3u_path, success = QFileDialog.getSaveFileName(self, 'Export Playlist', self.playlist_name or '', 'Playlist (*.m3u)')
+
+        if success:
+            playlist.write_m3u(m3u_path, self.playlist.paths(), self.playlist.extinf)
+
+    def activate_playlist_item(self, index):
         """Set the active media to the playlist item double-clicked on by the user."""
-        self.play_index(self.playlist_view.row(item))
+        self.play_index(index.row())
 
     def remove_from_playlist(self):
         """Remove selected tracks from the playlist."""
-        rows = sorted({self.playlist_view.row(item) for item in self.playlist_view.selectedItems()},
-                      reverse=True)
-        for row in rows:
-            self.playlist_view.takeItem(row)
-            del self.playlist[row]
+        rows = [index.row() for index in self.playlist_view.selectionModel().selectedRows()]
+        playing = self.current_index in rows
+        self.playlist.remove(rows)
 
-            if row == self.current_index:
-                self.player.stop()
-                self.current_index = -1
-            elif row < self.current_index:
-                self.current_index -= 1
+        if playing:
+            self.player.stop()
 
     def minimalist_view(self):
         """Resize the window to only show the menu bar and audio controls."""
@@ -594,6 +1043,11 @@ class MusicPlayer(QMainWindow):
         dialog = information.InformationDialog(file_path)
         dialog.exec_()
 
+    def find_duplicates(self):
+        """Open a dialog listing the duplicate tracks of the media library."""
+        dialog = duplicates.DuplicatesDialog(self.library_widget.library_catalog().paths(), self)
+        dialog.exec_()
+
     def change_window_size(self):
         """Change the window size of the music player."""
         # This fires as soon as the dropdown changes - before the preferences
@@ -608,6 +1062,7 @@ class MusicPlayer(QMainWindow):
         """Change the media library path to the new path selected in the preferences dialog."""
         self.library_view.media_model.setRootPath(path)
         self.library_view.setRootIndex(self.library_view.media_model.index(path))
+        self.library_widget.scan(path)
 
 
     def reload_settings(self):
@@ -618,11 +1073,27 @@ class MusicPlayer(QMainWindow):
         values the user just saved.
         """
         self.settings = defaults.Settings()
+        self.prefetcher.depth = self.settings.prefetch_depth
+        self.prefetcher.size = self.settings.window_size
+        self.position_updater.set_frame_rate(self.settings.frame_rate)
 
     def closeEvent(self, event):
-        """Override the PyQt close event in order to handle save playlist on close."""
-        if self.settings.save_playlist_on_close:
-            self.save_playlist()
+        """Override the PyQt close event in order to handle save playlist on close.
+
+        The playlist is already in the journal, so only the current track and
+        position are recorded before the journal is flushed.
+        """
+        self.library_widget.stop()
+        self.prefetcher.stop()
+        self.now_playing.stop()
+        self.stop_adding_tracks()
+        self.save_named_playlist()
+        self.playlists.close()
+
+        if self.journal is not None:
+            self.autosave_timer.stop()
+            self.journal.set_current(self.current_index, self.player.position())
+            self.journal.close()
 
         QApplication.quit()
 
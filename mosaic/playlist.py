@@ -0,0 +1,437 @@
+import os
+import sys
+import time
+
+import natsort
+from PySide6.QtCore import QAbstractListModel, QModelIndex, Qt, QThread, QUrl, Signal
+from PySide6.QtGui import QColor
+from PySide6.QtWidgets import QHBoxLayout, QProgressBar, QPushButton, QWidget
+
+from mosaic import formats
+
+
+def split_path(file):
+    """Return the interned directory and the file name of a path."""
+    directory, name = os.path.split(file)
+    return sys.intern(directory), name
+
+
+def parse_extinf(line):
+    """Return the (length, title) of an #EXTINF line, with a length of -1 when it isn't known.
+
+    The length may be followed by attributes such as tvg-id="..." before the
+    comma, and the title is everything after the first comma, or None.
+    """
+    info, __, title = line[len('#EXTINF:'):].partition(',')
+    try:
+        length = int(float(info.split()[0]))
+    except (IndexError, ValueError):
+        length = -1
+
+    return length, title.strip() or None
+
+
+class M3UEntry(object):
+    """A track read from an M3U playlist along with the length and title of its #EXTINF line."""
+
+    __slots__ = ('path', 'length', 'title')
+
+    def __init__(self, path, length=-1, title=None):
+        """Store the path of the track and its #EXTINF information."""
+        self.path = path
+        self.length = length
+        self.title = title
+
+    @property
+    def extinf(self):
+        """Return the (length, title) of the entry as kept by the PlaylistModel, or None."""
+        if self.title is None and self.length == -1:
+            return None
+        return self.length, self.title
+
+
+def read_m3u(playlist_path, chunk_size=1000):
+    """Yield the entries of an M3U playlist in lists of up to chunk_size M3UEntry objects.
+
+    The file is streamed a line at a time, and paths relative to the playlist
+    are resolved against its directory without touching the files they name.
+    """
+    directory = os.path.dirname(os.path.abspath(playlist_path))
+    entries = []
+    extinf = None
+
+    with open(playlist_path, 'r', encoding='utf-8', errors='replace') as fileobj:
+        for line in fileobj:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('#'):
+                if line.upper().startswith('#EXTINF:'):
+                    extinf = parse_extinf(line)
+                continue
+
+            entries.append(M3UEntry(os.path.join(directory, line), *(extinf or ())))
+            extinf = None
+            if len(entries) >= chunk_size:
+                yield entries
+                entries = []
+
+    if entries:
+        yield entries
+
+
+def write_m3u(playlist_path, paths, extinf, header=None):
+    """Write tracks to an M3U playlist, keeping their #EXTINF lines.
+
+    extinf holds the (length, title) or None of each path, and header is an
+    optional comment line written after #EXTM3U. The playlist is written to a
+    temporary file that replaces the old one once it is on disk, so a crash
+    leaves either the old playlist or the new one, never a truncated one.
+    """
+    temporary = playlist_path + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as fileobj:
+        fileobj.write('#EXTM3U\n')
+        if header is not None:
+            fileobj.write(header + '\n')
+        for path, info in zip(paths, extinf):
+            if info is not None:
+                fileobj.write('#EXTINF:{},{}\n' .format(info[0], info[1] or ''))
+            fileobj.write(path + '\n')
+        fileobj.flush()
+        os.fsync(fileobj.fileno())
+
+    os.replace(temporary, playlist_path)
+
+
+def row_ranges(rows):
+    """Group row numbers into (first, last) ranges of consecutive rows, last range first."""
+    ranges = []
+    for row in sorted(set(rows)):
+        if ranges and row == ranges[-1][1] + 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+
+    return [tuple(rows) for rows in reversed(ranges)]
+
+
+class PlaylistModel(QAbstractListModel):
+    """The tracks of the playlist as a list model.
+
+    Each track is stored as its directory and file name in two parallel lists.
+    Directories are interned, so the tracks of an album share one string, and
+    the display text and QUrl of a track are only created when asked for, which
+    keeps a playlist of 100k tracks to a few megabytes. Tracks are added and
+    removed in ranges, so the view is notified once per batch rather than once
+    per track.
+
+    Tracks read from an M3U playlist keep the (length, title) of their #EXTINF
+    line, which is shown instead of the file name. Whether each file exists is
+    kept in a bytearray; files are only checked when they are about to play or
+    by a PlaylistLoader, and missing files stay in the playlist greyed out.
+    """
+
+    PathRole = Qt.ItemDataRole.UserRole
+    UNCHECKED, PRESENT, MISSING = range(3)
+
+    def __init__(self, parent=None):
+        """Start with an empty playlist."""
+        super(PlaylistModel, self).__init__(parent)
+
+        self.directories = []
+        self.names = []
+        self.extinf = []
+        self.status = bytearray()
+
+    def __len__(self):
+        """Return the number of tracks in the playlist."""
+        return len(self.names)
+
+    def rowCount(self, parent=QModelIndex()):
+        """Return the number of tracks in the playlist."""
+        return 0 if parent.isValid() else len(self.names)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        """Return the file name of a track without its extension, or its path."""
+        if not index.isValid():
+            return None
+
+        row = index.row()
+        if role == Qt.ItemDataRole.DisplayRole:
+            extinf = self.extinf[row]
+            if extinf is not None and extinf[1]:
+                return extinf[1]
+            return os.path.splitext(self.names[row])[0]
+        if role == Qt.ItemDataRole.ToolTipRole:
+            if self.status[row] == self.MISSING:
+                return '{} (missing)' .format(self.path(row))
+            return self.path(row)
+        if role == self.PathRole:
+            return self.path(row)
+        if role == Qt.ItemDataRole.ForegroundRole and self.status[row] == self.MISSING:
+            return QColor(Qt.GlobalColor.gray)
+
+        return None
+
+    def path(self, row):
+        """Return the path of the track at row."""
+        return os.path.join(self.directories[row], self.names[row])
+
+    def url(self, row):
+        """Return the QUrl of the track at row for the media player."""
+        return QUrl.fromLocalFile(self.path(row))
+
+    def paths(self):
+        """Return an iterator over the paths of every track in order."""
+        return map(os.path.join, self.directories, self.names)
+
+    def append(self, files):
+        """Add the files to the end of the playlist and return how many were added."""
+        return self.insert(len(self.names), files)
+
+    def append_entries(self, entries):
+        """Add M3UEntry objects to the end of the playlist and return how many were added."""
+        return self.insert(len(self.names), [entry.path for entry in entries],
+                           [entry.extinf for entry in entries])
+
+    def insert(self, row, files, extinf=None):
+        """Insert the files before row with a single notification and return how many were added.
+
+        extinf, if given, holds the (length, title) or None of each file.
+        """
+        directories, names = [], []
+        for file in files:
+            directory, name = split_path(file)
+            directories.append(directory)
+            names.append(name)
+
+        if not names:
+            return 0
+
+        self.beginInsertRows(QModelIndex(), row, row + len(names) - 1)
+        self.directories[row:row] = directories
+        self.names[row:row] = names
+        self.extinf[row:row] = extinf if extinf is not None else [None] * len(names)
+        self.status[row:row] = bytes(len(names))
+        self.endInsertRows()
+
+        return len(names)
+
+    def remove(self, rows):
+        """Remove the tracks at the given rows, one range of consecutive rows at a time."""
+        for first, last in row_ranges(rows):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.directories[first:last + 1]
+            del self.names[first:last + 1]
+            del self.extinf[first:last + 1]
+            del self.status[first:last + 1]
+            self.endRemoveRows()
+
+    def clear(self):
+        """Remove every track from the playlist."""
+        self.beginResetModel()
+        self.directories = []
+        self.names = []
+        self.extinf = []
+        self.status = bytearray()
+        self.endResetModel()
+
+    def check(self, row):
+        """Return whether the file of the track at row exists, marking it missing if it doesn't."""
+        exists = os.path.exists(self.path(row))
+        status = self.PRESENT if exists else self.MISSING
+        if self.status[row] != status:
+            self.status[row] = status
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+        return exists
+
+    def mark_missing(self, tracks, offset=0):
+        """Mark the tracks of the given (position, file) pairs as missing.
+
+        Each file is expected at row offset + position, where a loader that
+        started appending at row offset put it. Only files that aren't there
+        any more, because rows were moved or removed in the meantime, are
+        looked for in the whole playlist.
+        """
+        rows = []
+        moved = set()
+        for position, file in tracks:
+            row = offset + position
+            track = split_path(file)
+            if 0 <= row < len(self.names) and (self.directories[row], self.names[row]) == track:
+                rows.append(row)
+            else:
+                moved.add(track)
+        if moved:
+            rows.extend(row for row, track in enumerate(zip(self.directories, self.names)) if track in moved)
+
+        for row in rows:
+            self.status[row] = self.MISSING
+        if rows:
+            self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)))
+
+
+def directory_listings(paths, cancelled=None):
+    """Yield the naturally sorted audio files of each directory below the given paths.
+
+    Files among paths are yielded on their own, and directories are walked with
+    os.scandir in the order the playlist shows them: the files of a directory
+    first, then its subdirectories in natural order. The walk stops early once
+    cancelled() returns True.
+    """
+    pending = list(reversed(paths))
+
+    while pending:
+        if cancelled is not None and cancelled():
+            return
+
+        path = pending.pop()
+        if not os.path.isdir(path):
+            if formats.is_audio_file(path):
+                yield [path]
+            continue
+
+        files, directories = [], []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            directories.append(entry.path)
+                        elif formats.is_audio_file(entry.name):
+                            files.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+        if files:
+            yield natsort.natsorted(files, alg=natsort.ns.PATH)
+        pending.extend(reversed(natsort.natsorted(directories, alg=natsort.ns.PATH)))
+
+
+class DirectoryWalker(QThread):
+    """Walks directories on a background thread and sends their audio files in batches.
+
+    The first directory with audio files is sent as soon as it is listed so that
+    playback can start right away. After that, files are sent once batch_size of
+    them are found or interval seconds have passed, whichever comes first.
+    """
+
+    batch = Signal(list)
+    progress = Signal(int)
+
+    def __init__(self, paths, batch_size=1000, interval=0.1, parent=None):
+        """Store the files and directories to walk."""
+        super(DirectoryWalker, self).__init__(parent)
+        self.paths = list(paths)
+        self.batch_size = batch_size
+        self.interval = interval
+
+    def run(self):
+        """Walk the paths and emit batch with each group of files found."""
+        pending = []
+        found = 0
+        sent = None
+
+        for files in directory_listings(self.paths, self.isInterruptionRequested):
+            pending.extend(files)
+            if (sent is None or len(pending) >= self.batch_size or
+                    time.monotonic() - sent >= self.interval):
+                found += len(pending)
+                self.batch.emit(pending)
+                self.progress.emit(found)
+                pending = []
+                sent = time.monotonic()
+
+        if pending and not self.isInterruptionRequested():
+            self.batch.emit(pending)
+            self.progress.emit(found + len(pending))
+
+
+class PlaylistLoader(QThread):
+    """Reads an M3U playlist on a background thread, then checks which of its files are missing.
+
+    Entries are sent in batches of chunk_size as they are read, without
+    touching the files they name, so a playlist on a slow network share
+    appears at once, and loaded is emitted once all of them were sent. The
+    files are then checked one by one and the missing ones are sent in batches
+    of batch_size, or every interval seconds, as (position, file) pairs,
+    position being the index of the entry among all the entries sent. The
+    files of preceding, entries already in the playlist right before the ones
+    the loader sends, are checked first, at negative positions.
+    """
+
+    batch = Signal(list)
+    progress = Signal(int)
+    loaded = Signal()
+    missing = Signal(list)
+
+    def __init__(self, playlist_path, chunk_size=1000, batch_size=100, interval=0.5, preceding=None,
+                 parent=None):
+        """Store the playlist to read."""
+        super(PlaylistLoader, self).__init__(parent)
+        self.playlist_path = playlist_path
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.interval = interval
+        self.preceding = preceding if preceding is not None else []
+
+    def chunks(self):
+        """Return an iterator over the lists of entries to send."""
+        return read_m3u(self.playlist_path, self.chunk_size)
+
+    def run(self):
+        """Emit batch with each chunk of entries, then missing with the entries whose files don't exist."""
+        files = []
+        try:
+            for entries in self.chunks():
+                if self.isInterruptionRequested():
+                    return
+                files.extend(entry.path for entry in entries)
+                self.batch.emit(entries)
+                self.progress.emit(len(files))
+        except OSError:
+            return
+        self.loaded.emit()
+
+        missing = []
+        sent = time.monotonic()
+        for position, file in enumerate(self.preceding + files, -len(self.preceding)):
+            if self.isInterruptionRequested():
+                return
+            if not os.path.exists(file):
+                missing.append((position, file))
+            if missing and (len(missing) >= self.batch_size or time.monotonic() - sent >= self.interval):
+                self.missing.emit(missing)
+                missing = []
+                sent = time.monotonic()
+
+        if missing:
+            self.missing.emit(missing)
+
+
+class IngestProgress(QWidget):
+    """Shows how many files were added by a DirectoryWalker, with a button to stop it."""
+
+    def __init__(self, parent=None):
+        """Initialize a busy progress bar and a cancel button, hidden while idle."""
+        super(IngestProgress, self).__init__(parent)
+
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 0)
+        self.progress.setTextVisible(True)
+        self.cancel_button = QPushButton('Cancel')
+
+        layout = QHBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.progress)
+        layout.addWidget(self.cancel_button)
+        self.setLayout(layout)
+        self.setVisible(False)
+
+    def show_progress(self, found):
+        """Show the number of files added so far."""
+        self.progress.setFormat('Adding tracks: {}' .format(found))
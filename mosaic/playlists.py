@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import threading
+import time
+
+from mosaic import playlist
+
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS playlists (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    track_count INTEGER NOT NULL DEFAULT 0,
+    modified REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS playlist_tracks (
+    playlist_id INTEGER NOT NULL REFERENCES playlists (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    length INTEGER,
+    title TEXT,
+    PRIMARY KEY (playlist_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# The number of tracks read on the GUI thread when a playlist is opened, which
+# covers the rows the view shows before the rest is paged in
+FIRST_PAGE = 256
+
+
+class PlaylistDatabase(object):
+    """Named playlists stored in a SQLite database in the user config directory.
+
+    The tracks of each playlist are clustered by (playlist, position), so a
+    page of a playlist is a single range scan and a playlist is read in order
+    without sorting. A single connection is shared between the GUI and the
+    loader thread behind a lock.
+    """
+
+    def __init__(self, database):
+        """Open (or create) the playlist database."""
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('PRAGMA foreign_keys=ON')
+
+        # Playlists are the user's own data, so unlike the catalog they are never dropped
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] == 0:
+            self.connection.execute('PRAGMA user_version = {}' .format(SCHEMA_VERSION))
+        self.connection.executescript(SCHEMA)
+
+    def query(self, sql, parameters=()):
+        """Run a read query and return all of its rows."""
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def playlists(self):
+        """Return the (id, name, track count) of every playlist, by name."""
+        return self.query('SELECT id, name, track_count FROM playlists ORDER BY name')
+
+    def names(self):
+        """Return the name of every playlist in alphabetical order."""
+        return [name for __, name, __ in self.playlists()]
+
+    def playlist_id(self, name):
+        """Return the id of the playlist with the given name, or None if there is none."""
+        rows = self.query('SELECT id FROM playlists WHERE name = ?', (name,))
+        return rows[0][0] if rows else None
+
+    def save(self, name, paths, extinf):
+        """Store the tracks of a playlist under name in one transaction, replacing any it had.
+
+        extinf holds the (length, title) or None of each path, as kept by the
+        PlaylistModel. Returns the id of the playlist.
+        """
+        rows = [(position, path) + (info if info is not None else (None, None))
+                for position, (path, info) in enumerate(zip(paths, extinf))]
+
+        with self.lock, self.connection:
+            self.connection.execute('INSERT INTO playlists (name, modified) VALUES (?, ?) '
+                                    'ON CONFLICT (name) DO NOTHING', (name, time.time()))
+            playlist_id = self.connection.execute('SELECT id FROM playlists WHERE name = ?',
+                                                  (name,)).fetchone()[0]
+            self.connection.execute('DELETE FROM playlist_tracks WHERE playlist_id = ?', (playlist_id,))
+            self.connection.executemany('INSERT INTO playlist_tracks VALUES ({}, ?, ?, ?, ?)' .format(
+                playlist_id), rows)
+            self.connection.execute('UPDATE playlists SET track_count = ?, modified = ? WHERE id = ?',
+                                    (len(rows), time.time(), playlist_id))
+
+        return playlist_id
+
+    def tracks(self, playlist_id, start=0, limit=-1):
+        """Return the tracks of a playlist from position start on as M3UEntry objects."""
+        rows = self.query('SELECT path, length, title FROM playlist_tracks '
+                          'WHERE playlist_id = ? AND position >= ? ORDER BY position LIMIT ?',
+                          (playlist_id, start, limit))
+
+        return [playlist.M3UEntry(path, -1 if length is None else length, title)
+                for path, length, title in rows]
+
+    def pages(self, playlist_id, start=0, page_size=1000):
+        """Yield the tracks of a playlist from position start on in lists of page_size."""
+        while True:
+            page = self.tracks(playlist_id, start, page_size)
+            if not page:
+                return
+            yield page
+            start += len(page)
+
+    def rename(self, name, new_name):
+        """Rename a playlist, raising sqlite3.IntegrityError if new_name is taken."""
+        with self.lock, self.connection:
+            self.connection.execute('UPDATE playlists SET name = ? WHERE name = ?', (new_name, name))
+
+    def delete(self, name):
+        """Delete a playlist along with its tracks."""
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM playlists WHERE name = ?', (name,))
+
+    def import_m3u(self, m3u_path, name=None):
+        """Store an M3U playlist under name, or under its file name, and return the name used."""
+        if name is None:
+            name = os.path.splitext(os.path.basename(m3u_path))[0]
+
+        paths, extinf = [], []
+        for entries in playlist.read_m3u(m3u_path):
+            for entry in entries:
+                paths.append(entry.path)
+                extinf.append(entry.extinf)
+        self.save(name, paths, extinf)
+
+        return name
+
+    def export_m3u(self, name, m3u_path):
+        """Write a stored playlist to an M3U file."""
+        entries = self.tracks(self.playlist_id(name))
+        playlist.write_m3u(m3u_path, [entry.path for entry in entries],
+                           [entry.extinf for entry in entries])
+
+    def active(self):
+        """Return the name of the playlist that was open when Mosaic last quit, or None."""
+        rows = self.query("SELECT value FROM state WHERE key = 'active'")
+        return rows[0][0] if rows else None
+
+    def set_active(self, name):
+        """Remember the name of the open playlist, or None for an unsaved one."""
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO state VALUES ('active', ?)", (name,))
+
+    def close(self):
+        """Close the connection to the playlist database."""
+        with self.lock:
+            self.connection.close()
+
+
+class DatabaseLoader(playlist.PlaylistLoader):
+    """Pages the tracks of a stored playlist into the playlist model on a background thread.
+
+    The first FIRST_PAGE tracks are read on the GUI thread by the caller so the
+    view fills at once; the loader reads the rest from start on, then checks
+    which files are missing like any other PlaylistLoader, starting with the
+    files of the first page passed as preceding.
+    """
+
+    def __init__(self, database, playlist_id, start=0, chunk_size=5000, preceding=None, parent=None):
+        """Store the playlist to page in."""
+        super(DatabaseLoader, self).__init__(None, chunk_size=chunk_size, preceding=preceding,
+                                             parent=parent)
+        self.database = database
+        self.playlist_id = playlist_id
+        self.start_position = start
+
+    def chunks(self):
+        """Yield the tracks of the playlist in pages of chunk_size."""
+        return self.database.pages(self.playlist_id, self.start_position, self.chunk_size)
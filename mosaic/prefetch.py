@@ -0,0 +1,155 @@
+import collections
+import os
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from mosaic import metadata
+from mosaic.artwork import artwork_cache
+
+
+# The number of upcoming tracks warmed while a track plays
+PREFETCH_DEPTH = 2
+
+# The number of warmed tracks remembered when counting prefetch hits
+WARMED_HISTORY = 64
+
+# The block size used to read a file into the page cache where posix_fadvise isn't available
+READ_BLOCK = 1 << 20
+
+
+def readahead(path):
+    """Ask the operating system to pull the contents of a file into the page cache.
+
+    posix_fadvise(WILLNEED) starts the reads without waiting for them. Where it
+    isn't available, the file is read through once, which is only acceptable
+    because this runs on a worker thread.
+    """
+    with open(path, 'rb') as fileobj:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fileobj.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            return
+
+        while fileobj.read(READ_BLOCK):
+            pass
+
+
+def warm_track(path, size):
+    """Parse the metadata of a track, decode its cover at size and pull its file into the page cache."""
+    track = metadata.read_track(path)
+    if track.artwork is not None:
+        artwork_cache().cover_image(track.artwork, size)
+    readahead(path)
+
+
+class PrefetchTask(QRunnable):
+    """Warms one upcoming track on the thread of the Prefetcher pool."""
+
+    def __init__(self, prefetcher, path, size):
+        """Store the track to warm."""
+        super(PrefetchTask, self).__init__()
+        self.setAutoDelete(False)
+        self.prefetcher = prefetcher
+        self.path = path
+        self.size = size
+
+    def run(self):
+        """Warm the track and tell the prefetcher, which lives on the GUI thread.
+
+        Any error counts as a failure, since the prefetcher only forgets the
+        track once it is told, and warming is never worth an exception.
+        """
+        try:
+            warm_track(self.path, self.size)
+        except Exception:
+            self.prefetcher.warmed.emit(self.path, False)
+        else:
+            self.prefetcher.warmed.emit(self.path, True)
+
+
+class Prefetcher(QObject):
+    """Warms the tracks that play after the current one on a background thread.
+
+    While a track plays, the next depth tracks have their metadata parsed into
+    the metadata cache, their covers decoded into the artwork cache and their
+    files pulled into the page cache, so the track change doesn't wait on a
+    sleeping disk or a network share. The tracks are warmed one at a time, in
+    the order they play, so the reads don't compete for the disk. A track that
+    was warmed before it started playing counts as a hit.
+    """
+
+    warmed = Signal(str, bool)
+
+    def __init__(self, size, depth=PREFETCH_DEPTH, parent=None):
+        """Initialize the single thread pool used to warm covers at size."""
+        super(Prefetcher, self).__init__(parent)
+
+        self.depth = depth
+        self.size = size
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.tasks = {}
+        self.ready = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.warmed.connect(self.finished)
+
+    def prefetch(self, paths):
+        """Warm the tracks in paths, in order, cancelling queued tracks that aren't among them."""
+        paths = paths[:self.depth]
+        for path, task in list(self.tasks.items()):
+            if path not in paths and self.pool.tryTake(task):
+                del self.tasks[path]
+
+        for position, path in enumerate(paths):
+            if path in self.tasks or path in self.ready:
+                continue
+            task = PrefetchTask(self, path, self.size)
+            self.tasks[path] = task
+            self.pool.start(task, len(paths) - position)
+
+    def finished(self, path, success):
+        """Remember a warmed track until it plays."""
+        self.tasks.pop(path, None)
+        if not success:
+            self.failures += 1
+            return
+
+        self.ready[path] = True
+        self.ready.move_to_end(path)
+        while len(self.ready) > WARMED_HISTORY:
+            self.ready.popitem(last=False)
+
+    def played(self, path):
+        """Count whether a track that started playing had been warmed, and return whether it had."""
+        hit = self.ready.pop(path, None) is not None
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        return hit
+
+    def hit_rate(self):
+        """Return the fraction of played tracks that had been warmed, or None before any played."""
+        played = self.hits + self.misses
+        return self.hits / played if played else None
+
+    def stats(self):
+        """Return the hit, miss and failure counts along with the number of queued tracks."""
+        return {'hits': self.hits, 'misses': self.misses, 'failures': self.failures,
+                'queued': len(self.tasks)}
+
+    def report(self):
+        """Return a line describing the prefetch hit rate, or an empty string."""
+        rate = self.hit_rate()
+        if rate is None:
+            return ''
+
+        return 'Prefetch hits: {} of {} tracks ({:.0%})' .format(self.hits, self.hits + self.misses, rate)
+
+    def stop(self):
+        """Cancel every queued track and wait for the running one."""
+        self.pool.clear()
+        self.pool.waitForDone()
+        self.tasks.clear()
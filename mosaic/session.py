@@ -0,0 +1,274 @@
+import json
+import os
+import queue
+import threading
+
+from PySide6.QtCore import Signal
+
+from mosaic import playlist
+
+
+# How often the journal is flushed to disk, along with the playback position
+AUTOSAVE_INTERVAL = 5000
+
+# The journal is folded into a new snapshot once it grows past this many bytes
+# or past the size of the snapshot, whichever is larger
+COMPACT_BYTES = 1 << 20
+
+SESSION_PREFIX = '#MOSAIC-SESSION:'
+
+
+def read_session(snapshot_path):
+    """Return the session header of a snapshot as a dictionary, or an empty one."""
+    with open(snapshot_path, 'r', encoding='utf-8', errors='replace') as fileobj:
+        for line in fileobj:
+            if line.startswith(SESSION_PREFIX):
+                try:
+                    return json.loads(line[len(SESSION_PREFIX):])
+                except ValueError:
+                    return {}
+            if not line.startswith('#') and line.strip():
+                break
+
+    return {}
+
+
+class PlaylistJournal(object):
+    """Saves the playlist as it is edited, so that it survives a crash and is quick to save on exit.
+
+    The playlist is kept in a snapshot, an M3U file replaced atomically, and an
+    append-only journal of the edits made since, one JSON record per line.
+    Edits are handed to a writer thread, which applies them to its own copy of
+    the playlist and appends them to the journal; the GUI thread never touches
+    the disk. The journal is flushed every AUTOSAVE_INTERVAL when it is dirty,
+    and once it grows large the writer folds it into a new snapshot. Snapshot
+    and journal carry a generation number, so a journal left over from before
+    the last snapshot is never replayed on top of it.
+    """
+
+    def __init__(self, directory, name='saved_playlist', compact_bytes=COMPACT_BYTES):
+        """Store the location of the snapshot and journal."""
+        self.snapshot_path = os.path.join(directory, name + '.m3u')
+        self.journal_path = os.path.join(directory, name + '.journal')
+        self.compact_bytes = compact_bytes
+        self.queue = queue.Queue()
+        self.thread = None
+        self.file = None
+        self.paths = []
+        self.extinf = []
+        self.current = -1
+        self.position = 0
+        self.generation = 0
+        self.journal_bytes = 0
+        self.replayed = False
+        self.torn = False
+        self.dirty = False
+
+    def restore(self):
+        """Read the snapshot, replay the journal on top of it and return the M3UEntry objects.
+
+        The current index and position saved with the playlist are left in
+        current and position. A record cut short by a crash ends the replay,
+        and the journal is then compacted by start() rather than appended to.
+        """
+        session = {}
+        self.paths, self.extinf = [], []
+        if os.path.exists(self.snapshot_path):
+            session = read_session(self.snapshot_path)
+            for entries in playlist.read_m3u(self.snapshot_path):
+                for entry in entries:
+                    self.paths.append(entry.path)
+                    self.extinf.append(entry.extinf)
+
+        self.generation = session.get('generation', 0)
+        self.current = session.get('current', -1)
+        self.position = session.get('position', 0)
+        self.replayed = False
+        self.torn = False
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as fileobj:
+                records = iter(fileobj)
+                try:
+                    header = json.loads(next(records))
+                except (StopIteration, ValueError):
+                    header = {}
+                if header.get('generation') == self.generation:
+                    self.replayed = True
+                    for line in records:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            record = None
+                        if record is None or not line.endswith('\n'):
+                            self.torn = True
+                            break
+                        self.apply(record)
+
+        return [playlist.M3UEntry(path, *(info or ())) for path, info in zip(self.paths, self.extinf)]
+
+    def start(self):
+        """Open the journal for appending and start the writer thread."""
+        if self.torn:
+            self.compact()
+        elif self.replayed:
+            self.file = open(self.journal_path, 'a', encoding='utf-8')
+            self.journal_bytes = self.file.tell()
+        else:
+            self.new_journal()
+
+        self.thread = threading.Thread(target=self.run, name='PlaylistJournal', daemon=True)
+        self.thread.start()
+
+    def insert(self, row, directories, names, extinf):
+        """Record tracks inserted before row, as slices of the PlaylistModel's lists."""
+        self.queue.put(('insert', row, directories, names, extinf))
+
+    def remove(self, first, last):
+        """Record the removal of the rows from first to last."""
+        self.queue.put(('remove', first, last))
+
+    def clear(self):
+        """Record that the playlist was cleared."""
+        self.queue.put(('clear',))
+
+    def truncate(self, count):
+        """Record that only the first count tracks of the playlist were kept."""
+        self.queue.put(('truncate', count))
+
+    def set_current(self, index, position):
+        """Record the current track and playback position, if they changed."""
+        self.queue.put(('current', index, position))
+
+    def sync(self):
+        """Have the writer flush the journal to disk, and compact it if it grew large."""
+        self.queue.put(('sync',))
+
+    def snapshot(self):
+        """Have the writer fold the journal into a new snapshot."""
+        self.queue.put(('snapshot',))
+
+    def close(self):
+        """Flush the journal and stop the writer thread."""
+        if self.thread is not None:
+            self.queue.put(('stop',))
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        """Apply and journal each edit from the queue until close() is called."""
+        while True:
+            record = self.queue.get()
+            kind = record[0]
+            if kind == 'stop':
+                self.flush()
+                self.file.close()
+                return
+            if kind == 'sync':
+                self.flush()
+                if self.journal_bytes > max(self.compact_bytes, self.snapshot_size()):
+                    self.compact()
+                continue
+            if kind == 'snapshot':
+                self.compact()
+                continue
+            if kind == 'current' and record[1:] == (self.current, self.position):
+                continue
+            if kind == 'insert':
+                row, directories, names, extinf = record[1:]
+                record = ('insert', row, list(map(os.path.join, directories, names)), extinf)
+
+            self.apply(record)
+            self.write(record)
+
+    def apply(self, record):
+        """Apply a journal record to the writer's copy of the playlist."""
+        kind = record[0]
+        if kind == 'insert':
+            row, paths, extinf = record[1:]
+            self.paths[row:row] = paths
+            self.extinf[row:row] = [tuple(info) if info is not None else None for info in extinf]
+        elif kind == 'remove':
+            first, last = record[1:]
+            del self.paths[first:last + 1]
+            del self.extinf[first:last + 1]
+        elif kind == 'clear':
+            self.paths, self.extinf = [], []
+        elif kind == 'truncate':
+            del self.paths[record[1]:]
+            del self.extinf[record[1]:]
+        elif kind == 'current':
+            self.current, self.position = record[1:]
+
+    def write(self, record):
+        """Append a record to the journal, which is now dirty until it is flushed."""
+        line = json.dumps(record) + '\n'
+        self.file.write(line)
+        self.journal_bytes += len(line)
+        self.dirty = True
+
+    def flush(self):
+        """Write the journal to disk if it is dirty."""
+        if self.dirty:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.dirty = False
+
+    def snapshot_size(self):
+        """Return the size of the snapshot in bytes, or 0 if there is none."""
+        try:
+            return os.path.getsize(self.snapshot_path)
+        except OSError:
+            return 0
+
+    def compact(self):
+        """Write the playlist to a new snapshot and start an empty journal for it."""
+        header = SESSION_PREFIX + json.dumps({'generation': self.generation + 1,
+                                              'current': self.current, 'position': self.position})
+        playlist.write_m3u(self.snapshot_path, self.paths, self.extinf, header)
+        self.generation += 1
+        if self.file is not None:
+            self.file.close()
+        self.new_journal()
+
+    def new_journal(self):
+        """Atomically replace the journal with one that only holds the current generation."""
+        temporary = self.journal_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as fileobj:
+            fileobj.write(json.dumps({'generation': self.generation}) + '\n')
+            fileobj.flush()
+            os.fsync(fileobj.fileno())
+        os.replace(temporary, self.journal_path)
+
+        self.file = open(self.journal_path, 'a', encoding='utf-8')
+        self.journal_bytes = self.file.tell()
+        self.dirty = False
+
+
+class SessionLoader(playlist.PlaylistLoader):
+    """Restores the playlist saved by a PlaylistJournal on a background thread.
+
+    Once the entries are sent, restored is emitted with the current index and
+    playback position of the last session, then the files are checked like
+    those of any other playlist.
+    """
+
+    restored = Signal(int, int)
+
+    def __init__(self, journal, chunk_size=1000, parent=None):
+        """Store the journal to restore."""
+        super(SessionLoader, self).__init__(journal.snapshot_path, chunk_size=chunk_size, parent=parent)
+        self.journal = journal
+
+    def chunks(self):
+        """Restore the journal, start its writer and yield the entries in chunks."""
+        try:
+            entries = self.journal.restore()
+        except OSError:
+            entries = []
+        current, position = self.journal.current, self.journal.position
+        self.journal.start()
+
+        for start in range(0, len(entries), self.chunk_size):
+            yield entries[start:start + self.chunk_size]
+        self.restored.emit(current, position)
@@ -0,0 +1,142 @@
+from PySide6.QtCore import QObject, QTimer, Signal
+
+
+# How many times a second the slider and the time label are redrawn at most
+FRAME_RATE = 20
+
+# The shortest time between two seeks sent to the player while the slider is dragged, in ms
+SEEK_INTERVAL = 100
+
+
+def format_time(seconds, hours=False):
+    """Return a number of seconds as mm:ss, or as hh:mm:ss when hours is True."""
+    minutes, seconds = divmod(int(seconds), 60)
+    if hours:
+        return '{:02d}:{:02d}:{:02d}' .format(minutes // 60, minutes % 60, seconds)
+
+    return '{:02d}:{:02d}' .format(minutes, seconds)
+
+
+class PositionUpdater(QObject):
+    """Coalesces the position and duration of the player into at most frame_rate redraws a second.
+
+    The player reports its position far more often than the slider or the time
+    label can visibly change, so the latest values are only applied when the
+    frame timer fires, and the widgets are only touched when the second shown
+    changes. The duration is formatted once per track rather than on every
+    position update.
+    """
+
+    def __init__(self, slider, label, frame_rate=FRAME_RATE, parent=None):
+        """Store the widgets to update, which start out empty."""
+        super(PositionUpdater, self).__init__(parent)
+
+        self.slider = slider
+        self.label = label
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.apply)
+        self.set_frame_rate(frame_rate)
+        self.position = 0
+        self.duration = 0
+        self.hours = False
+        self.duration_text = format_time(0)
+        self.text = ''
+        self.received = 0
+        self.applied = 0
+
+    def set_frame_rate(self, frame_rate):
+        """Redraw the widgets at most frame_rate times a second."""
+        self.timer.setInterval(max(1, round(1000 / max(1, frame_rate))))
+
+    def set_duration(self, duration):
+        """Record the duration of the track in ms, to be shown on the next frame."""
+        self.received += 1
+        self.duration = duration // 1000
+        self.hours = self.duration > 3600
+        self.duration_text = format_time(self.duration, self.hours)
+        self.schedule()
+
+    def set_position(self, position):
+        """Record the position of the player in ms, to be shown on the next frame."""
+        self.received += 1
+        self.position = position // 1000
+        self.schedule()
+
+    def schedule(self):
+        """Start the frame timer unless a frame is already due."""
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def apply(self):
+        """Update the slider and the time label with the latest values, where they changed."""
+        changed = False
+        if self.slider.maximum() != self.duration:
+            self.slider.setMaximum(self.duration)
+            changed = True
+        if not self.slider.isSliderDown() and self.slider.value() != self.position:
+            self.slider.setValue(self.position)
+            changed = True
+
+        if self.position or self.duration:
+            text = '{} / {}' .format(format_time(self.position, self.hours), self.duration_text)
+        else:
+            text = ''
+        if text != self.text:
+            self.text = text
+            self.label.setText(text)
+            changed = True
+
+        if changed:
+            self.applied += 1
+
+    def report(self):
+        """Return a line comparing the updates applied to the widgets with those received."""
+        if not self.received:
+            return ''
+
+        return 'Position updates: {} applied of {} received' .format(self.applied, self.received)
+
+
+class SeekThrottle(QObject):
+    """Limits the seeks sent to the player while the slider is dragged.
+
+    The first position of a drag is sent at once, and after that at most one
+    position every interval ms, always the latest. Releasing the slider sends
+    the position it was released at straight away.
+    """
+
+    seek = Signal(int)
+
+    def __init__(self, interval=SEEK_INTERVAL, parent=None):
+        """Start with no seek pending."""
+        super(SeekThrottle, self).__init__(parent)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.tick)
+        self.pending = None
+        self.requested = 0
+        self.sent = 0
+
+    def request(self, seconds):
+        """Seek to the position in seconds, now or once the interval since the last seek is over."""
+        self.requested += 1
+        self.pending = seconds
+        if not self.timer.isActive():
+            self.flush()
+            self.timer.start()
+
+    def tick(self):
+        """Send the latest position at the end of an interval, and wait another if one was sent."""
+        if self.pending is not None:
+            self.flush()
+            self.timer.start()
+
+    def flush(self):
+        """Send the pending position, if there is one, as a position in ms."""
+        if self.pending is not None:
+            self.sent += 1
+            self.seek.emit(self.pending * 1000)
+            self.pending = None
@@ -1,6 +1,7 @@
 import atexit
 import contextlib
 import importlib.resources as resources
+import threading
 
 
 # A single ExitStack holds every resource extracted during the process lifetime.
@@ -9,6 +10,10 @@ import importlib.resources as resources
 _file_manager = contextlib.ExitStack()
 atexit.register(_file_manager.close)
 
+# The path of every resource resolved so far, so each one enters the ExitStack once
+_resource_paths = {}
+_resource_lock = threading.Lock()
+
 
 def resource_filename(package, resource):
     """Return a filesystem path for a resource bundled inside a package.
@@ -16,7 +21,25 @@ def resource_filename(package, resource):
     Uses importlib.resources.files(...).joinpath(...) + as_file(), which is the
     modern replacement for the deprecated importlib.resources.path().  When the
     package is installed from a zip/wheel, as_file() materializes a temporary
-    copy on disk and cleans it up at interpreter exit.
+    copy on disk and cleans it up at interpreter exit. The path is resolved
+    once per resource and remembered, so the ExitStack doesn't grow with every
+    call.
     """
-    ref = resources.files(package).joinpath(resource)
-    return str(_file_manager.enter_context(resources.as_file(ref)))
+    with _resource_lock:
+        path = _resource_paths.get((package, resource))
+        if path is None:
+            ref = resources.files(package).joinpath(resource)
+            path = str(_file_manager.enter_context(resources.as_file(ref)))
+            _resource_paths[(package, resource)] = path
+
+    return path
+
+
+def format_size(size):
+    """Return a number of bytes in the largest unit that keeps it above one, e.g. '3.2 MB'."""
+    for unit in ('bytes', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024 or unit == 'GB':
+            break
+        size /= 1024
+
+    return '{} {}' .format(size, unit) if unit == 'bytes' else '{:.1f} {}' .format(size, unit)
@@ -0,0 +1,49 @@
+import threading
+
+from PySide6.QtCore import QRunnable
+import pytest
+
+from mosaic import artwork, cache
+
+
+@pytest.fixture(autouse=True)
+def user_directories(tmp_path, monkeypatch):
+    """Point the config, cache and data directories of every test at a temporary directory.
+
+    The shared metadata and artwork caches are reset as well, so no test reads
+    or writes the user's own caches or sees the entries of another test. The
+    directories are set through the environment so that worker processes use
+    them too.
+    """
+    for variable in ('XDG_CONFIG_HOME', 'XDG_CACHE_HOME', 'XDG_DATA_HOME'):
+        monkeypatch.setenv(variable, str(tmp_path / variable.lower()))
+    monkeypatch.setattr(cache, '_metadata_cache', None)
+    monkeypatch.setattr(artwork, '_artwork_cache', None)
+    monkeypatch.setattr(artwork, '_folder_artwork', None)
+
+    yield
+
+    if cache._metadata_cache is not None:
+        cache._metadata_cache.close()
+
+
+@pytest.fixture
+def busy_pool():
+    """Return a function that occupies a single-threaded QThreadPool until the event it returns is set.
+
+    Work started on the pool meanwhile stays queued, so tests can cancel or
+    supersede it. Every pool is released when the test ends, even if it fails.
+    """
+    events = []
+
+    def occupy(pool):
+        """Keep the thread of pool busy and return the event that releases it."""
+        release = threading.Event()
+        events.append(release)
+        pool.start(QRunnable.create(release.wait))
+        return release
+
+    yield occupy
+
+    for release in events:
+        release.set()
@@ -0,0 +1,79 @@
+from PySide6.QtCore import QBuffer, QByteArray
+from PySide6.QtGui import QColor, QImage
+import pytest
+
+from mosaic import artwork
+
+
+@pytest.fixture
+def cover(qapp):
+    """Pass the PNG encoded bytes of a 600 x 600 image as an argument to the unit tests."""
+    image = QImage(600, 600, QImage.Format.Format_RGB32)
+    image.fill(QColor('red'))
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QBuffer.OpenModeFlag.WriteOnly)
+    image.save(buffer, 'PNG')
+    return bytes(data)
+
+
+def test_artwork_memory_tier(tmp_path, cover):
+    """Check that the same cover is only decoded once and is scaled to the window size."""
+    artwork_cache = artwork.ArtworkCache(str(tmp_path))
+    image = artwork_cache.image(cover, 450)
+    assert image.width() == 450
+    assert artwork_cache.image(bytes(cover), 450) is image
+    assert artwork_cache.decodes == 1
+    assert artwork_cache.hits == 1
+
+
+def test_artwork_disk_tier(tmp_path, cover):
+    """Check that thumbnails written by one cache are used by another."""
+    artwork.ArtworkCache(str(tmp_path)).prescale(cover)
+    artwork_cache = artwork.ArtworkCache(str(tmp_path))
+    assert artwork_cache.image(cover, 375).width() == 375
+    assert artwork_cache.decodes == 0
+    assert artwork_cache.disk_hits == 1
+
+
+def test_artwork_memory_budget(tmp_path, cover):
+    """Check that the memory tier evicts the least recently used images over budget."""
+    artwork_cache = artwork.ArtworkCache(str(tmp_path), memory_budget=600 * 600 * 4)
+    artwork_cache.image(cover, 450)
+    artwork_cache.image(cover, 375)
+    artwork_cache.image(cover, 1500)
+    assert artwork_cache.memory_used <= artwork_cache.memory_budget
+    assert list(artwork_cache.images) == [(artwork.artwork_key(cover), 1500)]
+
+
+def test_folder_artwork(tmp_path, cover):
+    """Check that a sidecar image is found and that each directory is only listed once."""
+    (tmp_path / 'Folder.PNG').write_bytes(cover)
+    (tmp_path / 'back.jpg').write_bytes(b'')
+    folder_artwork = artwork.FolderArtwork()
+
+    first = folder_artwork.find(str(tmp_path / '01.flac'))
+    second = folder_artwork.find(str(tmp_path / '02.flac'))
+    assert first.path.endswith('Folder.PNG')
+    assert first.data() == cover
+    assert second is first
+    assert folder_artwork.listings == 1
+
+    empty_directory = tmp_path / 'empty'
+    empty_directory.mkdir()
+    assert folder_artwork.find(str(empty_directory / '01.flac')) is None
+    assert folder_artwork.find(str(empty_directory / '02.flac')) is None
+    assert folder_artwork.listings == 2
+
+
+def test_sidecar_identity(tmp_path, cover):
+    """Check that a sidecar image is decoded once without being read again."""
+    (tmp_path / 'cover.png').write_bytes(cover)
+    sidecar = artwork.FolderArtwork().find(str(tmp_path / '01.flac'))
+    artwork_cache = artwork.ArtworkCache(str(tmp_path / 'thumbnails'))
+    image = artwork_cache.cover_image(sidecar, 450)
+
+    sidecar.cached = None
+    assert artwork_cache.cover_image(sidecar, 450) is image
+    assert sidecar.cached is None
+    assert artwork_cache.decodes == 1
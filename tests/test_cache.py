@@ -0,0 +1,62 @@
+import os
+import shutil
+
+import mutagen
+import pytest
+
+from mosaic import cache, metadata
+
+
+@pytest.fixture
+def flac_file(tmp_path):
+    """Pass a copy of a FLAC file resource as an argument to the unit tests."""
+    file = os.path.join(os.path.dirname(__file__), '02_Ghosts_I.flac')
+    return shutil.copy(file, tmp_path)
+
+
+@pytest.fixture
+def metadata_cache(tmp_path):
+    """Provide an empty metadata cache stored in a temporary directory."""
+    store = cache.MetadataCache(str(tmp_path / 'metadata.sqlite'), max_entries=2)
+    yield store
+    store.close()
+
+
+def test_cache_hit_and_miss(metadata_cache, flac_file):
+    """Check that a stored track is returned until the file changes."""
+    assert metadata_cache.get(flac_file) is None
+    metadata_cache.put(metadata.parse_track(flac_file))
+
+    record = metadata_cache.get(flac_file)
+    assert record['tags']['album'] == ['Ghosts I-IV']
+    assert record['sample_rate'] == 44100
+    assert record['artwork'].offset is not None
+    assert metadata_cache.stats() == {'hits': 1, 'misses': 1, 'entries': 1}
+
+    stat = os.stat(flac_file)
+    os.utime(flac_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert metadata_cache.get(flac_file) is None
+
+
+def test_negative_cache(metadata_cache, tmp_path):
+    """Check that a file that failed to parse raises the cached error."""
+    broken_file = tmp_path / 'broken.flac'
+    broken_file.write_bytes(b'not a flac file')
+    metadata_cache.put_failure(str(broken_file), mutagen.MutagenError('no header'))
+
+    with pytest.raises(mutagen.MutagenError):
+        metadata_cache.get(str(broken_file))
+
+
+def test_cache_invalidation_and_eviction(metadata_cache, flac_file, tmp_path):
+    """Check that entries can be invalidated and that the cache stays bounded."""
+    metadata_cache.put(metadata.parse_track(flac_file))
+    metadata_cache.invalidate(str(tmp_path))
+    assert len(metadata_cache) == 0
+
+    for name in ('a.flac', 'b.flac', 'c.flac'):
+        file = shutil.copy(flac_file, tmp_path / name)
+        metadata_cache.put(metadata.parse_track(str(file)))
+    metadata_cache.evict()
+    assert len(metadata_cache) == 2
+    assert metadata_cache.get(str(tmp_path / 'a.flac')) is None
@@ -0,0 +1,164 @@
+import os
+import shutil
+import threading
+
+import pytest
+
+from mosaic import catalog, headers, metadata
+
+
+@pytest.fixture
+def library(tmp_path):
+    """Create a media library directory with an album of tagged files and a blank file."""
+    tests_directory = os.path.dirname(__file__)
+    album = tmp_path / 'library' / 'Nine Inch Nails' / 'Ghosts I-IV'
+    album.mkdir(parents=True)
+    shutil.copy(os.path.join(tests_directory, '01_Ghosts_I_320kb.mp3'), album)
+    shutil.copy(os.path.join(tests_directory, '02_Ghosts_I.flac'), album)
+    shutil.copy(os.path.join(tests_directory, '03_Ghosts_I.flac'), tmp_path / 'library')
+    (album / 'notes.txt').write_text('not audio')
+    return str(tmp_path / 'library')
+
+
+@pytest.fixture
+def library_catalog(tmp_path):
+    """Provide an empty catalog stored in a temporary directory."""
+    library_catalog = catalog.Catalog(str(tmp_path / 'library.sqlite'))
+    yield library_catalog
+    library_catalog.close()
+
+
+def test_catalog_scan(library, library_catalog):
+    """Check that a scan fills the catalog with the tracks, albums and artists of the library."""
+    progress = []
+    report = library_catalog.scan(library, progress=lambda *args: progress.append(args), workers=1)
+    assert report.added == 3
+    assert progress[-1] == (3, 3)
+    assert library_catalog.track_count() == 3
+
+    artists = {name: artist_id for artist_id, name in library_catalog.artists()}
+    assert set(artists) == {'Nine Inch Nails', ''}
+
+    albums = library_catalog.albums_by_artist(artists['Nine Inch Nails'])
+    assert [album[1] for album in albums] == ['Ghosts I-IV']
+    assert albums[0][3] is not None
+
+    tracks = library_catalog.tracks_by_album(albums[0][0])
+    assert [track[3] for track in tracks] == [1, 2]
+    assert len(library_catalog.recently_added(2)) == 2
+
+
+def test_catalog_rescan_is_incremental(library, library_catalog):
+    """Check that a rescan only touches the files that were added, changed or deleted."""
+    library_catalog.scan(library, workers=1)
+    report = library_catalog.scan(library, workers=1)
+    assert report.touched == 0
+    assert report.unchanged == 3
+    assert library_catalog.track_count() == 3
+
+    album = os.path.join(library, 'Nine Inch Nails', 'Ghosts I-IV')
+    os.remove(os.path.join(album, '01_Ghosts_I_320kb.mp3'))
+    flac_file = os.path.join(album, '02_Ghosts_I.flac')
+    stat = os.stat(flac_file)
+    os.utime(flac_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    shutil.copy(flac_file, os.path.join(album, '04_Ghosts_I.flac'))
+
+    report = library_catalog.scan(album, workers=1)
+    assert (report.added, report.updated, report.removed, report.unchanged) == (1, 1, 1, 0)
+    assert library_catalog.track_count() == 3
+    assert album in report.directories
+
+
+def test_leading_number():
+    """Check that track numbers such as 3/12 are parsed."""
+    assert catalog.leading_number('3/12') == 3
+    assert catalog.leading_number('') is None
+
+
+def test_catalog_search(library, library_catalog):
+    """Check that searches match word prefixes of the tags and file names."""
+    library_catalog.scan(library, workers=1)
+
+    assert len(library_catalog.search('nine ghost')) == 2
+    assert len(library_catalog.search('Nin')) == 2
+    assert [row[1] for row in library_catalog.search('03_ghosts')] == [os.path.join(library, '03_Ghosts_I.flac')]
+    assert library_catalog.search('"') == []
+    assert library_catalog.search('   ') == []
+    assert library_catalog.search('nothing matches') == []
+
+    os.remove(os.path.join(library, '03_Ghosts_I.flac'))
+    library_catalog.scan(library, workers=1)
+    assert library_catalog.search('03_ghosts') == []
+
+
+def test_catalog_reads_during_a_write(library, library_catalog):
+    """Check that reads don't wait for a write transaction that holds the lock."""
+    library_catalog.scan(library, workers=1)
+
+    with library_catalog.lock, library_catalog.connection:
+        library_catalog.connection.execute('DELETE FROM tracks')
+        result = []
+        reader = threading.Thread(target=lambda: result.append(library_catalog.track_count()))
+        reader.start()
+        reader.join(5)
+        assert result == [3]
+
+    assert library_catalog.track_count() == 0
+
+
+def test_catalog_scan_keeps_unreadable_directories(library, library_catalog, monkeypatch):
+    """Check that the tracks below a directory that can't be listed aren't removed."""
+    library_catalog.scan(library, workers=1)
+    artist = os.path.join(library, 'Nine Inch Nails')
+    unreadable = []
+    scandir = os.scandir
+
+    def failing_scandir(path):
+        """List directories as usual, except the unreadable ones."""
+        if path in unreadable:
+            raise PermissionError(path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', failing_scandir)
+    for directory in (artist, library):
+        unreadable[:] = [directory]
+        report = library_catalog.scan(library, workers=1)
+        assert report.unreadable == [directory]
+        assert report.removed == 0
+        assert library_catalog.track_count() == 3
+
+
+def test_catalog_unreadable_artwork(library, library_catalog):
+    """Check that a track whose artwork reference can't be read is added without a cover."""
+    file = os.path.join(library, 'Nine Inch Nails', 'Ghosts I-IV', '02_Ghosts_I.flac')
+    track = metadata.read_track(file, use_cache=False)
+    track.artwork = headers.Artwork(file, None, 10)
+    library_catalog.add_tracks([track])
+
+    assert library_catalog.track_count() == 1
+    assert library_catalog.albums()[0][3] is None
+
+
+def test_catalog_scan_skips_unchanged_directories(library, library_catalog):
+    """Check that directories whose modification time didn't change aren't listed again."""
+    artist = os.path.join(library, 'Nine Inch Nails')
+    album = os.path.join(artist, 'Ghosts I-IV')
+    for directory in (library, artist, album):
+        os.utime(directory, ns=(10 ** 18, 10 ** 18))
+    library_catalog.scan(library, workers=1)
+
+    report = library_catalog.scan(library, workers=1)
+    assert report.skipped == 2
+    assert report.unchanged == 3
+    assert sorted(report.directories) == sorted([library, artist, album])
+
+    shutil.copy(os.path.join(album, '02_Ghosts_I.flac'), os.path.join(album, '04_Ghosts_I.flac'))
+    report = library_catalog.scan(library, workers=1)
+    assert (report.added, report.skipped, report.unchanged) == (1, 1, 3)
+
+    shutil.rmtree(album)
+    os.utime(artist, ns=(10 ** 18 + 1, 10 ** 18 + 1))
+    report = library_catalog.scan(library, workers=1)
+    assert report.removed == 3
+    assert library_catalog.track_count() == 1
+    assert sorted(library_catalog.query('SELECT directory FROM directories')) == sorted([(library,), (artist,)])
@@ -0,0 +1,54 @@
+import os
+import shutil
+
+import pytest
+
+from mosaic import duplicates
+
+
+@pytest.fixture
+def signature_cache(tmp_path):
+    """Open a signature cache in a temporary directory."""
+    signature_cache = duplicates.SignatureCache(str(tmp_path / 'signatures.sqlite'))
+    yield signature_cache
+    signature_cache.close()
+
+
+def copy_fixture(name, destination):
+    """Copy a test file to destination and return its path."""
+    tests_directory = os.path.dirname(os.path.abspath(__file__))
+    shutil.copy(os.path.join(tests_directory, name), destination)
+    return str(destination)
+
+
+def test_mp3_signature_ignores_tags(tmp_path):
+    """Check that MP3 files that only differ in their tags have the same signature."""
+    original = copy_fixture('01_Ghosts_I_320kb.mp3', tmp_path / 'original.mp3')
+    retagged = copy_fixture('01_Ghosts_I_320kb.mp3', tmp_path / 'retagged.mp3')
+    with open(retagged, 'ab') as file:
+        file.write(b'TAG' + b'retagged'.ljust(125, b'\x00'))
+
+    assert duplicates.audio_signature(original) == duplicates.audio_signature(retagged)
+    assert duplicates.audio_signature(original).startswith('mp3:')
+
+
+def test_find_duplicates(tmp_path, signature_cache):
+    """Check that copies are grouped and that their signatures are cached."""
+    first = copy_fixture('02_Ghosts_I.flac', tmp_path / 'first.flac')
+    second = copy_fixture('02_Ghosts_I.flac', tmp_path / 'second.flac')
+    tagged = copy_fixture('01_Ghosts_I_320kb.mp3', tmp_path / 'tagged.mp3')
+    blank = copy_fixture('04_Ghosts_I_320kb.mp3', tmp_path / 'blank.mp3')
+    longer = copy_fixture('04_Ghosts_I_320kb.mp3', tmp_path / 'longer.mp3')
+    with open(longer, 'ab') as file:
+        file.write(b'\xff' * 1000)
+    files = [first, second, tagged, blank, longer]
+
+    groups = duplicates.find_duplicates(files, workers=1, signature_cache=signature_cache)
+    assert sorted([path for path, __ in group.files] for group in groups) == [
+        [blank, tagged], [first, second]]
+    for group in groups:
+        sizes = [size for __, size in group.files]
+        assert group.reclaimable == min(sizes)
+
+    assert signature_cache.get(tagged, (os.stat(tagged).st_size, os.stat(tagged).st_mtime_ns))
+    assert len(duplicates.find_duplicates(files, workers=1, signature_cache=signature_cache)) == 2
@@ -0,0 +1,128 @@
+import random
+
+from mosaic import engine
+
+
+def test_shifted_index():
+    """Check how the current track moves when rows are removed."""
+    assert engine.shifted_index(5, [1, 2, 7]) == 3
+    assert engine.shifted_index(2, [1, 2, 7]) == -1
+    assert engine.shifted_index(0, [1, 2]) == 0
+    assert engine.shifted_index(-1, [0]) == -1
+
+
+def test_lazy_permutation():
+    """Check that every value is drawn exactly once and that taken values aren't drawn again."""
+    permutation = engine.LazyPermutation(1000, random.Random(1))
+    permutation.take(500)
+    drawn = [permutation.draw() for __ in range(999)]
+
+    assert sorted(drawn + [500]) == list(range(1000))
+    assert permutation.draw() == -1
+    assert len(permutation.values) <= 2 * 1000
+
+
+def test_linear_order_and_repeat():
+    """Check next and previous in playlist order with each repeat mode."""
+    order = engine.PlaybackOrder(3)
+    assert [order.next() for __ in range(4)] == [0, 1, 2, -1]
+    assert order.current == 2
+    assert [order.previous() for __ in range(3)] == [1, 0, -1]
+
+    order.repeat = engine.REPEAT_ALL
+    assert order.previous() == 2
+    assert order.next() == 0
+
+    order.repeat = engine.REPEAT_ONE
+    assert order.next(automatic=True) == 0
+    assert order.next() == 1
+
+
+def test_shuffle_plays_every_track_once():
+    """Check that a shuffled cycle covers the playlist and previous retraces it."""
+    order = engine.PlaybackOrder(50, random.Random(2))
+    order.jump(10)
+    order.shuffle = True
+
+    played = [10] + [order.next() for __ in range(49)]
+    assert sorted(played) == list(range(50))
+    assert order.next() == -1
+
+    assert [order.previous() for __ in range(3)] == played[-2:-5:-1]
+    assert [order.next() for __ in range(3)] == played[-3:]
+
+    order.repeat = engine.REPEAT_ALL
+    assert sorted(order.next() for __ in range(50)) == list(range(50))
+
+
+def test_shuffle_follows_inserts_and_removes():
+    """Check that the history and the undrawn tracks are remapped when the playlist changes."""
+    order = engine.PlaybackOrder(20, random.Random(3))
+    order.jump(0)
+    order.shuffle = True
+    played = [0] + [order.next() for __ in range(4)]
+
+    order.insert(0, 5)
+    played = [index + 5 for index in played]
+    assert order.count == 25
+    assert order.current == played[-1]
+
+    removed = [played[1], played[3]]
+    order.remove(removed)
+    played = [engine.shifted_index(index, sorted(removed)) for index in played
+              if index not in removed]
+    assert order.history == played
+    assert order.current == played[-1]
+
+    rest = [order.next() for __ in range(order.count - len(played))]
+    assert sorted(played + rest) == list(range(23))
+    assert order.next() == -1
+
+
+def test_removing_the_current_track():
+    """Check that playback goes on from the track before a removed current track."""
+    order = engine.PlaybackOrder(5)
+    order.jump(2)
+    order.remove([2])
+    assert order.current == -1
+    assert order.count == 4
+
+    order.reset(3)
+    assert order.count == 3
+    assert order.next() == 0
+
+
+def test_upcoming_matches_next():
+    """Check that the upcoming track is the one next() moves to, in both orders."""
+    order = engine.PlaybackOrder(30, random.Random(4))
+    order.jump(3)
+    assert order.upcoming() == 4
+    assert order.current == 3
+
+    order.shuffle = True
+    for __ in range(29):
+        upcoming = order.upcoming()
+        assert order.upcoming() == upcoming
+        assert order.next(automatic=True) == upcoming
+    assert order.upcoming() == -1
+
+    order.repeat = engine.REPEAT_ONE
+    assert order.upcoming() == order.current
+
+
+def test_lookahead_matches_next():
+    """Check that the tracks looked ahead at are the ones next() moves to in turn."""
+    order = engine.PlaybackOrder(5)
+    order.jump(3)
+    assert order.lookahead(3) == [4]
+    order.repeat = engine.REPEAT_ALL
+    assert order.lookahead(3) == [4, 0, 1]
+    assert order.lookahead(10) == [4, 0, 1, 2]
+    assert order.current == 3
+
+    order = engine.PlaybackOrder(30, random.Random(5))
+    order.shuffle = True
+    ahead = order.lookahead(4)
+    assert len(set(ahead)) == 4
+    assert order.lookahead(2) == ahead[:2]
+    assert [order.next() for __ in range(4)] == ahead
@@ -0,0 +1,41 @@
+from mosaic import formats
+
+
+def test_sniff_magic_bytes(tmp_path):
+    """Check that formats are identified by their first bytes rather than their extension."""
+    samples = {
+        'flac': b'fLaC\x00\x00\x00\x22',
+        'mp3': b'\xff\xfb\x90\x64' + b'\x00' * 60,
+        'vorbis': b'OggS' + b'\x00' * 22 + b'\x01\x1e' + b'\x01vorbis',
+        'opus': b'OggS' + b'\x00' * 22 + b'\x01\x13' + b'OpusHead',
+        'm4a': b'\x00\x00\x00\x20ftypM4A ',
+        'wav': b'RIFF\x24\x00\x00\x00WAVEfmt ',
+    }
+    for name, header in samples.items():
+        file = tmp_path / 'track.bin'
+        file.write_bytes(header)
+        assert formats.sniff(str(file)).name == name
+
+
+def test_sniff_after_id3_tag(tmp_path):
+    """Check that the bytes following an ID3v2 tag decide the format."""
+    file = tmp_path / 'track.mp3'
+    file.write_bytes(b'ID3\x04\x00\x00\x00\x00\x00\x04' + b'\x00' * 4 + b'fLaC')
+    assert formats.sniff(str(file)).name == 'flac'
+
+
+def test_sniff_falls_back_to_extension(tmp_path):
+    """Check that an unrecognized file is identified by its extension."""
+    file = tmp_path / 'track.opus'
+    file.write_bytes(b'\x00' * 16)
+    assert formats.sniff(str(file)).name == 'opus'
+    assert formats.sniff(str(tmp_path / 'missing.txt')) is None
+
+
+def test_registry_filters():
+    """Check that the name filters and dialog filter are built from the registry."""
+    assert '*.mp3' in formats.name_filters()
+    assert '*.flac' in formats.name_filters()
+    assert formats.dialog_filter().startswith('Audio (*.mp3 *.flac')
+    assert formats.is_audio_file('Track.FLAC')
+    assert not formats.is_audio_file('cover.jpg')
@@ -0,0 +1,74 @@
+import os
+import shutil
+
+import pytest
+from PySide6.QtCore import Qt
+
+from mosaic import catalog, grid
+
+
+@pytest.fixture
+def library_catalog(tmp_path):
+    """Scan a library of two albums, one of which has cover art, into a temporary catalog."""
+    tests_directory = os.path.dirname(os.path.abspath(__file__))
+    album = tmp_path / 'library' / 'Nine Inch Nails' / 'Ghosts I-IV'
+    album.mkdir(parents=True)
+    shutil.copy(os.path.join(tests_directory, '02_Ghosts_I.flac'), album)
+    shutil.copy(os.path.join(tests_directory, '03_Ghosts_I.flac'), tmp_path / 'library')
+
+    library_catalog = catalog.Catalog(str(tmp_path / 'library.sqlite'))
+    library_catalog.scan(str(tmp_path / 'library'), workers=1)
+    yield library_catalog
+    library_catalog.close()
+
+
+def test_album_grid_model(qtbot, library_catalog):
+    """Check that covers are decoded on request and kept within the memory budget."""
+    model = grid.AlbumGridModel(library_catalog, memory_budget=1)
+    model.fetchMore(model.index(0).parent())
+    assert model.rowCount() == 2
+
+    rows = {model.data(model.index(row)): row for row in range(model.rowCount())}
+    with_cover = model.index(rows['Ghosts I-IV'])
+    assert model.data(with_cover, model.ArtistRole) == 'Nine Inch Nails'
+    assert model.data(model.index(rows['Unknown Album']), Qt.ItemDataRole.DecorationRole) is None
+
+    with qtbot.waitSignal(model.dataChanged, timeout=5000):
+        assert model.data(with_cover, Qt.ItemDataRole.DecorationRole) is None
+    assert not model.data(with_cover, Qt.ItemDataRole.DecorationRole).isNull()
+    assert len(model.pixmaps) == 1
+    assert model.loader.tasks == {}
+    model.loader.stop()
+
+
+def test_album_grid_model_failed_cover(qtbot, library_catalog):
+    """Check that a cover that can't be decoded isn't requested again, until the catalog is reloaded."""
+    model = grid.AlbumGridModel(library_catalog)
+    model.fetchMore(model.index(0).parent())
+    album_id, title, artist, __, __ = model.albums[0]
+    model.albums[0] = (album_id, title, artist, 'unreadable', '/missing.flac')
+
+    assert model.data(model.index(0), Qt.ItemDataRole.DecorationRole) is None
+    qtbot.waitUntil(lambda: model.failed == {'unreadable'}, timeout=5000)
+    assert model.data(model.index(0), Qt.ItemDataRole.DecorationRole) is None
+    assert model.loader.tasks == {}
+
+    model.set_catalog(library_catalog)
+    assert model.failed == set()
+    assert len(model.pixmaps) == 0
+    model.loader.stop()
+
+
+def test_thumbnail_loader_retain(qtbot, busy_pool):
+    """Check that queued requests outside the retained albums are cancelled."""
+    loader = grid.ThumbnailLoader(threads=1)
+    release = busy_pool(loader.pool)
+    for album_id in range(5):
+        loader.request(album_id, 'missing{}' .format(album_id), '/missing.flac')
+    loader.retain({3, 4})
+    assert set(loader.tasks) == {3, 4}
+    assert loader.cancelled == 3
+
+    release.set()
+    qtbot.waitUntil(lambda: loader.tasks == {}, timeout=5000)
+    loader.stop()
@@ -0,0 +1,20 @@
+from mosaic import icons, utilities
+
+
+def test_resources_are_resolved_once(qtbot):
+    """Check that each image is resolved once and its icon and pixmap are reused."""
+    registry = icons.ResourceRegistry(bundle=False)
+    assert registry.icon('md_play.png') is registry.icon('md_play.png')
+    assert registry.pixmap('nocover.png') is registry.pixmap('nocover.png')
+    assert not registry.pixmap('nocover.png').isNull()
+
+    callbacks = len(utilities._file_manager._exit_callbacks)
+    for __ in range(10):
+        assert utilities.resource_filename('mosaic.images', 'md_play.png') == registry.path('md_play.png')
+    assert len(utilities._file_manager._exit_callbacks) == callbacks
+
+
+def test_bundle_paths(qtbot):
+    """Check that images are read from the compiled resource bundle when there is one."""
+    registry = icons.ResourceRegistry(bundle=True)
+    assert registry.path('md_pause.png') == ':/images/md_pause.png'
@@ -0,0 +1,63 @@
+import os
+import shutil
+
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QImage
+
+from mosaic import catalog, defaults, grid, index, nowplaying
+from mosaic.artwork import artwork_cache
+
+
+def test_index(tmp_path, capsys):
+    """Check that the indexer fills the catalog and only parses changed files when incremental."""
+    tests_directory = os.path.dirname(os.path.abspath(__file__))
+    library = tmp_path / 'library'
+    library.mkdir()
+    shutil.copy(os.path.join(tests_directory, '02_Ghosts_I.flac'), library)
+    shutil.copy(os.path.join(tests_directory, '01_Ghosts_I_320kb.mp3'), library)
+    database = str(tmp_path / 'library.sqlite')
+
+    assert index.main([str(library), '--database', database, '--jobs', '1', '--no-artwork']) == 0
+    output = capsys.readouterr().out
+    assert '2 added, 0 updated, 0 removed, 0 unchanged, 0 errors' in output
+    assert 'files/s' in output
+
+    assert index.main([str(library), '--database', database, '--jobs', '1', '--no-artwork',
+                       '--incremental']) == 0
+    assert '0 added, 0 updated, 0 removed, 2 unchanged' in capsys.readouterr().out
+
+    library_catalog = catalog.Catalog(database)
+    assert library_catalog.track_count() == 2
+    library_catalog.close()
+
+
+def test_index_missing_directory(tmp_path, capsys):
+    """Check that the indexer refuses a directory that doesn't exist."""
+    assert index.main([str(tmp_path / 'missing'), '--database', str(tmp_path / 'library.sqlite')]) == 1
+    assert 'is not a directory' in capsys.readouterr().err
+
+
+def test_index_prescales_folder_covers(qtbot, tmp_path, capsys):
+    """Check that the player and the album grid find the thumbnails of a folder cover written by the indexer."""
+    tests_directory = os.path.dirname(os.path.abspath(__file__))
+    library = tmp_path / 'library'
+    library.mkdir()
+    file = shutil.copy(os.path.join(tests_directory, '03_Ghosts_I.flac'), library)
+    image = QImage(400, 400, QImage.Format.Format_RGB32)
+    image.fill(Qt.GlobalColor.red)
+    image.save(str(library / 'cover.png'))
+    database = str(tmp_path / 'library.sqlite')
+
+    assert index.main([str(library), '--database', database, '--jobs', '1']) == 0
+    assert '1 album covers prescaled' in capsys.readouterr().out
+    library_catalog = catalog.Catalog(database)
+    (art_hash, cover_path), = library_catalog.album_covers()
+    library_catalog.close()
+
+    cache = artwork_cache()
+    cache.clear()
+    decodes, disk_hits = cache.decodes, cache.disk_hits
+    assert not nowplaying.read_now_playing(file, defaults.WINDOW_SIZES[0]).image.isNull()
+    assert not grid.load_album_cover(art_hash, cover_path, defaults.THUMBNAIL_SIZE).isNull()
+    assert cache.disk_hits == disk_hits + 2
+    assert cache.decodes == decodes
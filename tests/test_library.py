@@ -0,0 +1,126 @@
+import os
+
+from PySide6.QtCore import QModelIndex
+import pytest
+
+from mosaic import catalog, defaults, library
+
+
+def test_topmost():
+    """Check that directories below another changed directory are dropped."""
+    directories = ['/music/a/b', '/music/a', '/music/ab', '/music/c/d']
+    assert library.topmost(directories) == ['/music/a', '/music/ab', '/music/c/d']
+
+
+def test_library_watcher_limit(qtbot, tmp_path):
+    """Check that the shallowest directories are watched and the fallback starts past the limit."""
+    nested = tmp_path / 'artist' / 'album'
+    nested.mkdir(parents=True)
+    directories = [str(nested), str(tmp_path), str(tmp_path / 'artist')]
+
+    watcher = library.LibraryWatcher(limit=2)
+    watcher.reset(str(tmp_path))
+    watcher.watch(directories)
+
+    assert sorted(watcher.watcher.directories()) == sorted(directories[1:])
+    assert not watcher.complete
+    assert watcher.fallback.isActive()
+
+
+def test_library_watcher_changes(qtbot, tmp_path):
+    """Check that a change inside a watched directory is reported once the changes settle."""
+    album = tmp_path / 'album'
+    album.mkdir()
+
+    watcher = library.LibraryWatcher(delay=10, limit=10)
+    watcher.reset(str(tmp_path))
+    watcher.watch([str(tmp_path), str(album)])
+    assert watcher.complete
+
+    with qtbot.waitSignal(watcher.changed, timeout=5000) as blocker:
+        (album / 'track.flac').write_bytes(b'')
+    assert blocker.args == [str(album)]
+    os.remove(str(album / 'track.flac'))
+
+
+@pytest.fixture
+def library_catalog(tmp_path):
+    """Provide a catalog holding an album of five tracks."""
+    library_catalog = catalog.Catalog(str(tmp_path / 'library.sqlite'))
+    with library_catalog.lock, library_catalog.connection:
+        artist_id = library_catalog.artist_id('Nine Inch Nails')
+        album_id = library_catalog.album_id(artist_id, 'Ghosts I-IV', '2008')
+        for number in range(1, 6):
+            library_catalog.connection.execute(
+                'INSERT INTO tracks (path, directory, title, artist_id, album_id, track_number, '
+                'size, mtime_ns, added) VALUES (?, ?, ?, ?, ?, ?, 0, 0, 0)',
+                ('/music/{}.flac' .format(number), '/music', 'Ghosts {}' .format(number),
+                 artist_id, album_id, number))
+    yield library_catalog
+    library_catalog.close()
+
+
+def test_catalog_model(qtbot, library_catalog):
+    """Check that the catalog model fetches artists, albums and tracks a page at a time."""
+    model = library.CatalogModel(library_catalog, page_size=2)
+    assert model.rowCount() == 0
+    assert model.canFetchMore(QModelIndex())
+    model.fetchMore(QModelIndex())
+    assert model.rowCount() == 1
+    assert not model.canFetchMore(QModelIndex())
+
+    artist = model.index(0, 0)
+    assert model.data(artist) == 'Nine Inch Nails'
+    model.fetchMore(artist)
+    album = model.index(0, 0, artist)
+    assert model.data(album) == 'Ghosts I-IV (2008)'
+    assert model.parent(album) == artist
+
+    model.fetchMore(album)
+    assert model.rowCount(album) == 2
+    assert model.canFetchMore(album)
+    while model.canFetchMore(album):
+        model.fetchMore(album)
+    assert model.rowCount(album) == 5
+    assert model.data(model.index(4, 0, album)) == '05. Ghosts 5'
+    assert model.files(model.index(4, 0, album)) == ['/music/5.flac']
+    assert len(model.files(artist)) == 5
+    library_catalog.close()
+
+
+def test_catalog_view_reload(qtbot, library_catalog):
+    """Check that reloading the catalog after a scan keeps the expanded artists and albums expanded."""
+    view = library.CatalogView()
+    qtbot.addWidget(view)
+    view.catalog_model.page_size = 2
+    view.catalog_model.set_catalog(library_catalog)
+    model = view.catalog_model
+    model.fetchMore(QModelIndex())
+    artist = model.index(0, 0)
+    model.fetchMore(artist)
+    view.expand(artist)
+    album = model.index(0, 0, artist)
+    while model.canFetchMore(album):
+        model.fetchMore(album)
+    view.expand(album)
+
+    view.reload(library_catalog)
+    artist = model.index(0, 0)
+    album = model.index(0, 0, artist)
+    assert view.isExpanded(artist)
+    assert view.isExpanded(album)
+    assert model.rowCount(album) == 5
+
+
+def test_rescan_stays_in_library(qtbot, tmp_path, monkeypatch):
+    """Check that only directories within the library are rescanned."""
+    defaults.Settings()
+    widget = library.MediaLibraryWidget()
+    qtbot.addWidget(widget)
+    scanned = []
+    monkeypatch.setattr(widget, 'start_scan', scanned.append)
+    widget.root = str(tmp_path / 'music')
+
+    for directory in ('music', 'music2', os.path.join('music', 'album')):
+        widget.rescan(str(tmp_path / directory))
+    assert scanned == [str(tmp_path / 'music'), str(tmp_path / 'music' / 'album')]
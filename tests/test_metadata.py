@@ -1,9 +1,10 @@
 import os
+import shutil
 
 from mutagen import easyid3, flac, mp3
 import pytest
 
-from mosaic import metadata
+from mosaic import formats, metadata
 
 
 @pytest.fixture
@@ -98,3 +99,85 @@ def test_blank_metadata(blank_flac_file, blank_mp3_file):
     mp3_data = metadata.metadata(blank_mp3_file)
     assert flac_data[0] == '??'
     assert mp3_data[0] == '??'
+
+
+def test_read_track_parses_once(mocker, flac_file, mp3_file):
+    """Check that read_track reads MP3 and FLAC files without a full mutagen parse."""
+    flac_load = mocker.spy(flac.FLAC, 'load')
+    mp3_load = mocker.spy(mp3.MP3, 'load')
+    assert metadata.read_track(flac_file, use_cache=False).tag('album') == 'Ghosts I-IV'
+    assert metadata.read_track(mp3_file, use_cache=False).tag('album') == 'Ghosts I-IV'
+    assert flac_load.call_count == 0
+    assert mp3_load.call_count == 0
+
+
+def test_header_only_read(flac_file, mp3_file):
+    """Check that a header-only read finds the same tags and artwork as a full parse."""
+    for file, audio_file in ((flac_file, flac.FLAC(flac_file)),
+                             (mp3_file, mp3.MP3(mp3_file, ID3=easyid3.EasyID3))):
+        track = metadata.parse_track(file)
+        assert track.tags == dict(audio_file.tags)
+        assert track.artwork.cached is None
+        audio_format = formats.sniff(file)
+        assert track.artwork.data() == audio_format.artwork(audio_file, track.tags).data()
+
+
+def test_track_info(flac_file, blank_mp3_file):
+    """Check that a TrackInfo record holds the tags, stream info, and artwork of a file."""
+    track = metadata.read_track(flac_file)
+    assert not hasattr(track, '__dict__')
+    assert track.tag('album') == 'Ghosts I-IV'
+    assert track.sample_rate == 44100
+    assert track.bits_per_sample is not None
+    assert track.summary() == metadata.metadata(flac_file)
+    assert track.fields() == track.summary()[:-1]
+
+    blank_track = metadata.read_track(blank_mp3_file)
+    assert blank_track.tags == {}
+    assert blank_track.artwork is None
+    assert blank_track.tag('album') == '??'
+
+
+def test_sidecar_artwork(tmp_path, blank_flac_file):
+    """Check that a file without embedded art uses the cover image in its directory."""
+    file = shutil.copy(blank_flac_file, tmp_path)
+    (tmp_path / 'cover.jpg').write_bytes(b'\xff\xd8\xff')
+    assert metadata.read_track(file).artwork.data() == b'\xff\xd8\xff'
+    assert metadata.read_track(file, artwork=False).artwork is None
+
+
+def test_tags_only_track(flac_file):
+    """Check that a track read without artwork holds no reference to the embedded image."""
+    metadata.read_track(flac_file)
+    assert metadata.read_track(flac_file, artwork=False).artwork is None
+    assert metadata.read_track(flac_file, artwork=False, use_cache=False).artwork is None
+
+
+def test_extract_many(tmp_path, flac_file, mp3_file):
+    """Check that a batch read returns every file and reports errors without raising."""
+    broken_file = tmp_path / 'broken.flac'
+    broken_file.write_bytes(b'not a flac file')
+    files = [flac_file, mp3_file, str(broken_file)]
+
+    for workers in (1, 2):
+        results = {result.path: result for result in
+                   metadata.extract_many(iter(files), workers=workers, chunksize=1, use_cache=False)}
+        assert sorted(results) == sorted(files)
+        assert results[flac_file].track.tag('album') == 'Ghosts I-IV'
+        assert results[mp3_file].error is None
+        assert results[str(broken_file)].track is None
+        assert results[str(broken_file)].error
+
+
+def test_extract_many_full_parse_artwork(tmp_path, mp3_file):
+    """Check that the cached record of a file that needs a full parse yields readable artwork."""
+    file = shutil.copy(mp3_file, tmp_path)
+    with open(file, 'r+b') as fileobj:
+        fileobj.seek(5)
+        flags = fileobj.read(1)[0]
+        fileobj.seek(5)
+        fileobj.write(bytes([flags | 0x80]))  # Unsynchronisation forces a full parse
+
+    for __ in range(2):
+        result, = metadata.extract_many([file], workers=1)
+        assert result.track.artwork.data()
@@ -0,0 +1,40 @@
+import os
+
+from mosaic import nowplaying
+
+
+TESTS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_read_now_playing():
+    """Check that the title and cover are read, and that a cover already shown isn't decoded."""
+    path = os.path.join(TESTS_DIRECTORY, '02_Ghosts_I.flac')
+    now_playing = nowplaying.read_now_playing(path, 375)
+    assert now_playing.title == '02 - Nine Inch Nails - Ghosts I-IV - 2 Ghosts I'
+    assert not now_playing.image.isNull()
+
+    shown = nowplaying.read_now_playing(path, 375, now_playing.cover_key)
+    assert shown.cover_key == now_playing.cover_key
+    assert shown.image.isNull()
+
+    missing = nowplaying.read_now_playing('/missing.flac', 375)
+    assert missing.title == 'missing.flac'
+    assert missing.cover_key is None
+
+
+def test_loader_only_shows_the_latest_request(qtbot, busy_pool):
+    """Check that a queued request is cancelled and an older result is dropped."""
+    loader = nowplaying.NowPlayingLoader(threads=1)
+    release = busy_pool(loader.pool)
+    path = os.path.join(TESTS_DIRECTORY, '01_Ghosts_I_320kb.mp3')
+    loader.request('/missing.flac', 375)
+    loader.request(path, 375)
+    assert loader.cancelled == 1
+
+    loader.finished(1, nowplaying.NowPlaying('/missing.flac', 'missing.flac'))
+    assert loader.dropped == 1
+
+    with qtbot.waitSignal(loader.ready, timeout=5000) as blocker:
+        release.set()
+    assert blocker.args[0].path == path
+    loader.stop()
@@ -1,10 +1,13 @@
 import os
 
 from PySide6.QtCore import Qt
+from PySide6.QtGui import QAction
+from PySide6.QtMultimedia import QAudioOutput, QMediaPlayer
 from PySide6.QtWidgets import QApplication, QDialog, QFileDialog
 import pytest
+import toml
 
-from mosaic import configuration, information, player
+from mosaic import configuration, defaults, gapless, information, player, playlist, playlists
 
 
 @pytest.fixture
@@ -20,6 +23,11 @@ def window(qtbot):
     music_player.show()
     yield music_player
     music_player.player.stop()
+    # Worker threads mustn't outlive the temporary user directories of the test
+    music_player.stop_adding_tracks()
+    music_player.library_widget.stop()
+    music_player.now_playing.stop()
+    music_player.prefetcher.stop()
 
 
 @pytest.fixture
@@ -70,6 +78,14 @@ def test_window(window):
     assert window.windowIcon().isNull() is False
 
 
+def test_shortcuts_are_unique(window):
+    """Check that no two actions of the window share a keyboard shortcut."""
+    shortcuts = [action.shortcut().toString() for action in window.findChildren(QAction)
+                 if not action.shortcut().isEmpty()]
+    assert shortcuts
+    assert len(shortcuts) == len(set(shortcuts))
+
+
 def test_open_flac_file(qtbot, mocker, window, flac_file):
     """Test the opening of a FLAC media file.
 
@@ -370,3 +386,84 @@ def test_playback_next(qtbot, window):
     qtbot.keyClick(window.playback, Qt.Key.Key_Down)
     qtbot.keyClick(window.playback, Qt.Key.Key_Down)
     qtbot.keyClick(window.playback, Qt.Key.Key_Enter)
+
+
+def test_gapless_swap(qtbot, window, flac_file, blank_flac_file):
+    """Test that the preloaded standby player takes over when the current track ends."""
+    window.playlist.clear()
+    window.playlist.append([flac_file, blank_flac_file])
+    window.play_index(0)
+
+    window.standby.preload(window.order.upcoming(), window.playlist.url(1))
+    qtbot.waitUntil(lambda: window.standby.ready(1, window.playlist.url(1)), timeout=5000)
+    finished_player = window.player
+    standby_player = window.standby.player
+
+    window.handle_media_status(QMediaPlayer.MediaStatus.EndOfMedia)
+    assert window.player is standby_player
+    assert window.standby.player is finished_player
+    assert window.current_index == 1
+
+    qtbot.waitUntil(lambda: bool(window.standby.latencies), timeout=5000)
+    latency, gapless = window.standby.latencies[-1]
+    assert gapless
+    assert 'gapless' in window.duration_label.toolTip()
+
+
+def test_gapless_swap_keeps_volume(qtbot):
+    """Test that a volume change made during a track carries over to the standby output."""
+    standby = gapless.StandbyPlayer()
+    finished_player = QMediaPlayer()
+    finished_output = QAudioOutput()
+    finished_output.setVolume(0.25)
+
+    player, audio_output = standby.swap(finished_player, finished_output)
+    assert audio_output.volume() == pytest.approx(0.25)
+    assert standby.audio_output is finished_output
+
+
+def test_partly_loaded_playlist_is_kept(qtbot, window, flac_file):
+    """Test that an edited stored playlist that is still paging in isn't saved over the whole one."""
+    paths = [flac_file] * (playlists.FIRST_PAGE + 100)
+    window.playlists.save('Long', paths, [None] * len(paths))
+    window.refresh_playlist_selector()
+
+    window.switch_playlist('Long')
+    window.playlist.remove([0])
+    window.detach_playlist()
+    assert len(window.playlists.tracks(window.playlists.playlist_id('Long'))) == len(paths)
+
+
+def test_short_stored_playlist_is_checked(qtbot, window, flac_file, tmp_path):
+    """Test that the missing files of a stored playlist that fits in the first page are marked."""
+    paths = [flac_file, str(tmp_path / 'gone.flac')]
+    window.playlists.save('Short', paths, [None] * len(paths))
+    window.refresh_playlist_selector()
+
+    window.switch_playlist('Short')
+    qtbot.waitUntil(lambda: window.playlist.status[1] == window.playlist.MISSING, timeout=5000)
+    assert window.playlist.status[0] != window.playlist.MISSING
+
+
+def test_active_playlist_restored_from_database(qtbot, flac_file, mp3_file):
+    """Test that without save on close the open stored playlist is reopened rather than saved_playlist.m3u."""
+    settings = defaults.Settings()
+    settings.config['playlist']['save_on_close'] = False
+    with open(settings.user_config_file, 'w') as conffile:
+        toml.dump(settings.config, conffile)
+    database = playlists.PlaylistDatabase(os.path.join(settings.playlist_path, 'playlists.sqlite'))
+    database.save('Stored', [flac_file], [None])
+    database.set_active('Stored')
+    database.close()
+    playlist.write_m3u(os.path.join(settings.playlist_path, 'saved_playlist.m3u'), [mp3_file], [None])
+
+    music_player = player.MusicPlayer()
+    qtbot.add_widget(music_player)
+    assert list(music_player.playlist.paths()) == [flac_file]
+    assert music_player.playlist_name == 'Stored'
+    assert not music_player.playlist_dirty
+
+    music_player.save_named_playlist()
+    stored = music_player.playlists.tracks(music_player.playlists.playlist_id('Stored'))
+    assert [entry.path for entry in stored] == [flac_file]
+    music_player.library_widget.stop()
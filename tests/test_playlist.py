@@ -0,0 +1,141 @@
+import os
+
+from PySide6.QtCore import Qt
+
+from mosaic import playlist
+
+
+def test_playlist_model_bulk_changes(qtbot):
+    """Check that tracks are inserted in one batch and removed one range at a time."""
+    model = playlist.PlaylistModel()
+    inserted = []
+    removed = []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+    model.rowsRemoved.connect(lambda parent, first, last: removed.append((first, last)))
+
+    files = ['/music/album/{:02d} Track.flac' .format(number) for number in range(10)]
+    assert model.append(files) == 10
+    assert inserted == [(0, 9)]
+    assert model.directories[0] is model.directories[9]
+    assert model.data(model.index(3)) == '03 Track'
+    assert model.data(model.index(3), model.PathRole) == files[3]
+    assert model.url(3).toLocalFile() == files[3]
+
+    model.remove([1, 2, 3, 7, 9])
+    assert removed == [(9, 9), (7, 7), (1, 3)]
+    assert list(model.paths()) == [files[row] for row in (0, 4, 5, 6, 8)]
+
+    model.insert(1, ['/other/track.mp3'])
+    assert inserted[-1] == (1, 1)
+    assert model.path(1) == '/other/track.mp3'
+    assert model.append([]) == 0
+
+
+def test_directory_listings(tmp_path):
+    """Check that directories are listed in natural order with their files before subdirectories."""
+    for path in ('b/10.flac', 'b/2.flac', 'b/cover.jpg', 'a/1.mp3', 'b/disc 10/1.flac',
+                 'b/disc 9/1.flac', 'c/notes.txt'):
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_bytes(b'')
+
+    listings = list(playlist.directory_listings([str(tmp_path / 'b'), str(tmp_path / 'a' / '1.mp3'),
+                                                 str(tmp_path / 'c')]))
+    relative = [[os.path.relpath(file, str(tmp_path)) for file in files] for files in listings]
+    assert relative == [['b/2.flac', 'b/10.flac'], ['b/disc 9/1.flac'], ['b/disc 10/1.flac'], ['a/1.mp3']]
+    assert list(playlist.directory_listings([str(tmp_path)], cancelled=lambda: True)) == []
+
+
+def test_directory_walker(qtbot, tmp_path):
+    """Check that the walker sends the first directory on its own, then batches the rest."""
+    for album in range(5):
+        for track in range(3):
+            path = tmp_path / 'album {}' .format(album) / '{}.flac' .format(track)
+            path.parent.mkdir(exist_ok=True)
+            path.write_bytes(b'')
+
+    walker = playlist.DirectoryWalker([str(tmp_path)], batch_size=6, interval=60)
+    batches = []
+    walker.batch.connect(batches.append)
+    with qtbot.waitSignal(walker.finished, timeout=5000):
+        walker.start()
+    qtbot.waitUntil(lambda: sum(map(len, batches)) == 15)
+    assert [len(batch) for batch in batches] == [3, 6, 6]
+
+
+def test_parse_extinf():
+    """Check that the length and title are read from #EXTINF lines."""
+    assert playlist.parse_extinf('#EXTINF:215,Nine Inch Nails - 1 Ghosts I') == (215, 'Nine Inch Nails - 1 Ghosts I')
+    assert playlist.parse_extinf('#EXTINF:-1 tvg-id="x",A, B') == (-1, 'A, B')
+    assert playlist.parse_extinf('#EXTINF:abc') == (-1, None)
+
+
+def test_read_and_write_m3u(tmp_path):
+    """Check that playlists are read in chunks with relative paths resolved, and written back."""
+    (tmp_path / 'list.m3u').write_text('#EXTM3U\n#EXTINF:100,First\nmusic/1.flac\n\n/abs/2.mp3\n'
+                                       '# comment\n#EXTINF:3,Third\n3.mp3\n', encoding='utf-8')
+
+    chunks = list(playlist.read_m3u(str(tmp_path / 'list.m3u'), chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    entries = [entry for chunk in chunks for entry in chunk]
+    assert [entry.path for entry in entries] == [str(tmp_path / 'music' / '1.flac'), '/abs/2.mp3',
+                                                 str(tmp_path / '3.mp3')]
+    assert [(entry.length, entry.title) for entry in entries] == [(100, 'First'), (-1, None), (3, 'Third')]
+
+    model = playlist.PlaylistModel()
+    model.append_entries(entries)
+    assert model.data(model.index(0)) == 'First'
+    assert model.data(model.index(1)) == '2'
+
+    playlist.write_m3u(str(tmp_path / 'saved.m3u'), model.paths(), model.extinf)
+    saved = [entry for chunk in playlist.read_m3u(str(tmp_path / 'saved.m3u')) for entry in chunk]
+    assert [(entry.path, entry.length, entry.title) for entry in saved] == [
+        (entry.path, entry.length, entry.title) for entry in entries]
+
+
+def test_missing_tracks_are_marked(qtbot, tmp_path):
+    """Check that missing files stay in the playlist and are marked when checked."""
+    (tmp_path / 'present.flac').write_bytes(b'')
+    model = playlist.PlaylistModel()
+    model.append([str(tmp_path / 'present.flac'), str(tmp_path / 'gone.flac'), str(tmp_path / 'later.flac')])
+
+    assert model.check(0)
+    assert not model.check(1)
+    model.mark_missing([(2, str(tmp_path / 'later.flac'))])
+    assert len(model) == 3
+    assert bytes(model.status) == bytes([model.PRESENT, model.MISSING, model.MISSING])
+    assert model.data(model.index(2), Qt.ItemDataRole.ToolTipRole).endswith('(missing)')
+
+    model.remove([0])
+    assert bytes(model.status) == bytes([model.MISSING, model.MISSING])
+
+
+def test_missing_tracks_after_offset(qtbot, tmp_path):
+    """Check that missing tracks are marked at their offset, or found wherever they moved."""
+    model = playlist.PlaylistModel()
+    model.append([str(tmp_path / '{}.flac' .format(number)) for number in range(5)])
+    model.status[:] = bytes([model.PRESENT]) * 5
+
+    model.mark_missing([(1, str(tmp_path / '2.flac'))], offset=1)
+    model.remove([0])
+    model.mark_missing([(3, str(tmp_path / '4.flac'))], offset=1)
+    assert bytes(model.status) == bytes([model.PRESENT, model.MISSING, model.PRESENT, model.MISSING])
+
+
+def test_playlist_loader(qtbot, tmp_path):
+    """Check that the loader sends the entries in chunks and then the missing files."""
+    for number in range(3):
+        (tmp_path / '{}.flac' .format(number)).write_bytes(b'')
+    (tmp_path / 'list.m3u').write_text('\n'.join('{}.flac' .format(number) for number in range(5)),
+                                       encoding='utf-8')
+
+    loader = playlist.PlaylistLoader(str(tmp_path / 'list.m3u'), chunk_size=2)
+    batches = []
+    missing = []
+    loader.batch.connect(batches.append)
+    loader.missing.connect(missing.extend)
+    with qtbot.waitSignal(loader.finished, timeout=5000):
+        loader.start()
+    qtbot.waitUntil(lambda: len(missing) == 2)
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert missing == [(3, str(tmp_path / '3.flac')), (4, str(tmp_path / '4.flac'))]
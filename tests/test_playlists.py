@@ -0,0 +1,88 @@
+import sqlite3
+
+import pytest
+
+from mosaic import playlists
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Return a playlist database in a temporary directory."""
+    database = playlists.PlaylistDatabase(str(tmp_path / 'playlists.sqlite'))
+    yield database
+    database.close()
+
+
+def test_save_and_page(database):
+    """Check that playlists are stored in order and read back a page at a time."""
+    paths = ['/music/{}.flac' .format(number) for number in range(10)]
+    extinf = [(number, 'Track {}' .format(number)) if number % 2 else None for number in range(10)]
+    playlist_id = database.save('Road Trip', paths, extinf)
+
+    assert database.playlists() == [(playlist_id, 'Road Trip', 10)]
+    assert database.playlist_id('road trip') == playlist_id
+    entries = database.tracks(playlist_id)
+    assert [entry.path for entry in entries] == paths
+    assert [entry.extinf for entry in entries] == extinf
+    assert [len(page) for page in database.pages(playlist_id, start=3, page_size=4)] == [4, 3]
+
+    database.save('Road Trip', paths[:2], extinf[:2])
+    assert database.playlists() == [(playlist_id, 'Road Trip', 2)]
+
+
+def test_rename_delete_and_active(database):
+    """Check renaming and deleting playlists and remembering the open one."""
+    database.save('A', ['/a.flac'], [None])
+    database.save('B', ['/b.flac'], [None])
+
+    with pytest.raises(sqlite3.IntegrityError):
+        database.rename('A', 'b')
+    database.rename('A', 'C')
+    database.delete('B')
+    assert database.names() == ['C']
+    assert database.query('SELECT COUNT(*) FROM playlist_tracks')[0][0] == 1
+
+    assert database.active() is None
+    database.set_active('C')
+    assert database.active() == 'C'
+
+
+def test_import_and_export(database, tmp_path):
+    """Check that M3U files are imported under their file name and exported with their #EXTINF lines."""
+    (tmp_path / 'Mix.m3u').write_text('#EXTM3U\n#EXTINF:60,One\n1.flac\n2.flac\n', encoding='utf-8')
+
+    assert database.import_m3u(str(tmp_path / 'Mix.m3u')) == 'Mix'
+    database.export_m3u('Mix', str(tmp_path / 'out.m3u'))
+    assert (tmp_path / 'out.m3u').read_text(encoding='utf-8') == '#EXTM3U\n#EXTINF:60,One\n{}\n{}\n' .format(
+        tmp_path / '1.flac', tmp_path / '2.flac')
+
+
+def test_database_loader(qtbot, database):
+    """Check that the loader pages in the tracks after the first page."""
+    playlist_id = database.save('Long', ['/music/{}.flac' .format(number) for number in range(25)], [None] * 25)
+
+    loader = playlists.DatabaseLoader(database, playlist_id, start=5, chunk_size=8)
+    batches = []
+    loader.batch.connect(batches.append)
+    with qtbot.waitSignal(loader.finished, timeout=5000):
+        loader.start()
+    qtbot.waitUntil(lambda: len(batches) == 3)
+
+    assert [len(batch) for batch in batches] == [8, 8, 4]
+    assert batches[0][0].path == '/music/5.flac'
+
+
+def test_database_loader_checks_first_page(qtbot, database, tmp_path):
+    """Check that the files of the first page are checked along with the ones paged in."""
+    (tmp_path / 'present.flac').write_bytes(b'')
+    paths = [str(tmp_path / name) for name in ('gone.flac', 'present.flac', 'later.flac')]
+    playlist_id = database.save('Short', paths, [None] * 3)
+
+    loader = playlists.DatabaseLoader(database, playlist_id, start=2, preceding=paths[:2])
+    missing = []
+    loader.missing.connect(missing.extend)
+    with qtbot.waitSignal(loader.finished, timeout=5000):
+        loader.start()
+    qtbot.waitUntil(lambda: len(missing) == 2)
+
+    assert missing == [(-2, paths[0]), (0, paths[2])]
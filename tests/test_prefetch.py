@@ -0,0 +1,54 @@
+import os
+
+from mosaic import prefetch
+
+
+TESTS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_prefetch_hit_rate(qtbot):
+    """Check that a warmed track counts as a hit when it plays and a cold one as a miss."""
+    prefetcher = prefetch.Prefetcher(375, depth=1)
+    flac = os.path.join(TESTS_DIRECTORY, '02_Ghosts_I.flac')
+    mp3 = os.path.join(TESTS_DIRECTORY, '01_Ghosts_I_320kb.mp3')
+
+    with qtbot.waitSignal(prefetcher.warmed, timeout=5000):
+        prefetcher.prefetch([flac, mp3])
+    assert list(prefetcher.ready) == [flac]
+
+    assert prefetcher.played(flac)
+    assert not prefetcher.played(mp3)
+    assert prefetcher.hit_rate() == 0.5
+    assert prefetcher.report() == 'Prefetch hits: 1 of 2 tracks (50%)'
+
+    with qtbot.waitSignal(prefetcher.warmed, timeout=5000):
+        prefetcher.prefetch(['/missing.flac'])
+    assert prefetcher.stats() == {'hits': 1, 'misses': 1, 'failures': 1, 'queued': 0}
+    prefetcher.stop()
+
+
+def test_prefetch_unexpected_error(qtbot, monkeypatch):
+    """Check that a track whose warming raises an unexpected error is counted as a failure and forgotten."""
+    def fail(path, size):
+        """Fail the way an unforeseen bug would."""
+        raise RuntimeError(path)
+
+    monkeypatch.setattr(prefetch, 'warm_track', fail)
+    prefetcher = prefetch.Prefetcher(375, depth=1)
+    with qtbot.waitSignal(prefetcher.warmed, timeout=5000):
+        prefetcher.prefetch(['/a.flac'])
+    assert prefetcher.stats() == {'hits': 0, 'misses': 0, 'failures': 1, 'queued': 0}
+    prefetcher.stop()
+
+
+def test_prefetch_cancels_queued_tracks(qtbot, busy_pool):
+    """Check that queued tracks are cancelled once they are no longer upcoming."""
+    prefetcher = prefetch.Prefetcher(375, depth=3)
+    release = busy_pool(prefetcher.pool)
+    prefetcher.prefetch(['/a.flac', '/b.flac', '/c.flac'])
+    prefetcher.prefetch(['/c.flac', '/d.flac'])
+    assert set(prefetcher.tasks) == {'/c.flac', '/d.flac'}
+
+    release.set()
+    qtbot.waitUntil(lambda: prefetcher.tasks == {}, timeout=5000)
+    prefetcher.stop()
@@ -0,0 +1,101 @@
+import json
+
+from mosaic import session
+
+
+def edit(journal):
+    """Make a few edits to a started journal and close it."""
+    journal.insert(0, ['/music/a', '/music/a', '/music/b'], ['1.flac', '2.flac', '3.mp3'],
+                   [None, (120, 'Two'), None])
+    journal.insert(1, ['/music/c'], ['4.flac'], [None])
+    journal.remove(0, 0)
+    journal.set_current(1, 30000)
+    journal.close()
+
+
+def restored(directory, **arguments):
+    """Return the paths, (length, title) pairs, current index and position restored from directory."""
+    journal = session.PlaylistJournal(str(directory), **arguments)
+    entries = journal.restore()
+    return ([entry.path for entry in entries], [(entry.length, entry.title) for entry in entries],
+            journal.current, journal.position)
+
+
+EXPECTED = (['/music/c/4.flac', '/music/a/2.flac', '/music/b/3.mp3'],
+            [(-1, None), (120, 'Two'), (-1, None)], 1, 30000)
+
+
+def test_journal_is_replayed(tmp_path):
+    """Check that edits are journaled by the writer thread and replayed on restore."""
+    journal = session.PlaylistJournal(str(tmp_path))
+    assert journal.restore() == []
+    journal.start()
+    edit(journal)
+
+    assert not (tmp_path / 'saved_playlist.m3u').exists()
+    assert restored(tmp_path) == EXPECTED
+
+
+def test_journal_is_compacted(tmp_path):
+    """Check that a large journal is folded into a snapshot and that stale journals are ignored."""
+    journal = session.PlaylistJournal(str(tmp_path), compact_bytes=0)
+    journal.restore()
+    journal.start()
+    journal.insert(0, ['/music/x'], ['0.flac'], [None])
+    journal.sync()
+    edit(journal)
+
+    snapshot = (tmp_path / 'saved_playlist.m3u').read_text(encoding='utf-8')
+    assert '#MOSAIC-SESSION:' in snapshot
+    assert '/music/x/0.flac' in snapshot
+    assert len((tmp_path / 'saved_playlist.journal').read_text(encoding='utf-8').splitlines()) > 1
+
+    expected = (['/music/c/4.flac', '/music/a/2.flac', '/music/b/3.mp3', '/music/x/0.flac'],
+                EXPECTED[1] + [(-1, None)], 1, 30000)
+    assert restored(tmp_path) == expected
+
+    # A crash after the snapshot was replaced but before the journal was leaves a stale journal
+    (tmp_path / 'saved_playlist.journal').write_text(
+        json.dumps({'generation': 0}) + '\n' + json.dumps(['clear']) + '\n', encoding='utf-8')
+    assert restored(tmp_path)[0] == ['/music/x/0.flac']
+
+
+def test_torn_record_ends_the_replay(tmp_path):
+    """Check that a record cut short by a crash is ignored along with anything after it."""
+    journal = session.PlaylistJournal(str(tmp_path))
+    journal.restore()
+    journal.start()
+    edit(journal)
+
+    with open(str(tmp_path / 'saved_playlist.journal'), 'a', encoding='utf-8') as fileobj:
+        fileobj.write('["clear"')
+    assert restored(tmp_path) == EXPECTED
+
+    journal = session.PlaylistJournal(str(tmp_path))
+    journal.restore()
+    journal.start()
+    journal.clear()
+    journal.close()
+    assert restored(tmp_path)[0] == []
+
+
+def test_session_loader(qtbot, tmp_path):
+    """Check that the loader sends the restored tracks, then the current index and position."""
+    journal = session.PlaylistJournal(str(tmp_path))
+    journal.restore()
+    journal.start()
+    edit(journal)
+
+    journal = session.PlaylistJournal(str(tmp_path))
+    loader = session.SessionLoader(journal, chunk_size=2)
+    batches = []
+    states = []
+    loader.batch.connect(batches.append)
+    loader.restored.connect(lambda index, position: states.append((index, position)))
+    with qtbot.waitSignal(loader.finished, timeout=5000):
+        loader.start()
+    qtbot.waitUntil(lambda: states == [(1, 30000)])
+
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert journal.thread is not None
+    journal.close()
@@ -0,0 +1,46 @@
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QLabel, QSlider
+
+from mosaic import timeline
+
+
+def test_format_time():
+    """Check that times are shown as mm:ss, or hh:mm:ss for long tracks."""
+    assert timeline.format_time(0) == '00:00'
+    assert timeline.format_time(125) == '02:05'
+    assert timeline.format_time(3725, hours=True) == '01:02:05'
+
+
+def test_position_updates_are_coalesced(qtbot):
+    """Check that many position updates within a frame redraw the widgets once."""
+    slider = QSlider(Qt.Orientation.Horizontal)
+    label = QLabel()
+    updater = timeline.PositionUpdater(slider, label, frame_rate=50)
+
+    updater.set_duration(200000)
+    for position in range(0, 5000, 10):
+        updater.set_position(position)
+    qtbot.waitUntil(lambda: updater.applied == 1, timeout=1000)
+    assert updater.received == 501
+    assert (slider.maximum(), slider.value()) == (200, 4)
+    assert label.text() == '00:04 / 03:20'
+
+    updater.set_position(4990)
+    updater.apply()
+    assert updater.applied == 1  # Nothing visible changed
+    assert updater.report() == 'Position updates: 1 applied of 502 received'
+
+
+def test_seeks_are_throttled(qtbot):
+    """Check that a drag sends its first and latest positions, not every one."""
+    throttle = timeline.SeekThrottle(interval=1000)
+    seeks = []
+    throttle.seek.connect(seeks.append)
+
+    for seconds in range(10):
+        throttle.request(seconds)
+    assert seeks == [0]
+
+    throttle.flush()
+    assert seeks == [0, 9000]
+    assert (throttle.requested, throttle.sent) == (10, 2)